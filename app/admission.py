@@ -0,0 +1,166 @@
+"""
+Admission control for the intro sequence.
+
+At most `max_active` chats run the media-heavy intro at once. Everyone else waits in a
+FIFO waiting room and is promoted as slots free up, so a promo spike turns into a queue
+with a predictable pace instead of every user's CEO video and PDF fighting for the same
+outbound budget.
+
+This class is bookkeeping only; the bot sends the messages. A slot is released when the
+chat's intro finishes (or after `slot_timeout`, should that never happen), and release()
+hands back the chats to admit next. snapshot() and restore() carry the slots and the
+waiting room over a restart, so nobody who was told to wait has to /start again.
+"""
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.metrics import Histogram
+
+log = logging.getLogger("e2t_onboarding_bot.admission")
+
+# Seconds spent in the waiting room
+QUEUE_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+
+ABANDON_LEFT = "left"  # tapped "leave the queue"
+ABANDON_EXPIRED = "expired"  # waited longer than max_wait
+ABANDON_BLOCKED = "blocked"  # couldn't be reached when promoted
+
+
+class AdmissionControl:
+    def __init__(self, max_active: int, *, max_wait: float = 3600.0, slot_timeout: float = 600.0):
+        self.max_active = max_active
+        self.max_wait = max_wait
+        self.slot_timeout = slot_timeout
+        self._active: Dict[int, float] = {}  # chat_id -> admitted at (monotonic)
+        # chat_id -> (ticket, enqueued at), FIFO. Tickets only grow, so a chat's place is its
+        # ticket minus the head's: O(1) instead of a walk down the queue
+        self._waiting: "OrderedDict[int, Tuple[int, float]]" = OrderedDict()
+        self._next_ticket = 0
+
+        self.admitted = 0
+        self.queued = 0
+        self.promoted = 0
+        self.reclaimed = 0
+        self.peak_waiting = 0
+        self.abandoned: Dict[str, int] = {ABANDON_LEFT: 0, ABANDON_EXPIRED: 0, ABANDON_BLOCKED: 0}
+        self.queue_time = Histogram(QUEUE_BUCKETS)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_active > 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": len(self._active),
+            "waiting": len(self._waiting),
+            "peak_waiting": self.peak_waiting,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "promoted": self.promoted,
+            "reclaimed_slots": self.reclaimed,
+            "abandoned": dict(self.abandoned),
+            "queue_seconds": self.queue_time.snapshot(),
+        }
+
+    def position(self, chat_id: int) -> Optional[int]:
+        """
+        1-based place in the waiting room, or None if the chat isn't waiting. Chats that left
+        from between the head and this one still count, so it can be a little high, never low.
+        """
+        entry = self._waiting.get(chat_id)
+        if entry is None:
+            return None
+        head, _ = next(iter(self._waiting.values()))
+        return entry[0] - head + 1
+
+    def _enqueue(self, chat_id: int, enqueued: float) -> int:
+        self._waiting[chat_id] = (self._next_ticket, enqueued)
+        self._next_ticket += 1
+        return self.position(chat_id)
+
+    def request(self, chat_id: int) -> Optional[int]:
+        """
+        Ask for an intro slot. None means go ahead (the chat holds a slot, possibly already);
+        otherwise the chat's position in the waiting room. Asking again keeps the place.
+        """
+        if not self.enabled or chat_id in self._active:
+            return None
+        if chat_id in self._waiting:
+            return self.position(chat_id)
+        if len(self._active) < self.max_active and not self._waiting:
+            self._active[chat_id] = time.monotonic()
+            self.admitted += 1
+            return None
+
+        position = self._enqueue(chat_id, time.monotonic())
+        self.queued += 1
+        self.peak_waiting = max(self.peak_waiting, len(self._waiting))
+        return position
+
+    def _promote(self, now: float) -> List[int]:
+        out = []
+        while self._waiting and len(self._active) < self.max_active:
+            chat_id, (_, enqueued) = self._waiting.popitem(last=False)
+            self.queue_time.observe(now - enqueued)
+            self._active[chat_id] = now
+            self.promoted += 1
+            out.append(chat_id)
+        return out
+
+    def release(self, chat_id: int) -> List[int]:
+        """The chat's intro is over. Returns the chats promoted into the freed slot(s)."""
+        if self._active.pop(chat_id, None) is None:
+            return []
+        return self._promote(time.monotonic())
+
+    def leave(self, chat_id: int, reason: str = ABANDON_LEFT) -> List[int]:
+        """Drop a chat from the waiting room (or its slot, if it had just been promoted)."""
+        if self._waiting.pop(chat_id, None) is not None:
+            self.abandoned[reason] += 1
+            return []
+        if reason == ABANDON_BLOCKED and chat_id in self._active:
+            self.abandoned[reason] += 1
+            return self.release(chat_id)
+        return []
+
+    def reap(self) -> List[int]:
+        """Expire stale waiters and reclaim slots whose intro never finished; returns chats to admit."""
+        now = time.monotonic()
+        while self._waiting:
+            chat_id, (_, enqueued) = next(iter(self._waiting.items()))
+            if now - enqueued < self.max_wait:
+                break
+            del self._waiting[chat_id]
+            self.abandoned[ABANDON_EXPIRED] += 1
+        for chat_id in [c for c, t in self._active.items() if now - t >= self.slot_timeout]:
+            del self._active[chat_id]
+            self.reclaimed += 1
+            log.info("Reclaimed intro slot of chat_id=%s after %.0fs", chat_id, self.slot_timeout)
+        return self._promote(now)
+
+    def snapshot(self) -> Dict[str, List]:
+        """Slots and waiting room as JSON-able lists, with wall-clock times (for restore() in the next process)."""
+        now, wall = time.monotonic(), time.time()
+        return {
+            "active": [[c, wall - (now - t)] for c, t in self._active.items()],
+            "waiting": [[c, wall - (now - t)] for c, (_, t) in self._waiting.items()],
+        }
+
+    def restore(self, active: Iterable[Tuple[int, float]], waiting: Iterable[Tuple[int, float]]) -> List[int]:
+        """
+        Take over a snapshot() from the previous process, keeping the queue order and how long
+        everyone has waited. Returns the chats to admit now, if there are free slots.
+        """
+        if not self.enabled:
+            return [int(c) for c, _ in waiting]  # the cap was lifted: nobody has to wait any more
+        now, wall = time.monotonic(), time.time()
+        for chat_id, at in active:
+            self._active.setdefault(int(chat_id), now - max(0.0, wall - float(at)))
+        for chat_id, at in waiting:
+            chat_id = int(chat_id)
+            if chat_id not in self._active and chat_id not in self._waiting:
+                self._enqueue(chat_id, now - max(0.0, wall - float(at)))
+        self.peak_waiting = max(self.peak_waiting, len(self._waiting))
+        return self.reap()
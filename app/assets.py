@@ -0,0 +1,112 @@
+import hashlib
+import io
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Mapping, Optional
+
+log = logging.getLogger("e2t_onboarding_bot.assets")
+
+
+@dataclass(frozen=True)
+class Asset:
+    name: str  # config name, e.g. "SETUP_VIDEO_FILE"
+    path: Path  # resolved
+    size: int
+    mtime_ns: int
+    sha256: str
+    data: Optional[bytes] = None  # whole file, for assets up to the inline limit
+
+    @property
+    def filename(self) -> str:
+        return self.path.name
+
+    def open(self) -> BinaryIO:
+        """Upload source: the in-memory bytes when we have them, else the file itself."""
+        if self.data is None:
+            return open(self.path, "rb")
+        buf = io.BytesIO(self.data)
+        buf.name = self.filename  # lets the Bot API client guess the mime type
+        return buf
+
+
+class AssetRegistry:
+    """
+    The bot's media files, checked once at startup instead of on every send.
+
+    load() resolves, stats and hashes each configured file (logging anything missing
+    up front) and keeps files up to `inline_max_bytes` in memory. get() is a dict lookup.
+    refresh() re-stats the files and reloads any whose mtime/size changed or that
+    appeared/disappeared; run it periodically from a background job.
+    """
+
+    def __init__(self, paths: Mapping[str, str], *, inline_max_bytes: int = 8 << 20):
+        self.paths = {name: p for name, p in paths.items()}
+        self.inline_max_bytes = inline_max_bytes
+        self._assets: Dict[str, Asset] = {}
+        self.reloads = 0
+
+    def _read(self, name: str, raw: str) -> Optional[Asset]:
+        if not raw:
+            return None
+        path = Path(raw).expanduser().resolve()
+        try:
+            st = path.stat()
+            h = hashlib.sha256()
+            data = bytearray() if st.st_size <= self.inline_max_bytes else None
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    h.update(chunk)
+                    if data is not None:
+                        data += chunk
+        except OSError as e:
+            log.warning("Asset %s unavailable (%s): %s", name, raw, e)
+            return None
+        return Asset(name, path, st.st_size, st.st_mtime_ns, h.hexdigest(), bytes(data) if data is not None else None)
+
+    def load(self) -> None:
+        for name, raw in self.paths.items():
+            asset = self._read(name, raw)
+            if asset is None:
+                self._assets.pop(name, None)
+                log.warning("%s missing or not configured: %r", name, raw)
+            else:
+                self._assets[name] = asset
+                log.info("%s ok: %s (%s bytes%s)", name, asset.path, asset.size,
+                         ", in memory" if asset.data is not None else "")
+
+    def refresh(self) -> int:
+        """Reload assets that changed on disk. Returns how many changed."""
+        changed = 0
+        for name, raw in self.paths.items():
+            cur = self._assets.get(name)
+            try:
+                st = Path(raw).expanduser().stat() if raw else None
+            except OSError:
+                st = None
+            if st is None:
+                if cur is not None:
+                    log.warning("%s disappeared: %s", name, raw)
+                    del self._assets[name]
+                    changed += 1
+                continue
+            if cur is not None and cur.mtime_ns == st.st_mtime_ns and cur.size == st.st_size:
+                continue
+            asset = self._read(name, raw)
+            if asset is not None:
+                self._assets[name] = asset  # single assignment: readers see old or new, never half
+                log.info("%s reloaded: %s (%s bytes)", name, asset.path, asset.size)
+                changed += 1
+        self.reloads += changed
+        return changed
+
+    def get(self, name: str) -> Optional[Asset]:
+        return self._assets.get(name)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "available": len(self._assets),
+            "missing": [n for n, p in self.paths.items() if n not in self._assets],
+            "in_memory_bytes": sum(len(a.data) for a in self._assets.values() if a.data is not None),
+            "reloads": self.reloads,
+        }
@@ -1,12 +1,18 @@
 import asyncio
+import functools
 import logging
 import os
 import re
-from pathlib import Path
+import secrets
+import shlex
+import time
+from datetime import datetime
 from typing import Optional
+from urllib.parse import urlparse
 
 from dotenv import load_dotenv
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.error import BadRequest, Forbidden, TelegramError
 from telegram.ext import (
     Application,
     CallbackQueryHandler,
@@ -14,10 +20,29 @@ from telegram.ext import (
     ContextTypes,
     ConversationHandler,
     MessageHandler,
+    TypeHandler,
     filters,
 )
 
-from app.storage import save_lead_csv
+from app.admission import ABANDON_BLOCKED, AdmissionControl
+from app.assets import Asset, AssetRegistry
+from app.broadcast import BroadcastManager, Campaign
+from app.draft import OnboardingDraft
+from app.drip import DripHandoff, DripScheduler, DripStep
+from app.media_cache import MediaCache
+from app.media_probe import choose_send_kind, probe_video
+from app.outbox import LANE_BULK, LANE_DRIP, LANE_INTERACTIVE, OutboundDispatcher
+from app.persistence import SQLitePersistence
+from app.pipeline import BackgroundPipeline, CallbackLatency, callback_kind
+from app.lead_index import LeadIndex, same_person
+from app.lead_store import LeadStore
+from app.reminders import ReminderScheduler
+from app.sharding import shard_of, shard_path
+from app.storage import LeadWriter, append_lead_rows, lead_row
+from app.supervisor import ChatSupervisor
+from app.throttle import UpdateThrottle
+from app.update_processor import ChatOrderedUpdateProcessor
+from app.webhook import allowed_updates_for, serve_webhook
 
 load_dotenv()
 
@@ -39,18 +64,129 @@ HELP_EMAIL = os.getenv("HELP_EMAIL", "support@example.com").strip()
 TELEGRAM_SUPPORT = os.getenv("TELEGRAM_SUPPORT", "@educate2trade").strip()
 
 LEADS_DIR = os.getenv("LEADS_DIR", "./app_data").strip()
+LEADS_FLUSH_INTERVAL = float(os.getenv("LEADS_FLUSH_INTERVAL", "0"))  # extra seconds a batch may wait for more rows
+LEADS_FSYNC = os.getenv("LEADS_FSYNC", "always").strip().lower()  # always | interval | never
+LEADS_QUEUE_MAX = int(os.getenv("LEADS_QUEUE_MAX", "10000"))
+LEADS_RETRY_FOR = float(os.getenv("LEADS_RETRY_FOR", "30"))  # seconds a failing batch is retried before its leads fail
+# Indexed copy of the leads (lookups by telegram_id / email / phone)
+LEAD_STORE_DB = os.getenv("LEAD_STORE_DB", os.path.join(LEADS_DIR, "leads.sqlite3")).strip()
+
+# Conversation state + user_data survive restarts here (SQLite, WAL)
+PERSISTENCE_DB = os.getenv("PERSISTENCE_DB", os.path.join(LEADS_DIR, "bot_state.sqlite3")).strip()
+PERSISTENCE_FLUSH_INTERVAL = float(os.getenv("PERSISTENCE_FLUSH_INTERVAL", "1.0"))  # seconds between batched writes
+# A half-finished onboarding idle this long is dropped (and recorded as a drop-off); 0 = keep forever
+ONBOARDING_IDLE_TIMEOUT = float(os.getenv("ONBOARDING_IDLE_TIMEOUT", str(48 * 3600)))
+
+# Asset registry: files up to this size are kept in memory; changes on disk are picked up every N seconds
+ASSET_INLINE_MAX_BYTES = int(os.getenv("ASSET_INLINE_MAX_BYTES", str(8 << 20)))
+ASSET_WATCH_INTERVAL = float(os.getenv("ASSET_WATCH_INTERVAL", "30"))
+# The same file isn't sent to a chat twice within this many seconds (0 = off)
+MEDIA_DEDUPE_WINDOW = float(os.getenv("MEDIA_DEDUPE_WINDOW", "600"))
+
+# Telegram file_id cache (lets repeat sends skip the upload)
+MEDIA_CACHE_FILE = os.getenv("MEDIA_CACHE_FILE", os.path.join(LEADS_DIR, "media_cache.json")).strip()
+# Drip steps still pending at shutdown are handed to the next process through this file
+DRIP_HANDOFF_FILE = os.getenv("DRIP_HANDOFF_FILE", os.path.join(LEADS_DIR, "drip_handoff.json")).strip()
 
 REGIONS = ["UK/EU", "Middle East", "Africa", "Asia", "Americas"]
 
+# ---------------- SERVING ----------------
+BOT_MODE = os.getenv("BOT_MODE", "polling").strip().lower()  # polling | webhook | sharded
+BOT_API_BASE_URL = os.getenv("BOT_API_BASE_URL", "").strip()  # e.g. http://127.0.0.1:8081/bot (local stand-in)
+
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").strip()  # public URL registered with Telegram (empty = don't register)
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0").strip()
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", os.getenv("PORT", "8443")))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", urlparse(WEBHOOK_URL).path or "/telegram").strip()
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "").strip() or secrets.token_urlsafe(32)
+WEBHOOK_MAX_QUEUE = int(os.getenv("WEBHOOK_MAX_QUEUE", "1000"))  # updates buffered before we answer 503
+
+# ---------------- SHARDING ----------------
+# BOT_MODE=sharded runs a front on WEBHOOK_PORT and SHARD_COUNT workers on SHARD_BASE_PORT.. (localhost).
+# The front sets SHARD_INDEX/SHARD_COUNT for each worker; a plain single process is shard 0 of 1.
+SHARD_COUNT = max(1, int(os.getenv("SHARD_COUNT", "1")))
+SHARD_INDEX = int(os.getenv("SHARD_INDEX", "0"))
+SHARD_BASE_PORT = int(os.getenv("SHARD_BASE_PORT", str(WEBHOOK_PORT + 1)))
+SHARD_STREAMS = max(1, int(os.getenv("SHARD_STREAMS", "4")))  # updates in flight per worker (never two for one chat)
+
+if BOT_MODE == "sharded" and __name__ == "__main__":
+    # This process is only the front: hand over before any of the singletons below are built.
+    # The workers are this module again, in webhook mode.
+    from app.shard_front import run_front
+
+    raise SystemExit(
+        run_front(
+            workers=SHARD_COUNT,
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            path=WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            base_port=SHARD_BASE_PORT,
+            token=BOT_TOKEN,
+            base_url=BOT_API_BASE_URL or None,
+            webhook_url=WEBHOOK_URL or None,
+            max_queue=WEBHOOK_MAX_QUEUE,
+            streams=SHARD_STREAMS,
+        )
+    )
+
+# ---------------- OUTBOUND RATE LIMITS ----------------
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "30"))  # msgs/s across all chats
+OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", "1"))  # msgs/s per private chat
+OUTBOUND_CHAT_BURST = float(os.getenv("OUTBOUND_CHAT_BURST", "3"))
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", "3"))  # RetryAfter re-queues per call
+# Updates handled at once (never two for one chat); each may be waiting on its chat's send bucket
+UPDATE_CONCURRENCY = max(1, int(os.getenv("UPDATE_CONCURRENCY", "256")))
+
+# ---------------- BACKGROUND WORK ----------------
+# Slow parts of a callback (lead writes) run here after the user has been answered
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "4"))
+PIPELINE_RETRIES = int(os.getenv("PIPELINE_RETRIES", "3"))  # then the user is asked to contact support
+PIPELINE_MAX_QUEUE = int(os.getenv("PIPELINE_MAX_QUEUE", "10000"))
+
+# ---------------- INBOUND THROTTLE ----------------
+THROTTLE_RATE = float(os.getenv("THROTTLE_RATE", "1"))  # updates/s per user (0 = no throttle)
+THROTTLE_BURST = float(os.getenv("THROTTLE_BURST", "5"))
+THROTTLE_COALESCE_WINDOW = float(os.getenv("THROTTLE_COALESCE_WINDOW", "1"))  # repeats within N s are dropped
+THROTTLE_MAX_USERS = int(os.getenv("THROTTLE_MAX_USERS", "100000"))  # buckets kept (LRU)
+
+# ---------------- INTRO ADMISSION ----------------
+INTRO_MAX_ACTIVE = int(os.getenv("INTRO_MAX_ACTIVE", "50"))  # intros running at once, others queue (0 = no cap)
+INTRO_QUEUE_MAX_WAIT = float(os.getenv("INTRO_QUEUE_MAX_WAIT", "3600"))  # seconds before a waiter is dropped
+INTRO_SLOT_TIMEOUT = float(os.getenv("INTRO_SLOT_TIMEOUT", "600"))  # reclaim a slot whose intro never finished
+
+# ---------------- REMINDERS ----------------
+# Nudges for users stuck in a step, N seconds after their last action ("" = off). Delays past the
+# idle timeout are ignored: the session (and its buttons) would be gone by then.
+REMINDER_DELAYS = sorted(
+    d for d in (float(x) for x in os.getenv("REMINDER_DELAYS", "3600,86400").replace(" ", "").split(",") if x)
+    if not ONBOARDING_IDLE_TIMEOUT or d < ONBOARDING_IDLE_TIMEOUT
+)
+REMINDERS_DB = os.getenv("REMINDERS_DB", os.path.join(LEADS_DIR, "reminders.sqlite3")).strip()
+
+# ---------------- ADMIN / BROADCASTS ----------------
+ADMIN_IDS = [int(x) for x in os.getenv("ADMIN_IDS", "").replace(" ", "").split(",") if x]  # Telegram user ids
+BROADCAST_DIR = os.getenv("BROADCAST_DIR", os.path.join(LEADS_DIR, "broadcasts")).strip()  # checkpoints
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "20"))  # msgs/s, leaves headroom for onboarding
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "8"))
+
 # ---------------- TIMINGS ----------------
-DELAY_BEFORE_CEO_VIDEO = 3
-DELAY_AFTER_CEO_VIDEO = 5
-DELAY_AFTER_GUIDE = 3
-DELAY_AFTER_SETUP_VIDEO = 5
-DELAY_BEFORE_FINAL_MESSAGE = 5
+DELAY_SCALE = float(os.getenv("DELAY_SCALE", "1"))  # e.g. 0.01 to run the flow fast in load tests
+DELAY_BEFORE_CEO_VIDEO = 3 * DELAY_SCALE
+DELAY_AFTER_CEO_VIDEO = 5 * DELAY_SCALE
+DELAY_AFTER_GUIDE = 3 * DELAY_SCALE
+DELAY_AFTER_SETUP_VIDEO = 5 * DELAY_SCALE
+DELAY_BEFORE_FINAL_MESSAGE = 5 * DELAY_SCALE
 
 # ---------------- CONVERSATION STATES ----------------
 S_START_DECISION, S_EMAIL, S_PHONE, S_REGION, S_REVIEW = range(5)
+STATE_NAMES = {
+    S_START_DECISION: "S_START_DECISION",
+    S_EMAIL: "S_EMAIL",
+    S_PHONE: "S_PHONE",
+    S_REGION: "S_REGION",
+    S_REVIEW: "S_REVIEW",
+}
 
 # ---------------- VALIDATION ----------------
 EMAIL_RE = re.compile(r"^[^\s@]+@[^\s@]+\.[^\s@]{2,}$")
@@ -59,27 +195,114 @@ PHONE_RE = re.compile(r"^\+[1-9]\d{7,14}$")  # E.164: + and 8-15 digits total
 # ---------------- LOGGING ----------------
 logging.basicConfig(
     level=logging.INFO,
-    format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    format="%(asctime)s | %(levelname)s | %(name)s | %(message)s"
+    if SHARD_COUNT <= 1 else f"%(asctime)s | %(levelname)s | shard {SHARD_INDEX} | %(name)s | %(message)s",
 )
 logging.getLogger("httpx").setLevel(logging.WARNING)
 logging.getLogger("telegram").setLevel(logging.WARNING)
 logging.getLogger("telegram.ext").setLevel(logging.WARNING)
+logging.getLogger("apscheduler").setLevel(logging.WARNING)
 log = logging.getLogger("e2t_onboarding_bot")
 
+ASSETS = AssetRegistry(
+    {
+        "CEO_VIDEO_NOTE_FILE": CEO_VIDEO_NOTE_FILE,
+        "STARTUP_PDF_FILE": STARTUP_PDF_FILE,
+        "STARTUP_PDF_PREVIEW": STARTUP_PDF_PREVIEW,
+        "SETUP_VIDEO_FILE": SETUP_VIDEO_FILE,
+        "SETUP_VIDEO_PREVIEW": SETUP_VIDEO_PREVIEW,
+    },
+    inline_max_bytes=ASSET_INLINE_MAX_BYTES,
+)
+
+def _owns(chat_id: int) -> bool:
+    """Whether this process handles the chat (always, unless it is one of several shards)."""
+    return shard_of(chat_id, SHARD_COUNT) == SHARD_INDEX
+
+
+MEDIA_CACHE = MediaCache(shard_path(MEDIA_CACHE_FILE, SHARD_INDEX, SHARD_COUNT))
+
+LEAD_STORE = LeadStore(LEAD_STORE_DB)
+
+DROPOFFS: dict = {}  # state name -> sessions timed out there since start
+
+
+def _record_dropoffs(drafts: dict) -> None:
+    """Write one drop-off row per timed-out draft (user_id -> OnboardingDraft). Blocking."""
+    now = datetime.now().isoformat(timespec="seconds")
+    rows = []
+    for user_id, d in drafts.items():
+        state = STATE_NAMES.get(d.state, str(d.state))
+        DROPOFFS[state] = DROPOFFS.get(state, 0) + 1
+        rows.append([
+            now,
+            user_id,
+            state,
+            datetime.fromtimestamp(d.started_at).isoformat(timespec="seconds") if d.started_at else "",
+            datetime.fromtimestamp(d.updated_at).isoformat(timespec="seconds") if d.updated_at else "",
+            ",".join(d.details()),
+        ])
+    LEAD_STORE.record_dropoffs(rows)
+
+
+PERSISTENCE = SQLitePersistence(
+    PERSISTENCE_DB,
+    flush_interval=PERSISTENCE_FLUSH_INTERVAL,
+    user_data_type=OnboardingDraft,
+    ttl=ONBOARDING_IDLE_TIMEOUT,
+    on_expire=_record_dropoffs,  # sessions whose timeout was lost with the previous process
+    owns=_owns if SHARD_COUNT > 1 else None,
+)
+LEAD_INDEX = LeadIndex()  # filled from LEAD_STORE in _on_init
+
+
+def _write_leads(rows, fsync: bool) -> str:
+    # Store first: its inserts are idempotent, so a retry after a CSV failure can't duplicate
+    LEAD_STORE.append_rows(rows, fsync)
+    return append_lead_rows(LEADS_DIR, rows, fsync)
+
+
+LEAD_WRITER = LeadWriter(
+    LEADS_DIR,
+    flush_interval=LEADS_FLUSH_INTERVAL,
+    max_queue=LEADS_QUEUE_MAX,
+    fsync=LEADS_FSYNC,
+    retry_for=LEADS_RETRY_FOR,
+    sink=_write_leads,
+)
+
+THROTTLE = UpdateThrottle(
+    rate=THROTTLE_RATE,
+    burst=THROTTLE_BURST,
+    coalesce_window=THROTTLE_COALESCE_WINDOW,
+    max_users=THROTTLE_MAX_USERS,
+    exempt=ADMIN_IDS,
+)
+
+ADMISSION = AdmissionControl(-(-INTRO_MAX_ACTIVE // SHARD_COUNT), max_wait=INTRO_QUEUE_MAX_WAIT, slot_timeout=INTRO_SLOT_TIMEOUT)
+
+BROADCASTS = BroadcastManager(shard_path(BROADCAST_DIR, SHARD_INDEX, SHARD_COUNT), concurrency=BROADCAST_CONCURRENCY, rate=BROADCAST_RATE)
+
+CALLBACK_LATENCY = CallbackLatency()
+PIPELINE = BackgroundPipeline(
+    workers=PIPELINE_WORKERS,
+    retries=PIPELINE_RETRIES,
+    max_queue=PIPELINE_MAX_QUEUE,
+    latency=CALLBACK_LATENCY,
+)
+
+OUTBOX = OutboundDispatcher(
+    global_rate=OUTBOUND_GLOBAL_RATE / SHARD_COUNT,  # the bot-wide limit, split between the shards
+    chat_rate=OUTBOUND_CHAT_RATE,
+    chat_burst=OUTBOUND_CHAT_BURST,
+    max_retries=OUTBOUND_MAX_RETRIES,
+)
+
 
 # ============================================================
 # Helpers
 # ============================================================
 
-def _path_exists(p: str) -> bool:
-    if not p:
-        return False
-    try:
-        return Path(p).expanduser().exists()
-    except Exception:
-        return False
-
-
 def _kb(*rows: list[InlineKeyboardButton]) -> InlineKeyboardMarkup:
     """Inline keyboard helper."""
     return InlineKeyboardMarkup([[*rows]])
@@ -98,31 +321,82 @@ def is_valid_phone(phone: str) -> bool:
 
 
 async def _safe_send_message(context: ContextTypes.DEFAULT_TYPE, chat_id: int, text: str,
-                            reply_markup: Optional[InlineKeyboardMarkup] = None) -> None:
-    await context.bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup)
+                            reply_markup: Optional[InlineKeyboardMarkup] = None,
+                            lane: int = LANE_INTERACTIVE) -> None:
+    await context.bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup, rate_limit_args=lane)
+
+
+# Video assets and how we'd like to send them; the preflight may step down to video / document
+VIDEO_ASSETS = {"CEO_VIDEO_NOTE_FILE": "video_note", "SETUP_VIDEO_FILE": "video"}
+_DOWNGRADE = {"video_note": "video", "video": "document"}
+
+
+async def _preflight_media() -> None:
+    """Decide once per video file (path + content) which send method it gets; the verdict is persisted."""
+    for name, preferred in VIDEO_ASSETS.items():
+        asset = ASSETS.get(name)
+        if asset is None or MEDIA_CACHE.send_as(asset):
+            continue
+        info = await asyncio.to_thread(probe_video, asset.path)
+        kind = choose_send_kind(info, asset.size, preferred)
+        MEDIA_CACHE.set_send_as(asset, kind)
+        log.info("%s will be sent as %s (%s)", name, kind, info)
+
+
+def _video_sender(context: ContextTypes.DEFAULT_TYPE, chat_id: int, kind: str, asset: Asset, caption: str):
+    if kind == "video_note":
+        return lambda media: context.bot.send_video_note(chat_id=chat_id, video_note=media, rate_limit_args=LANE_DRIP)
+    if kind == "video":
+        return lambda media: context.bot.send_video(
+            chat_id=chat_id,
+            rate_limit_args=LANE_DRIP,
+            video=media,
+            caption=caption,
+            supports_streaming=True,
+        )
+    return lambda media: context.bot.send_document(
+        chat_id=chat_id,
+        rate_limit_args=LANE_DRIP,
+        document=media,
+        filename=asset.filename,
+        caption=caption,
+    )
+
+
+async def _send_video_asset(context: ContextTypes.DEFAULT_TYPE, chat_id: int, asset: Asset, preferred: str,
+                            caption: str) -> None:
+    """
+    Send with the method decided at preflight. If Telegram still rejects it, step down and
+    remember that, so the double upload happens at most once per file, not once per user.
+    """
+    kind = MEDIA_CACHE.send_as(asset) or preferred
+    while True:
+        try:
+            await MEDIA_CACHE.send(kind, asset, _video_sender(context, chat_id, kind, asset, caption))
+            MEDIA_CACHE.set_send_as(asset, kind)
+            return
+        except BadRequest as e:
+            fallback = _DOWNGRADE.get(kind)
+            if fallback is None:
+                raise
+            log.warning("%s rejected as %s (%s), sending as %s from now on", asset.name, kind, e, fallback)
+            MEDIA_CACHE.set_send_as(asset, fallback)
+            kind = fallback
 
 
 async def _send_ceo_video_note(context: ContextTypes.DEFAULT_TYPE, chat_id: int) -> None:
-    """Send CEO circular video note (preferred). Falls back to normal video if needed."""
-    if not _path_exists(CEO_VIDEO_NOTE_FILE):
+    """Send CEO circular video note (preferred), or whatever the preflight decided the file supports."""
+    asset = ASSETS.get("CEO_VIDEO_NOTE_FILE")
+    if asset is None:
         log.warning("CEO video note file missing: %s", CEO_VIDEO_NOTE_FILE)
         return
 
     try:
-        with open(Path(CEO_VIDEO_NOTE_FILE), "rb") as f:
-            await context.bot.send_video_note(chat_id=chat_id, video_note=f)
+        await SUPERVISOR.send_once(
+            chat_id, asset, lambda: _send_video_asset(context, chat_id, asset, "video_note", caption="Welcome video"),
+        )
     except Exception as e:
-        log.warning("send_video_note failed, falling back to send_video: %s", e)
-        try:
-            with open(Path(CEO_VIDEO_NOTE_FILE), "rb") as f:
-                await context.bot.send_video(
-                    chat_id=chat_id,
-                    video=f,
-                    caption="Welcome video",
-                    supports_streaming=True,
-                )
-        except Exception as e2:
-            log.warning("CEO fallback video also failed: %s", e2)
+        log.warning("Failed to send CEO video: %s", e)
 
 
 async def _send_guide_pack(context: ContextTypes.DEFAULT_TYPE, chat_id: int) -> None:
@@ -131,106 +405,112 @@ async def _send_guide_pack(context: ContextTypes.DEFAULT_TYPE, chat_id: int) ->
     Best UX: preview photo with caption, then PDF document with caption.
     """
     # Preview image with caption
-    if _path_exists(STARTUP_PDF_PREVIEW):
+    preview = ASSETS.get("STARTUP_PDF_PREVIEW")
+    if preview is not None:
         try:
-            with open(Path(STARTUP_PDF_PREVIEW), "rb") as f:
-                await context.bot.send_photo(
+            await SUPERVISOR.send_once(chat_id, preview, lambda: MEDIA_CACHE.send(
+                "photo", preview,
+                lambda media: context.bot.send_photo(
                     chat_id=chat_id,
-                    photo=f,
+                    rate_limit_args=LANE_DRIP,
+                    photo=media,
                     # caption="📘 Here’s your guide. Please read it before continuing.",
-                )
+                ),
+            ))
         except Exception as e:
             log.warning("Failed to send STARTUP_PDF_PREVIEW: %s", e)
     else:
         log.warning("Guide preview missing: %s", STARTUP_PDF_PREVIEW)
 
     # PDF document with caption
-    if _path_exists(STARTUP_PDF_FILE):
+    pdf = ASSETS.get("STARTUP_PDF_FILE")
+    if pdf is not None:
         try:
-            with open(Path(STARTUP_PDF_FILE), "rb") as f:
-                await context.bot.send_document(
+            await SUPERVISOR.send_once(chat_id, pdf, lambda: MEDIA_CACHE.send(
+                "document", pdf,
+                lambda media: context.bot.send_document(
                     chat_id=chat_id,
-                    document=f,
-                    filename=Path(STARTUP_PDF_FILE).name,
+                    rate_limit_args=LANE_DRIP,
+                    document=media,
+                    filename=pdf.filename,
                     caption="📄 Here is your Copy Trading Guide PDF attached. Please read carefully.",
-                )
+                ),
+            ))
         except Exception as e:
             log.warning("Failed to send STARTUP_PDF_FILE: %s", e)
             await _safe_send_message(
                 context, chat_id,
-                "I couldn’t send the PDF file right now. Please contact support."
+                "I couldn’t send the PDF file right now. Please contact support.",
+                lane=LANE_DRIP,
             )
     else:
         await _safe_send_message(
             context, chat_id,
-            "Guide PDF is not configured on the server. Please contact support."
+            "Guide PDF is not configured on the server. Please contact support.",
+            lane=LANE_DRIP,
         )
 
 
 async def _send_setup_video(context: ContextTypes.DEFAULT_TYPE, chat_id: int) -> None:
     """Prefer MP4 (plays inside Telegram). Fallback to preview + link."""
-    if _path_exists(SETUP_VIDEO_FILE):
+    video = ASSETS.get("SETUP_VIDEO_FILE")
+    if video is not None:
         try:
-            with open(Path(SETUP_VIDEO_FILE), "rb") as f:
-                await context.bot.send_video(
-                    chat_id=chat_id,
-                    video=f,
-                    caption="▶️ Watch this video to set up your trading account.",
-                    supports_streaming=True,
-                )
+            await SUPERVISOR.send_once(chat_id, video, lambda: _send_video_asset(
+                context, chat_id, video, "video", caption="▶️ Watch this video to set up your trading account.",
+            ))
             return
         except Exception as e:
             log.warning("Failed to send SETUP_VIDEO_FILE: %s", e)
 
     # Fallback
     if not SETUP_VIDEO_LINK:
-        await _safe_send_message(context, chat_id, "Setup video is not configured. Please contact support.")
+        await _safe_send_message(context, chat_id, "Setup video is not configured. Please contact support.",
+                                 lane=LANE_DRIP)
         return
 
     btn = InlineKeyboardMarkup([[InlineKeyboardButton("▶️ Watch setup video", url=SETUP_VIDEO_LINK)]])
-    if _path_exists(SETUP_VIDEO_PREVIEW):
+    preview = ASSETS.get("SETUP_VIDEO_PREVIEW")
+    if preview is not None:
         try:
-            with open(Path(SETUP_VIDEO_PREVIEW), "rb") as f:
-                await context.bot.send_photo(
+            await SUPERVISOR.send_once(chat_id, preview, lambda: MEDIA_CACHE.send(
+                "photo", preview,
+                lambda media: context.bot.send_photo(
                     chat_id=chat_id,
-                    photo=f,
+                    rate_limit_args=LANE_DRIP,
+                    photo=media,
                     caption="▶️ Setup video (preview)\nTap below to watch:",
                     reply_markup=btn,
-                )
+                ),
+            ))
             return
         except Exception as e:
             log.warning("Failed to send SETUP_VIDEO_PREVIEW: %s", e)
 
-    await _safe_send_message(context, chat_id, "▶️ Setup video:\nTap below to watch:", reply_markup=btn)
+    await _safe_send_message(context, chat_id, "▶️ Setup video:\nTap below to watch:", reply_markup=btn,
+                             lane=LANE_DRIP)
 
 
 # ============================================================
 # Flow Steps
 # ============================================================
 
-async def _run_intro_sequence(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Your exact start sequence: welcome -> wait -> CEO video -> wait -> guide -> wait -> proceed prompt."""
-    chat_id = update.effective_chat.id
-
-    # 1) Welcome message
-    await update.message.reply_text(
-         "📊Welcome to E2T Copy Trading.📊\n\n"
-         "We’ll get you set up in a few steps. \n\n"
-         "In a few seconds, you will soon receive our introductory message from our CEO, Bradley Goldberg."
-    )
+WELCOME_TEXT = (
+    "📊Welcome to E2T Copy Trading.📊\n\n"
+    "We’ll get you set up in a few steps. \n\n"
+    "In a few seconds, you will soon receive our introductory message from our CEO, Bradley Goldberg."
+)
 
-    # 2) wait 5 seconds and then send CEO video note
-    await asyncio.sleep(DELAY_BEFORE_CEO_VIDEO)
-    await _send_ceo_video_note(context, chat_id)
 
-    # 3) after sending video note, wait 8 seconds
-    await asyncio.sleep(DELAY_AFTER_CEO_VIDEO)
+def _queued_text(position: int) -> str:
+    return (
+        "⏳ We’re welcoming a lot of new members right now.\n\n"
+        f"You’re number {position} in the queue. Your onboarding will start automatically in a moment — "
+        "no need to press /start again."
+    )
 
-    # 4) send guide (caption on preview, then PDF with caption)
-    await _send_guide_pack(context, chat_id)
 
-    # 5) wait 3 seconds then proceed/cancel
-    await asyncio.sleep(DELAY_AFTER_GUIDE)
+async def _send_proceed_prompt(context: ContextTypes.DEFAULT_TYPE, chat_id: int) -> None:
     await _safe_send_message(
         context,
         chat_id,
@@ -242,12 +522,205 @@ async def _run_intro_sequence(update: Update, context: ContextTypes.DEFAULT_TYPE
                 [InlineKeyboardButton("❌ CANCEL", callback_data="CANCEL")],
             ]
         ),
+        lane=LANE_DRIP,
+    )
+
+
+async def _send_affiliate_link(context: ContextTypes.DEFAULT_TYPE, chat_id: int) -> None:
+    await _safe_send_message(
+        context,
+        chat_id,
+        "Once you understand, click the button below and follow the link to set up your account "
+        "for our Copy Trading system.",
+        reply_markup=InlineKeyboardMarkup(
+            [[InlineKeyboardButton("Open trading account", url=AFFILIATE_LINK)]]
+        ),
+        lane=LANE_DRIP,
+    )
+
+
+async def _finish_intro(context: ContextTypes.DEFAULT_TYPE, chat_id: int) -> None:
+    """Last intro step: free the chat's intro slot for the next one in the queue, nudge if they don't proceed."""
+    _schedule_admission(context, ADMISSION.release(chat_id))
+    REMINDERS.schedule(chat_id, chat_id, S_START_DECISION)  # private chat: chat_id == user_id
+
+
+async def _send_final_instructions(context: ContextTypes.DEFAULT_TYPE, chat_id: int) -> None:
+    await _safe_send_message(
+        context,
+        chat_id,
+        "✅ After you’ve opened your account, please confirm with our team.\n\n"
+        f"Message {TELEGRAM_SUPPORT} with:\n"
+        "• Your full name\n"
+        "• The email address you used to open the account\n\n"
+        "We’ll then add you to our Premium Copy Trader.",
+        lane=LANE_DRIP,
+    )
+
+
+# Timed parts of the flow. Each delay is counted from the end of the previous step.
+DRIP = DripScheduler(
+    {
+        # welcome -> wait -> CEO video -> wait -> guide -> wait -> proceed prompt
+        "intro": (
+            DripStep(DELAY_BEFORE_CEO_VIDEO, _send_ceo_video_note),
+            DripStep(DELAY_AFTER_CEO_VIDEO, _send_guide_pack),
+            DripStep(DELAY_AFTER_GUIDE, _send_proceed_prompt),
+            DripStep(0, _finish_intro),
+        ),
+        # setup video -> wait -> affiliate link -> wait -> final instruction
+        "post_review": (
+            DripStep(0, _send_setup_video),
+            DripStep(DELAY_AFTER_SETUP_VIDEO, _send_affiliate_link),
+            DripStep(DELAY_BEFORE_FINAL_MESSAGE, _send_final_instructions),
+        ),
+    }
+)
+
+# One sequence per chat: a new /start or RESTART cancels the one in flight
+SUPERVISOR = ChatSupervisor(DRIP, dedupe_window=MEDIA_DEDUPE_WINDOW)
+DRIP_HANDOFF = DripHandoff(shard_path(DRIP_HANDOFF_FILE, SHARD_INDEX, SHARD_COUNT))
+
+
+async def _begin_intro(context: ContextTypes.DEFAULT_TYPE, chat_id: int) -> None:
+    SUPERVISOR.supersede(context.job_queue, chat_id)
+    await _safe_send_message(context, chat_id, WELCOME_TEXT)
+    SUPERVISOR.start(context.job_queue, chat_id, "intro")
+
+
+async def _run_intro_sequence(context: ContextTypes.DEFAULT_TYPE, chat_id: int) -> None:
+    """
+    Send the welcome now and leave the rest of the intro to the drip scheduler,
+    or put the chat in the waiting room if the intro is at capacity.
+    """
+    position = ADMISSION.request(chat_id)
+    if position is None:
+        await _begin_intro(context, chat_id)
+        return
+    await _safe_send_message(
+        context, chat_id, _queued_text(position),
+        reply_markup=_kb(InlineKeyboardButton("❌ Leave the queue", callback_data="LEAVE_QUEUE")),
     )
 
 
+async def _admit_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    pending = list(context.job.data)
+    while pending:
+        chat_id = pending.pop(0)
+        try:
+            await _begin_intro(context, chat_id)
+        except Forbidden:
+            pending.extend(ADMISSION.leave(chat_id, ABANDON_BLOCKED))  # blocked the bot while waiting
+        except Exception as e:
+            log.warning("Failed to start intro for promoted chat_id=%s: %s", chat_id, e)
+
+
+def _schedule_admission(context: ContextTypes.DEFAULT_TYPE, chat_ids: list) -> None:
+    # Own job: a drip step that frees a slot may itself be cancelled, the promotion must not be
+    if chat_ids:
+        context.job_queue.run_once(_admit_job, 0, data=chat_ids, name="admission:promote")
+
+
+async def _reap_admission(context: ContextTypes.DEFAULT_TYPE) -> None:
+    _schedule_admission(context, ADMISSION.reap())
+
+
+_REMINDER_TEXT = {
+    S_START_DECISION: "👋 Still with us? Your setup only takes a minute — press PROCEED below when you’re ready.",
+    S_EMAIL: "👋 Still there? Just type your email address to continue your setup.",
+    S_PHONE: "👋 Almost there! Type your mobile number with country code (e.g. +447123456789) to continue.",
+    S_REGION: "👋 One last detail: select your region below to continue.",
+    S_REVIEW: "👋 Your details are ready — please confirm them below to finish your setup.",
+}
+
+
+def _reminder_markup(state: int) -> Optional[InlineKeyboardMarkup]:
+    # The buttons the user would have pressed: the conversation is still waiting for them
+    if state == S_START_DECISION:
+        return _kb(InlineKeyboardButton("✅ PROCEED", callback_data="PROCEED"))
+    if state == S_REGION:
+        return InlineKeyboardMarkup([[InlineKeyboardButton(r, callback_data=f"REGION::{r}")] for r in REGIONS])
+    if state == S_REVIEW:
+        return InlineKeyboardMarkup(
+            [
+                [InlineKeyboardButton("✏️ I need to edit my details", callback_data="EDIT_DETAILS")],
+                [InlineKeyboardButton("✅ My details are correct", callback_data="DETAILS_OK")],
+            ]
+        )
+    return None
+
+
+async def _send_reminder(bot, chat_id: int, state: int, step: int) -> None:
+    text = _REMINDER_TEXT[state]
+    if step == len(REMINDER_DELAYS) - 1 and step > 0:
+        text += "\n\nThis is our last reminder."
+    await bot.send_message(chat_id=chat_id, text=text, reply_markup=_reminder_markup(state),
+                           rate_limit_args=LANE_BULK)
+
+
+# One pending nudge series per stalled user; progress replaces it, END / timeout cancel it
+REMINDERS = ReminderScheduler(REMINDERS_DB, REMINDER_DELAYS, _send_reminder)
+
+
+def _acked(callback):
+    """
+    CallbackQuery handlers: answer the query before the handler runs, so the button stops
+    spinning however long the rest takes. Records time-to-ack and end-to-end latency per
+    callback type; a handler that _defer()s work finishes when that job does.
+    """
+    @functools.wraps(callback)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        started = time.monotonic()
+        kind = callback_kind(update.callback_query.data)
+        try:
+            await update.callback_query.answer()
+        except BadRequest as e:  # "query is too old": the user waited too long, still act on the tap
+            log.info("Late callback answer (%s) chat_id=%s: %s", kind, update.effective_chat.id, e)
+        CALLBACK_LATENCY.acked(kind, started)
+        context.callback_timing = (kind, started)
+        try:
+            return await callback(update, context)
+        finally:
+            if context.callback_timing is not None:  # nothing deferred
+                CALLBACK_LATENCY.finished(kind, started)
+    return wrapper
+
+
+async def _defer(context: ContextTypes.DEFAULT_TYPE, job, on_failure=None) -> None:
+    """Hand the rest of an _acked callback's work to the background pipeline."""
+    kind, started = context.callback_timing
+    context.callback_timing = None
+    await PIPELINE.submit(kind, job, started=started, on_failure=on_failure)
+
+
 def _reset_details(context: ContextTypes.DEFAULT_TYPE) -> None:
-    for k in ("email", "phone", "region"):
-        context.user_data.pop(k, None)
+    context.user_data.reset_details()
+
+
+def _tracked(callback):
+    """
+    Conversation callback wrapper: keeps the draft's state / last-seen current, drops it on END,
+    and (re)arms the user's reminders for the step they're now in. A callback that returns None
+    (e.g. the /help fallback) leaves the conversation, and its reminders, where they were.
+    """
+    @functools.wraps(callback)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        state = await callback(update, context)
+        if state is None:
+            return state
+        user_id = update.effective_user.id
+        if state == ConversationHandler.END:
+            context.application.drop_user_data(user_id)
+            REMINDERS.cancel(user_id)
+            return state
+        moved = context.user_data.state != state  # None after /start or RESTART cleared the draft
+        context.user_data.touch(state)
+        if state in (S_EMAIL, S_PHONE, S_REGION, S_REVIEW):
+            REMINDERS.schedule(user_id, update.effective_chat.id, state)
+        elif moved:
+            REMINDERS.cancel(user_id)  # S_START_DECISION: intro running; _finish_intro arms it
+        return state
+    return wrapper
 
 
 # ============================================================
@@ -258,14 +731,13 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     log.info("START received chat_id=%s user_id=%s", update.effective_chat.id, update.effective_user.id)
 
     context.user_data.clear()
-    await _run_intro_sequence(update, context)
+    await _run_intro_sequence(context, update.effective_chat.id)
     return S_START_DECISION
 
 
 async def start_decision(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle Proceed/Cancel after the guide pack."""
     query = update.callback_query
-    await query.answer()
 
     choice = query.data
 
@@ -275,6 +747,7 @@ async def start_decision(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return S_EMAIL
 
     if choice == "CANCEL":
+        REMINDERS.cancel(query.from_user.id)  # declined: no "finish your sign-up" nudges
         await query.edit_message_text(
             "Thank you for your time.\n\n"
             "If you wish to start again, click the button below.",
@@ -284,35 +757,21 @@ async def start_decision(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return S_START_DECISION
 
+    if choice == "LEAVE_QUEUE":
+        if ADMISSION.position(query.message.chat_id) is None:
+            await query.edit_message_text("Your onboarding has already started — see the messages below.")
+            return S_START_DECISION
+        ADMISSION.leave(query.message.chat_id)
+        await query.edit_message_text("You’ve left the queue. Send /start whenever you’re ready.")
+        return ConversationHandler.END
+
     if choice == "RESTART":
-        # Re-run the whole intro sequence
+        # Re-run the whole intro sequence; the user asked for it, so the media go out again
         context.user_data.clear()
-        # We can't use update.message here, so send via bot and then run sequence via a helper
+        SUPERVISOR.supersede(context.job_queue, query.message.chat_id)
+        SUPERVISOR.forget(query.message.chat_id)
         await context.bot.send_message(chat_id=query.message.chat_id, text="Restarting…")
-        # Fake an Update.message isn't possible; so we re-send intro manually:
-        # We'll call the same parts using chat_id directly.
-        # To keep it simple, we call a minimal version here:
-        await context.bot.send_message(
-            chat_id=query.message.chat_id,
-            text="📊Welcome to E2T Copy Trading.📊\n\n"
-                 "We’ll get you set up in a few steps. \n\n"
-                 "In a few seconds, you will soon receive our introductory message from our CEO, Bradley Goldberg."
-        )
-        await asyncio.sleep(DELAY_BEFORE_CEO_VIDEO)
-        await _send_ceo_video_note(context, query.message.chat_id)
-        await asyncio.sleep(DELAY_AFTER_CEO_VIDEO)
-        await _send_guide_pack(context, query.message.chat_id)
-        await asyncio.sleep(DELAY_AFTER_GUIDE)
-        await context.bot.send_message(
-            chat_id=query.message.chat_id,
-            text="Before you proceed we just require some details from you.\n\nIf you wish to continue please click PROCEED below.",
-            reply_markup=InlineKeyboardMarkup(
-                [
-                    [InlineKeyboardButton("✅ PROCEED", callback_data="PROCEED")],
-                    [InlineKeyboardButton("❌ CANCEL", callback_data="CANCEL")],
-                ]
-            ),
-        )
+        await _run_intro_sequence(context, query.message.chat_id)
         return S_START_DECISION
 
     return S_START_DECISION
@@ -329,7 +788,7 @@ async def take_email(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return S_EMAIL
 
-    context.user_data["email"] = email
+    context.user_data.email = email
 
     await update.message.reply_text(
         "2️⃣ STEP 2: \n\nPlease enter your mobile number with country code.\n\n"
@@ -352,7 +811,7 @@ async def take_phone(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return S_PHONE
 
-    context.user_data["phone"] = normalize_phone(phone_raw)
+    context.user_data.phone = normalize_phone(phone_raw)
 
     buttons = [[InlineKeyboardButton(r, callback_data=f"REGION::{r}")] for r in REGIONS]
     await update.message.reply_text(
@@ -364,7 +823,6 @@ async def take_phone(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def region_choice(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
-    await query.answer()
 
     data = query.data or ""
     if not data.startswith("REGION::"):
@@ -376,12 +834,11 @@ async def region_choice(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.edit_message_text("Please choose a valid region.")
         return S_REGION
 
-    context.user_data["region"] = region
+    context.user_data.region = region
 
     # 7) Review details with Edit/Confirm buttons (do NOT save yet)
-    email = context.user_data.get("email", "")
-    phone = context.user_data.get("phone", "")
-    region = context.user_data.get("region", "")
+    email = context.user_data.email or ""
+    phone = context.user_data.phone or ""
 
     await query.edit_message_text(
         "✅ Done — Please review your details before continuing:\n\n"
@@ -399,9 +856,33 @@ async def region_choice(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return S_REVIEW
 
 
+def _store_lookup(user_id: int, email: Optional[str], phone: Optional[str]) -> Optional[dict]:
+    """Blocking. Newest lead for the telegram_id, else the email, else the phone, straight from the store."""
+    for found in (
+        LEAD_STORE.by_telegram_id(user_id),
+        LEAD_STORE.by_email(email) if email else [],
+        LEAD_STORE.by_phone(phone) if phone else [],
+    ):
+        if found:
+            return found[-1]
+    return None
+
+
+async def _find_existing_lead(user_id: int, data: dict) -> Optional[dict]:
+    lead_id = LEAD_INDEX.find(user_id, data.get("email"), data.get("phone"))
+    if lead_id is None:
+        if SHARD_COUNT <= 1:
+            return None
+        # Other shards add leads to the shared store, not to this process's index
+        return await asyncio.to_thread(_store_lookup, user_id, data.get("email"), data.get("phone"))
+    record = await asyncio.to_thread(LEAD_STORE.get, lead_id)
+    if record is None or not same_person(record, user_id, data.get("email"), data.get("phone")):
+        return None
+    return record
+
+
 async def review_choice(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
-    await query.answer()
 
     if query.data == "EDIT_DETAILS":
         _reset_details(context)
@@ -411,85 +892,354 @@ async def review_choice(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if query.data != "DETAILS_OK":
         return S_REVIEW
 
-    # Only now save lead
+    # The tap is already answered; the lead is saved (or the existing one refreshed) in the
+    # background, and the user is only told it worked once it is on disk
     user = query.from_user
-    csv_path = save_lead_csv(
-        base_dir=LEADS_DIR,
-        user_id=user.id,
-        username=user.username,
-        data=context.user_data,
-    )
-    log.info("Saved lead user_id=%s username=%s -> %s", user.id, user.username, csv_path)
-
-    # 8) Send setup video with caption
-    await query.edit_message_text("✅ Perfect — thanks! Now please watch the setup video below.")
-    await _send_setup_video(context, query.message.chat_id)
-
-    # 9) wait 5 seconds then send affiliate message
-    await asyncio.sleep(DELAY_AFTER_SETUP_VIDEO)
-    await context.bot.send_message(
-        chat_id=query.message.chat_id,
-        text=(
-            "Once you understand, click the button below and follow the link to set up your account "
-            "for our Copy Trading system."
-        ),
-        reply_markup=InlineKeyboardMarkup(
-            [[InlineKeyboardButton("Open trading account", url=AFFILIATE_LINK)]]
-        ),
-    )
+    chat_id = query.message.chat_id
+    data = context.user_data.details()
+    if LEAD_INDEX.find(user.id, None, None) is not None:  # only this account's own lead is refreshed
+        confirmation = (
+            "✅ You're already registered with us — we've updated your details.\n\n"
+            "Here's the setup video again in case you need it."
+        )
+    else:
+        confirmation = "✅ Perfect — thanks! Now please watch the setup video below."
 
-    # 10) wait 8 seconds then final instruction
-    await asyncio.sleep(DELAY_BEFORE_FINAL_MESSAGE)
-    await context.bot.send_message(
-        chat_id=query.message.chat_id,
-        text=(
-            "✅ After you’ve opened your account, please confirm with our team.\n\n"
-            f"Message {TELEGRAM_SUPPORT} with:\n"
-            "• Your full name\n"
-            "• The email address you used to open the account\n\n"
-            "We’ll then add you to our Premium Copy Trader."
-        ),
+    await query.edit_message_text("⏳ Saving your details…")  # also takes the buttons away
+    # Built once: every retry of the job writes this same row, so the store can't get a second copy
+    row = lead_row(user.id, user.username, data)
+    await _defer(
+        context,
+        functools.partial(_save_and_confirm, context, query, user.id, user.username, data, row, confirmation),
+        on_failure=functools.partial(_lead_not_saved, context.bot, chat_id),
     )
 
     context.user_data.clear()
     return ConversationHandler.END
 
 
+async def _save_lead(user_id: int, username: Optional[str], data: dict, row: list) -> None:
+    """
+    Pipeline job: refresh this user's own lead, or store a new one. Retried as a whole if it raises,
+    with the same `row` (lead_row), so the store's (timestamp, telegram_id) key makes a retry a no-op.
+    A lead matched only by email or phone but owned by another Telegram account is never touched:
+    the submission becomes a new lead instead.
+    """
+    existing = await _find_existing_lead(user_id, data)
+    if existing is not None and int(existing["telegram_id"]) == user_id:
+        fsync = LEADS_FSYNC == "always"
+        await asyncio.to_thread(LEAD_STORE.update, existing["id"], row, fsync)
+        # leads.csv is the log of every confirmed submission, refreshes included
+        await asyncio.to_thread(append_lead_rows, LEADS_DIR, [row], fsync)
+        LEAD_INDEX.discard(existing["id"], existing["telegram_id"], existing["email"], existing["phone"])
+        LEAD_INDEX.add(existing["id"], user_id, data.get("email"), data.get("phone"))
+        log.info("Repeat lead user_id=%s username=%s -> updated lead #%s", user_id, username, existing["id"])
+        return
+    if existing is not None:
+        log.info("Lead user_id=%s shares an email/phone with lead #%s of user_id=%s; stored as a new lead",
+                 user_id, existing["id"], existing["telegram_id"])
+
+    csv_path = await LEAD_WRITER.submit_row(row)
+    # The lead is durable from here on: a failure below must not make a retry write it twice
+    try:
+        lead_id = await asyncio.to_thread(LEAD_STORE.latest_id_for, user_id)
+        if lead_id is not None:
+            LEAD_INDEX.add(lead_id, user_id, data.get("email"), data.get("phone"))
+    except Exception as e:
+        log.warning("Lead for user_id=%s saved but not indexed (rebuilt on restart): %s", user_id, e)
+    log.info("Saved lead user_id=%s username=%s -> %s", user_id, username, csv_path)
+
+
+async def _save_and_confirm(context: ContextTypes.DEFAULT_TYPE, query, user_id: int, username: Optional[str],
+                            data: dict, row: list, confirmation: str) -> None:
+    """Pipeline job for DETAILS_OK: save the lead, then confirm. Only the save is retried."""
+    await _save_lead(user_id, username, data, row)
+    chat_id = query.message.chat_id
+    try:
+        await query.edit_message_text(confirmation)
+    except TelegramError as e:  # not worth a retry: that would save the lead again
+        log.warning("Lead saved but confirmation not shown chat_id=%s: %s", chat_id, e)
+    # 8) Setup video, affiliate link and final instruction follow on the drip scheduler
+    SUPERVISOR.start(context.job_queue, chat_id, "post_review")
+
+
+async def _lead_not_saved(bot, chat_id: int, error: BaseException) -> None:
+    await bot.send_message(
+        chat_id=chat_id,
+        text="⚠️ Sorry — we couldn’t save your details just now.\n\n"
+             f"Please message {TELEGRAM_SUPPORT} with your email and phone number and we’ll finish your setup.",
+    )
+
+
+async def session_timeout(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """The user went quiet mid-onboarding: record where they stopped, then free the draft."""
+    user_id = update.effective_user.id
+    await asyncio.to_thread(_record_dropoffs, {user_id: context.user_data})
+    context.application.drop_user_data(user_id)
+    REMINDERS.cancel(user_id)
+
+
+async def _sweep_sessions(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Forget the empty drafts PTB creates for every user who sends anything (admins, /help, ...)."""
+    app = context.application
+    for user_id in [uid for uid, d in app.user_data.items() if not d]:
+        app.drop_user_data(user_id)
+
+
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("Use /start to begin the onboarding process.")
 
 
-def main():
+# ============================================================
+# Admin: broadcasts
+# ============================================================
+
+BROADCAST_USAGE = (
+    "Usage (filters optional, message on the following lines):\n\n"
+    "/broadcast region=\"UK/EU\" since=2026-01-01 until=2026-02-01\n"
+    "Webinar tonight at 7pm UK time!"
+)
+
+
+def _parse_broadcast_filters(line: str) -> dict:
+    opts = {}
+    for token in shlex.split(line)[1:]:  # skip the /broadcast itself
+        key, sep, value = token.partition("=")
+        if not sep or key not in ("region", "since", "until"):
+            raise ValueError(f"Unknown filter: {token}")
+        if key == "region" and value not in REGIONS:
+            raise ValueError(f"Unknown region: {value} (one of {', '.join(REGIONS)})")
+        if key in ("since", "until"):
+            datetime.fromisoformat(value)  # raises ValueError
+        opts[key] = value
+    return opts
+
+
+async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    head, _, body = (update.message.text or "").partition("\n")
+    body = body.strip()
+    if not body:
+        await update.message.reply_text(BROADCAST_USAGE)
+        return
+    try:
+        opts = _parse_broadcast_filters(head)
+    except ValueError as e:
+        await update.message.reply_text(f"❌ {e}\n\n{BROADCAST_USAGE}")
+        return
+    if BROADCASTS.running:
+        await update.message.reply_text(f"❌ Broadcast {BROADCASTS.current.id} is still running (/broadcast_status).")
+        return
+
+    recipients = await asyncio.to_thread(LEAD_STORE.telegram_ids, **opts)
+    if not recipients:
+        await update.message.reply_text("No leads match those filters.")
+        return
+
+    campaign = Campaign(
+        id=datetime.now().strftime("%Y%m%d-%H%M%S"),
+        text=body,
+        recipients=recipients,
+        admin_chat_id=update.effective_chat.id,
+        **opts,
+    )
+    BROADCASTS.start(context.bot, campaign)
+    log.info("Broadcast %s started by user_id=%s: %s recipients %s",
+             campaign.id, update.effective_user.id, len(recipients), opts)
+    await update.message.reply_text(
+        f"📣 Broadcast {campaign.id} started: {len(recipients)} recipients.\n"
+        "/broadcast_status to follow it, /broadcast_cancel to stop it."
+    )
+
+
+async def broadcast_status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if BROADCASTS.current is None:
+        await update.message.reply_text("No broadcast since the bot started.")
+        return
+    r = BROADCASTS.stats()
+    await update.message.reply_text(
+        f"📣 Broadcast {r['id']}: {r['status']}\n\n"
+        f"Sent: {r['sent']} / {r['recipients']} (pending {r['pending']})\n"
+        f"Blocked the bot: {r['blocked']}\n"
+        f"Failed: {r['failed']}"
+    )
+
+
+async def broadcast_cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if BROADCASTS.cancel():
+        await update.message.reply_text("Cancelling — you'll get the report in a moment.")
+    else:
+        await update.message.reply_text("No broadcast is running.")
+
+
+def _current_assets() -> list:
+    return [ASSETS.get(name) for name in ASSETS.paths]
+
+
+async def _refresh_assets(context: ContextTypes.DEFAULT_TYPE) -> None:
+    if await asyncio.to_thread(ASSETS.refresh):
+        MEDIA_CACHE.prune(_current_assets())  # file_ids of the replaced versions are dead weight now
+        await _preflight_media()
+
+
+async def _on_init(app: Application) -> None:
+    # Preflight: stat/hash every asset once (missing files are logged here, not mid-conversation)
+    await asyncio.to_thread(ASSETS.load)
+    MEDIA_CACHE.prune(_current_assets())
+    await _preflight_media()
+    csv_path = os.path.join(LEADS_DIR, "leads.csv")
+    if SHARD_INDEX == 0 and os.path.isfile(csv_path) and await asyncio.to_thread(LEAD_STORE.count) == 0:
+        inserted, skipped = await asyncio.to_thread(LEAD_STORE.import_csv, csv_path)
+        log.info("Lead store seeded from %s: %s imported, %s skipped", csv_path, inserted, skipped)
+    loaded = await asyncio.to_thread(LEAD_INDEX.load, LEAD_STORE.iter_index_rows())
+    log.info("Lead index loaded: %s leads (%s)", loaded, LEAD_INDEX.stats())
+    await LEAD_WRITER.start()
+    await PIPELINE.start()
+    if BROADCASTS.resume(app.bot):
+        log.info("Resumed broadcast %s", BROADCASTS.current.id)
+    pending = await REMINDERS.start(app.bot, owns=_owns if SHARD_COUNT > 1 else None)
+    log.info("Reminders: %s pending (delays %s)", pending, REMINDER_DELAYS)
+    steps, delivered, admission = await asyncio.to_thread(DRIP_HANDOFF.take)
+    if steps:
+        SUPERVISOR.restore_deliveries(delivered)
+        resumed = DRIP.restore(app.job_queue, steps, max_late=ONBOARDING_IDLE_TIMEOUT)
+        log.info("Resumed %s of %s drip sequences handed over by the previous process", resumed, len(steps))
+    if admission:
+        # Chats told to wait keep their place; whoever fits in a free slot starts right away
+        admit = ADMISSION.restore(admission.get("active", []), admission.get("waiting", []))
+        if admit:
+            app.job_queue.run_once(_admit_job, 0, data=admit, name="admission:promote")
+        log.info("Waiting room restored: %s waiting, %s admitted now", ADMISSION.stats()["waiting"], len(admit))
+
+
+async def _on_stop(app: Application) -> None:
+    # No more updates, and the JobQueue stopped after its running steps finished: what is left of
+    # each drip sequence goes to the next process, along with the media those chats just got and
+    # the waiting room
+    steps = DRIP.pending()
+    admission = ADMISSION.snapshot()
+    try:
+        await asyncio.to_thread(DRIP_HANDOFF.save, steps, SUPERVISOR.deliveries({s[0] for s in steps}), admission)
+        if steps or admission["waiting"]:
+            log.info("Handed over %s drip sequences in flight and %s queued chats", len(steps), len(admission["waiting"]))
+    except OSError as e:
+        log.error("Could not save %s drip sequences and %s queued chats, they are lost: %s",
+                  len(steps), len(admission["waiting"]), e)
+    await MEDIA_CACHE.close()  # file_ids learnt in the last save_delay seconds
+    await BROADCASTS.shutdown()  # checkpointed, resumes on next start
+    await REMINDERS.close()  # pending series are on disk, the heap is rebuilt on next start
+    # Handlers are done by now: finish their deferred work, then write out every queued lead
+    await PIPELINE.close()
+    await LEAD_WRITER.close()
+
+
+async def _on_shutdown(app: Application) -> None:
+    log.info("Lead writer stats: %s", LEAD_WRITER.stats())
+    log.info("Lead index stats: %s", LEAD_INDEX.stats())
+    if BROADCASTS.current:
+        log.info("Broadcast stats: %s", BROADCASTS.stats())
+    LEAD_STORE.close()
+    log.info("Asset stats: %s", ASSETS.stats())
+    log.info("Media cache stats: %s", MEDIA_CACHE.stats())
+    log.info("Drip stats: %s", DRIP.stats())
+    log.info("Supervisor stats: %s", SUPERVISOR.stats())
+    log.info("Outbound stats: %s", OUTBOX.stats())
+    log.info("Throttle stats: %s", THROTTLE.stats())
+    log.info("Admission stats: %s", ADMISSION.stats())
+    log.info("Reminder stats: %s", REMINDERS.stats())
+    log.info("Pipeline stats: %s", PIPELINE.stats())
+    log.info("Callback latency: %s", CALLBACK_LATENCY.stats())
+    log.info("Persistence stats: %s", PERSISTENCE.stats())
+    log.info("Drop-offs since start: %s", DROPOFFS)
+
+
+def build_application() -> Application:
     if not BOT_TOKEN:
         raise RuntimeError("BOT_TOKEN is missing. Set it in your environment or .env file.")
 
-    app = Application.builder().token(BOT_TOKEN).build()
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .persistence(PERSISTENCE)
+        .context_types(ContextTypes(user_data=OnboardingDraft))
+        .rate_limiter(OUTBOX)
+        # Many chats at once, each chat in order: one user waiting on their per-chat send
+        # bucket must not hold up everyone else
+        .concurrent_updates(ChatOrderedUpdateProcessor(UPDATE_CONCURRENCY))
+        .post_init(_on_init)
+        .post_stop(_on_stop)
+        .post_shutdown(_on_shutdown)
+    )
+    if BOT_API_BASE_URL:
+        builder = builder.base_url(BOT_API_BASE_URL)
+    if BOT_MODE == "webhook":
+        # No Updater: the embedded server feeds this bounded queue directly
+        builder = builder.updater(None).update_queue(asyncio.Queue(maxsize=WEBHOOK_MAX_QUEUE))
+
+    app = builder.build()
+    if app.job_queue is None:
+        raise RuntimeError("JobQueue is unavailable. Install python-telegram-bot[job-queue].")
+
+    if ASSET_WATCH_INTERVAL > 0:
+        app.job_queue.run_repeating(_refresh_assets, interval=ASSET_WATCH_INTERVAL, first=ASSET_WATCH_INTERVAL,
+                                    name="assets:watch")
+    app.job_queue.run_repeating(_sweep_sessions, interval=600, first=600, name="sessions:sweep")
+    if ADMISSION.enabled:
+        app.job_queue.run_repeating(_reap_admission, interval=30, first=30, name="admission:reap")
 
     conv = ConversationHandler(
-        entry_points=[CommandHandler("start", start)],
+        entry_points=[CommandHandler("start", _tracked(start))],
         states={
-            S_START_DECISION: [CallbackQueryHandler(start_decision)],
-            S_EMAIL: [MessageHandler(filters.TEXT & ~filters.COMMAND, take_email)],
-            S_PHONE: [MessageHandler(filters.TEXT & ~filters.COMMAND, take_phone)],
-            S_REGION: [CallbackQueryHandler(region_choice)],
-            S_REVIEW: [CallbackQueryHandler(review_choice)],
+            S_START_DECISION: [CallbackQueryHandler(_tracked(_acked(start_decision)))],
+            S_EMAIL: [MessageHandler(filters.TEXT & ~filters.COMMAND, _tracked(take_email))],
+            S_PHONE: [MessageHandler(filters.TEXT & ~filters.COMMAND, _tracked(take_phone))],
+            S_REGION: [CallbackQueryHandler(_tracked(_acked(region_choice)))],
+            S_REVIEW: [CallbackQueryHandler(_tracked(_acked(review_choice)))],
+            ConversationHandler.TIMEOUT: [TypeHandler(Update, session_timeout)],
         },
-        fallbacks=[CommandHandler("help", help_command)],
+        fallbacks=[CommandHandler("help", _tracked(help_command))],
         allow_reentry=True,
         per_message=False,
+        name="onboarding",
+        persistent=True,
+        conversation_timeout=ONBOARDING_IDLE_TIMEOUT or None,
     )
 
+    if THROTTLE_RATE > 0:
+        # Group -1 runs before everything else; a dropped update never reaches the handlers below
+        app.add_handler(TypeHandler(Update, THROTTLE), group=-1)
     app.add_handler(conv)
     app.add_handler(CommandHandler("help", help_command))
+    if ADMIN_IDS:
+        admins = filters.User(user_id=ADMIN_IDS)
+        app.add_handler(CommandHandler("broadcast", broadcast_command, filters=admins))
+        app.add_handler(CommandHandler("broadcast_status", broadcast_status_command, filters=admins))
+        app.add_handler(CommandHandler("broadcast_cancel", broadcast_cancel_command, filters=admins))
+    return app
 
-    log.info("Bot started (polling). Leads dir: %s", LEADS_DIR)
-    log.info("CEO_VIDEO_NOTE_FILE exists=%s", _path_exists(CEO_VIDEO_NOTE_FILE))
-    log.info("STARTUP_PDF_FILE exists=%s", _path_exists(STARTUP_PDF_FILE))
-    log.info("STARTUP_PDF_PREVIEW exists=%s", _path_exists(STARTUP_PDF_PREVIEW))
-    log.info("SETUP_VIDEO_FILE exists=%s", _path_exists(SETUP_VIDEO_FILE))
-    log.info("SETUP_VIDEO_PREVIEW exists=%s", _path_exists(SETUP_VIDEO_PREVIEW))
 
-    app.run_polling(drop_pending_updates=True, close_loop=False)
+def main():
+    app = build_application()
+    allowed_updates = allowed_updates_for(app)
+
+    log.info("Bot started (%s). Leads dir: %s", BOT_MODE, LEADS_DIR)
+    log.info("Media cache: %s (%s cached file_ids)", MEDIA_CACHE_FILE, MEDIA_CACHE.stats()["entries"])
+    log.info("allowed_updates=%s", allowed_updates)
+
+    if BOT_MODE == "webhook":
+        asyncio.run(
+            serve_webhook(
+                app,
+                listen=WEBHOOK_LISTEN,
+                port=WEBHOOK_PORT,
+                path=WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET,
+                webhook_url=WEBHOOK_URL or None,
+                allowed_updates=allowed_updates,
+            )
+        )
+        return
+
+    app.run_polling(drop_pending_updates=True, allowed_updates=allowed_updates, close_loop=False)
 
 
 if __name__ == "__main__":
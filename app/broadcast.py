@@ -0,0 +1,232 @@
+"""
+Admin broadcast campaigns to collected leads.
+
+A campaign is a text message sent to every lead matching a region / date filter.
+Sends go through a small worker pool on the BULK lane of the outbound dispatcher
+(so onboarding replies always go first and Telegram's flood limits are respected),
+with an extra campaign-wide rate cap to leave headroom for live traffic.
+
+Progress is checkpointed to <directory>/<campaign id>.json every few seconds and on
+shutdown; a campaign still marked "running" is resumed on the next start. Delivery is
+at-least-once: a crash can repeat the sends of the last checkpoint interval.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from telegram import Bot
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+
+from app.outbox import LANE_BULK, TokenBucket
+
+log = logging.getLogger("e2t_onboarding_bot.broadcast")
+
+
+@dataclass
+class Campaign:
+    id: str
+    text: str
+    recipients: List[int]
+    admin_chat_id: Optional[int] = None
+    region: Optional[str] = None
+    since: Optional[str] = None
+    until: Optional[str] = None
+    status: str = "running"  # running | done | cancelled
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat(timespec="seconds"))
+    sent: List[int] = field(default_factory=list)
+    blocked: List[int] = field(default_factory=list)  # Forbidden: user blocked the bot / deactivated
+    failed: List[int] = field(default_factory=list)
+    send_seconds: float = 0.0  # time spent sending, summed over runs
+
+    def pending(self) -> List[int]:
+        done = set(self.sent) | set(self.blocked) | set(self.failed)
+        return [r for r in self.recipients if r not in done]
+
+    def report(self) -> Dict[str, Any]:
+        total = len(self.sent) + len(self.blocked) + len(self.failed)
+        return {
+            "id": self.id,
+            "status": self.status,
+            "recipients": len(self.recipients),
+            "sent": len(self.sent),
+            "blocked": len(self.blocked),
+            "failed": len(self.failed),
+            "pending": len(self.recipients) - total,
+            "seconds": round(self.send_seconds, 1),
+            "msgs_per_s": round(total / self.send_seconds, 2) if self.send_seconds else 0.0,
+        }
+
+
+class BroadcastManager:
+    def __init__(self, directory: str, *, concurrency: int = 8, rate: float = 20.0,
+                 checkpoint_interval: float = 2.0, max_attempts: int = 3):
+        self.directory = Path(directory)
+        self.concurrency = concurrency
+        self.rate = rate
+        self.checkpoint_interval = checkpoint_interval
+        self.max_attempts = max_attempts
+
+        self.current: Optional[Campaign] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # ---------------- checkpoints ----------------
+
+    def _path(self, campaign_id: str) -> Path:
+        return self.directory / f"{campaign_id}.json"
+
+    def _write(self, campaign_id: str, payload: str) -> None:
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self._path(campaign_id)
+            tmp = path.with_suffix(".json.tmp")
+            tmp.write_text(payload, encoding="utf-8")
+            os.replace(tmp, path)
+        except Exception as e:
+            log.warning("Failed to checkpoint broadcast %s: %s", campaign_id, e)
+
+    def _save(self, c: Campaign) -> None:
+        self._write(c.id, json.dumps(asdict(c)))
+
+    def _load_running(self) -> List[Campaign]:
+        out = []
+        for p in sorted(self.directory.glob("*.json")):
+            try:
+                c = Campaign(**json.loads(p.read_text(encoding="utf-8")))
+            except Exception as e:
+                log.warning("Ignoring unreadable broadcast checkpoint %s: %s", p, e)
+                continue
+            if c.status == "running":
+                out.append(c)
+        return out
+
+    # ---------------- control ----------------
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, bot: Bot, campaign: Campaign) -> None:
+        if self.running:
+            raise RuntimeError(f"Broadcast {self.current.id} is still running")
+        self.current = campaign
+        self._save(campaign)
+        self._task = asyncio.create_task(self._run(bot, campaign), name=f"broadcast-{campaign.id}")
+
+    def resume(self, bot: Bot) -> Optional[Campaign]:
+        """Pick up the oldest campaign left running by a previous process (others wait their turn)."""
+        if self.running:
+            return None
+        for c in self._load_running():
+            log.info("Resuming broadcast %s (%s pending)", c.id, len(c.pending()))
+            self.start(bot, c)
+            return c
+        return None
+
+    def cancel(self) -> bool:
+        if not self.running:
+            return False
+        self.current.status = "cancelled"
+        self._task.cancel()
+        return True
+
+    async def shutdown(self) -> None:
+        """Stop sending but leave the campaign 'running' on disk so the next start resumes it."""
+        if self.running:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return self.current.report() if self.current else {}
+
+    # ---------------- sending ----------------
+
+    async def _send_one(self, bot: Bot, c: Campaign, chat_id: int) -> None:
+        delay = 1.0
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await bot.send_message(chat_id=chat_id, text=c.text, rate_limit_args=LANE_BULK)
+                c.sent.append(chat_id)
+                return
+            except Forbidden:
+                c.blocked.append(chat_id)
+                return
+            except BadRequest as e:  # chat not found etc.: retrying won't help
+                log.info("Broadcast %s: chat_id=%s rejected: %s", c.id, chat_id, e)
+                c.failed.append(chat_id)
+                return
+            except (RetryAfter, NetworkError) as e:  # the dispatcher already retried RetryAfter
+                if attempt == self.max_attempts:
+                    log.info("Broadcast %s: giving up on chat_id=%s: %s", c.id, chat_id, e)
+                    c.failed.append(chat_id)
+                    return
+                await asyncio.sleep(delay)
+                delay *= 2
+            except TelegramError as e:
+                log.info("Broadcast %s: chat_id=%s failed: %s", c.id, chat_id, e)
+                c.failed.append(chat_id)
+                return
+
+    async def _run(self, bot: Bot, c: Campaign) -> None:
+        queue: asyncio.Queue = asyncio.Queue()
+        for chat_id in c.pending():
+            queue.put_nowait(chat_id)
+        bucket = TokenBucket(self.rate, 1.0, time.monotonic())
+
+        async def worker() -> None:
+            while True:
+                try:
+                    chat_id = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                wait = bucket.wait_time(time.monotonic())
+                while wait > 0:
+                    await asyncio.sleep(wait)
+                    wait = bucket.wait_time(time.monotonic())
+                bucket.consume()
+                await self._send_one(bot, c, chat_id)
+
+        async def checkpointer() -> None:
+            while True:
+                await asyncio.sleep(self.checkpoint_interval)
+                # serialise on the loop (workers keep appending), write in a thread
+                await asyncio.to_thread(self._write, c.id, json.dumps(asdict(c)))
+
+        t0 = time.monotonic()
+        ckpt = asyncio.create_task(checkpointer())
+        workers = [asyncio.create_task(worker()) for _ in range(max(1, self.concurrency))]
+        try:
+            await asyncio.gather(*workers)
+            c.status = "done"
+        finally:
+            for t in (*workers, ckpt):
+                t.cancel()
+            c.send_seconds += time.monotonic() - t0
+            self._save(c)
+            log.info("Broadcast %s %s: %s", c.id, c.status, c.report())
+            if c.admin_chat_id and c.status != "running":
+                await self._notify(bot, c)
+
+    async def _notify(self, bot: Bot, c: Campaign) -> None:
+        r = c.report()
+        try:
+            await bot.send_message(
+                chat_id=c.admin_chat_id,
+                text=(
+                    f"📣 Broadcast {r['id']} {r['status']}.\n\n"
+                    f"Sent: {r['sent']} / {r['recipients']}\n"
+                    f"Blocked the bot: {r['blocked']}\n"
+                    f"Failed: {r['failed']}\n"
+                    f"Time: {r['seconds']}s ({r['msgs_per_s']} msg/s)"
+                ),
+            )
+        except Exception as e:
+            log.warning("Failed to send broadcast report to admin %s: %s", c.admin_chat_id, e)
@@ -0,0 +1,212 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from apscheduler.jobstores.base import JobLookupError
+from telegram.ext import ContextTypes, Job, JobQueue
+
+log = logging.getLogger("e2t_onboarding_bot.drip")
+
+StepFn = Callable[[ContextTypes.DEFAULT_TYPE, int], Awaitable[None]]
+PendingStep = Tuple[int, str, int, float]  # (chat_id, plan, step index, due as epoch seconds)
+
+
+@dataclass(frozen=True)
+class DripStep:
+    """One timed step: wait `delay` seconds after the previous step, then run `action(context, chat_id)`."""
+    delay: float
+    action: StepFn
+
+
+class DripScheduler:
+    """
+    Runs named drip plans on the application's JobQueue instead of sleeping inside handlers.
+
+    Each step is a one-shot job that schedules the next step when it finishes, so a handler
+    only has to kick off step 0 and can return immediately. A chat runs at most one plan at a
+    time: starting a new plan (or calling cancel) supersedes whatever was in flight. A step that
+    is already executing runs as its own task and is cancelled too, so its sends still waiting
+    in the outbound queue are dropped instead of going out after the new plan's.
+
+    On shutdown, pending() lists the next step of every plan in flight with its absolute due
+    time, and the next process restore()s them with whatever delay is left (see DripHandoff).
+    """
+
+    def __init__(self, plans: Mapping[str, Sequence[DripStep]]):
+        self.plans: Dict[str, Sequence[DripStep]] = dict(plans)
+        self._active: Dict[int, int] = {}  # chat_id -> generation of the plan that owns the chat
+        self._jobs: Dict[int, Job] = {}  # chat_id -> pending job (kept so cancel is O(1))
+        self._steps: Dict[int, asyncio.Task] = {}  # chat_id -> step currently executing
+        self._gen = itertools.count(1)
+        self.started = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.interrupted = 0
+        self.failed_steps = 0
+        self.resumed = 0
+
+    def in_flight(self) -> int:
+        return len(self._active)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": self.in_flight(),
+            "started": self.started,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "interrupted": self.interrupted,
+            "failed_steps": self.failed_steps,
+            "resumed": self.resumed,
+        }
+
+    def start(self, job_queue: JobQueue, chat_id: int, plan: str) -> None:
+        if plan not in self.plans:
+            raise KeyError(f"Unknown drip plan: {plan}")
+
+        self.cancel(job_queue, chat_id)
+        gen = next(self._gen)
+        self._active[chat_id] = gen
+        self.started += 1
+        self._schedule(job_queue, chat_id, plan, 0, gen)
+
+    def cancel(self, job_queue: JobQueue, chat_id: int) -> bool:
+        """Cancel the chat's running plan. Returns True if there was one."""
+        job = self._jobs.pop(chat_id, None)
+        if self._active.pop(chat_id, None) is None:
+            return False
+        if job is not None and not job.removed:
+            try:
+                job.schedule_removal()
+            except JobLookupError:
+                pass  # already fired; the generation check stops it from chaining
+        step = self._steps.pop(chat_id, None)
+        if step is not None and not step.done():
+            step.cancel()
+            self.interrupted += 1
+
+        self.cancelled += 1
+        return True
+
+    def pending(self) -> List[PendingStep]:
+        """
+        The step each plan in flight would run next, with its due time. Taken after the JobQueue
+        has stopped, this includes a step that was cut off mid-run (it is due again at once).
+        """
+        out = []
+        for chat_id, job in self._jobs.items():
+            plan, index, gen, due = job.data
+            if self._active.get(chat_id) == gen:
+                out.append((chat_id, plan, index, due))
+        return out
+
+    def restore(self, job_queue: JobQueue, steps: Iterable[PendingStep], *, max_late: float = 0.0,
+                now: Optional[float] = None) -> int:
+        """
+        Resume plans handed over by a previous process: each step runs at its original due time,
+        or right away if that has passed. Steps more than `max_late` seconds overdue (0 = no limit)
+        and plans this process doesn't know are dropped. Returns the number resumed.
+        """
+        now = time.time() if now is None else now
+        resumed = 0
+        for chat_id, plan, index, due in steps:
+            if plan not in self.plans or not 0 <= index < len(self.plans[plan]):
+                log.warning("Not resuming unknown drip step plan=%s step=%s chat_id=%s", plan, index, chat_id)
+                continue
+            if max_late > 0 and now - due > max_late:
+                continue
+            self.cancel(job_queue, chat_id)
+            gen = next(self._gen)
+            self._active[chat_id] = gen
+            self._schedule(job_queue, chat_id, plan, index, gen, delay=max(0.0, due - now))
+            resumed += 1
+        self.resumed += resumed
+        return resumed
+
+    def _schedule(self, job_queue: JobQueue, chat_id: int, plan: str, index: int, gen: int,
+                  delay: Optional[float] = None) -> None:
+        if delay is None:
+            delay = max(0.0, float(self.plans[plan][index].delay))
+        self._jobs[chat_id] = job_queue.run_once(
+            self._run_step,
+            when=delay,
+            chat_id=chat_id,
+            name=f"drip:{plan}:{index}",
+            data=(plan, index, gen, time.time() + delay),
+        )
+
+    async def _run_step(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        plan, index, gen, _ = context.job.data
+        chat_id = context.job.chat_id
+        if self._active.get(chat_id) != gen:
+            return  # superseded
+
+        step = asyncio.ensure_future(self.plans[plan][index].action(context, chat_id))
+        self._steps[chat_id] = step
+        try:
+            await step
+        except asyncio.CancelledError:
+            if self._active.get(chat_id) == gen:
+                raise  # the job itself was cancelled (shutdown), not superseded
+            return
+        except Exception as e:
+            self.failed_steps += 1
+            log.warning("Drip step failed plan=%s step=%s chat_id=%s: %s", plan, index, chat_id, e)
+        finally:
+            if self._steps.get(chat_id) is step:
+                del self._steps[chat_id]
+
+        if self._active.get(chat_id) != gen:
+            return  # cancelled while the step was running
+
+        if index + 1 < len(self.plans[plan]):
+            self._schedule(context.job_queue, chat_id, plan, index + 1, gen)
+        else:
+            self._active.pop(chat_id, None)
+            self._jobs.pop(chat_id, None)
+            self.completed += 1
+
+
+class DripHandoff:
+    """
+    JSON file that carries drip plans in flight, the media each of those chats has just been
+    sent, and the intro slots and waiting room (AdmissionControl.snapshot()), from a process
+    that is shutting down to the next one. take() deletes the file, so a handoff is resumed
+    once even if the next process dies too.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path).expanduser()
+
+    def save(self, steps: List[PendingStep], delivered: List[Tuple[int, str, str, float]],
+             admission: Optional[Dict[str, List]] = None) -> None:
+        admission = {k: v for k, v in (admission or {}).items() if v}
+        if not steps and not admission:
+            self.path.unlink(missing_ok=True)
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps({"saved_at": time.time(), "steps": steps, "delivered": delivered,
+                                   "admission": admission}), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def take(self) -> Tuple[List[PendingStep], List[Tuple[int, str, str, float]], Dict[str, List]]:
+        """(steps, delivered, admission) left by the previous process, or empty ones."""
+        if not self.path.exists():
+            return [], [], {}
+        try:
+            data: Dict[str, Any] = json.loads(self.path.read_text(encoding="utf-8"))
+            steps = [(int(c), str(p), int(i), float(d)) for c, p, i, d in data.get("steps") or []]
+            delivered = [(int(c), str(n), str(h), float(t)) for c, n, h, t in data.get("delivered") or []]
+            admission = {k: [(int(c), float(t)) for c, t in v]
+                         for k, v in (data.get("admission") or {}).items() if k in ("active", "waiting")}
+        except Exception as e:
+            log.warning("Ignoring unreadable drip handoff %s: %s", self.path, e)
+            steps, delivered, admission = [], [], {}
+        self.path.unlink(missing_ok=True)
+        return steps, delivered, admission
@@ -0,0 +1,291 @@
+"""
+Local stand-in for the Telegram Bot API, for running the onboarding bot without network access.
+
+Point the bot at it with BOT_API_BASE_URL=http://127.0.0.1:<port>/bot and push updates with
+push_update(). If the bot registered a webhook (setWebhook) updates are POSTed there with the
+secret header, exactly like Telegram does; otherwise they are served through getUpdates.
+
+    python -m app.fake_bot_api --port 8081
+"""
+import argparse
+import asyncio
+import email
+import itertools
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+import httpx
+
+from app.httpd import Request, Response, serve
+
+log = logging.getLogger("e2t_onboarding_bot.fake_bot_api")
+
+_MEDIA_FIELD = {
+    "sendPhoto": "photo",
+    "sendDocument": "document",
+    "sendVideo": "video",
+    "sendVideoNote": "video_note",
+}
+
+
+@dataclass
+class Call:
+    method: str
+    params: Dict[str, Any]
+    at: float = field(default_factory=time.monotonic)
+
+    @property
+    def chat_id(self) -> Optional[int]:
+        v = self.params.get("chat_id")
+        return int(v) if isinstance(v, (int, str)) and str(v).lstrip("-").isdigit() else None
+
+
+def _decode_value(v: str) -> Any:
+    try:
+        return json.loads(v)
+    except ValueError:
+        return v
+
+
+def _parse_params(req: Request) -> Dict[str, Any]:
+    ctype = req.headers.get("content-type", "")
+    if not req.body:
+        return {k: _decode_value(v) for k, v in parse_qsl(req.query)}
+    if ctype.startswith("application/json"):
+        return req.json()
+    if ctype.startswith("multipart/form-data"):
+        msg = email.message_from_bytes(b"Content-Type: " + ctype.encode("latin-1") + b"\r\n\r\n" + req.body)
+        out: Dict[str, Any] = {}
+        for part in msg.get_payload() or []:
+            name = part.get_param("name", header="content-disposition")
+            if not name:
+                continue
+            if part.get_filename():
+                out[name] = {"upload": part.get_filename(), "size": len(part.get_payload(decode=True) or b"")}
+            else:
+                out[name] = _decode_value((part.get_payload(decode=True) or b"").decode("utf-8"))
+        return out
+    return {k: _decode_value(v) for k, v in parse_qsl(req.body.decode("utf-8"))}
+
+
+class FakeBotApi:
+    def __init__(self, token: str = "123456:FAKE", host: str = "127.0.0.1", port: int = 0, bot_id: int = 123456):
+        self.token = token
+        self.host = host
+        self.port = port
+        self.bot_user = {"id": bot_id, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}
+
+        self.calls: List[Call] = []
+        self.webhook: Optional[Dict[str, Any]] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._updates: List[Dict[str, Any]] = []  # kept until confirmed via getUpdates offset
+        self._updates_changed = asyncio.Event()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1000)
+        self._file_ids = itertools.count(1)
+        self._watchers: Dict[int, asyncio.Queue] = {}
+        self._delivery: set = set()
+        # (method, chat_id or None) -> list of (error_code, description, parameters) to return next
+        self._faults: Dict[Tuple[str, Optional[int]], List[Tuple[int, str, Dict[str, Any]]]] = {}
+        self.latency = 0.0  # artificial per-call latency (seconds)
+
+    # ---------------- lifecycle ----------------
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/bot"
+
+    async def start(self) -> "FakeBotApi":
+        self._server = await serve(self._handle, self.host, self.port, max_body=64 << 20)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._client = httpx.AsyncClient(timeout=10)
+        return self
+
+    async def stop(self) -> None:
+        for t in list(self._delivery):
+            t.cancel()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._client is not None:
+            await self._client.aclose()
+
+    async def __aenter__(self) -> "FakeBotApi":
+        return await self.start()
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
+
+    # ---------------- test controls ----------------
+
+    def watch(self, chat_id: int) -> asyncio.Queue:
+        """Queue that receives every Call made for chat_id from now on."""
+        return self._watchers.setdefault(chat_id, asyncio.Queue())
+
+    def inject_error(self, method: str, error_code: int, description: str,
+                     chat_id: Optional[int] = None, **parameters: Any) -> None:
+        """Make the next `method` call (optionally for one chat) fail, e.g. 429 with retry_after=3."""
+        self._faults.setdefault((method, chat_id), []).append((error_code, description, parameters))
+
+    def calls_for(self, method: str) -> List[Call]:
+        return [c for c in self.calls if c.method == method]
+
+    def message_update(self, user_id: int, text: str) -> Dict[str, Any]:
+        msg: Dict[str, Any] = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}", "username": f"user{user_id}"},
+            "text": text,
+        }
+        if text.startswith("/"):
+            msg["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return {"message": msg}
+
+    def callback_update(self, user_id: int, data: str, message_id: int = 1) -> Dict[str, Any]:
+        return {
+            "callback_query": {
+                "id": str(next(self._update_ids)),
+                "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}", "username": f"user{user_id}"},
+                "chat_instance": str(user_id),
+                "data": data,
+                "message": {
+                    "message_id": message_id,
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "text": "…",
+                },
+            }
+        }
+
+    async def push_update(self, update: Dict[str, Any]) -> None:
+        update = {"update_id": next(self._update_ids), **update}
+        if self.webhook:
+            t = asyncio.create_task(self._deliver(update))
+            self._delivery.add(t)
+            t.add_done_callback(self._delivery.discard)
+        else:
+            self._updates.append(update)
+            self._updates_changed.set()
+
+    async def _deliver(self, update: Dict[str, Any]) -> None:
+        """POST to the webhook the way Telegram does: retry until it answers 2xx."""
+        headers = {}
+        if self.webhook.get("secret_token"):
+            headers["X-Telegram-Bot-Api-Secret-Token"] = self.webhook["secret_token"]
+        delay = 0.05
+        while True:
+            try:
+                r = await self._client.post(self.webhook["url"], json=update, headers=headers)
+                if r.status_code < 300:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 2.0)
+
+    # ---------------- Bot API ----------------
+
+    async def _handle(self, req: Request) -> Response:
+        prefix = f"/bot{self.token}/"
+        if not req.path.startswith(prefix):
+            return Response.json({"ok": False, "error_code": 404, "description": "Not Found"}, 404)
+
+        method = req.path[len(prefix):]
+        params = _parse_params(req)
+        call = Call(method, params)
+        self.calls.append(call)
+        if call.chat_id is not None and call.chat_id in self._watchers:
+            self._watchers[call.chat_id].put_nowait(call)
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        for key in ((method, call.chat_id), (method, None)):
+            faults = self._faults.get(key)
+            if faults:
+                code, desc, parameters = faults.pop(0)
+                body = {"ok": False, "error_code": code, "description": desc}
+                if parameters:
+                    body["parameters"] = parameters
+                return Response.json(body, code)
+
+        result = await self._result(method, params)
+        return Response.json({"ok": True, "result": result})
+
+    def _message(self, chat_id: Any, **extra: Any) -> Dict[str, Any]:
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "private"},
+            "from": self.bot_user,
+            **extra,
+        }
+
+    def _file(self, kind: str, given: Any) -> Any:
+        fid = given if isinstance(given, str) else f"fake-{kind}-{next(self._file_ids)}"
+        f = {"file_id": fid, "file_unique_id": fid}
+        if kind == "photo":
+            return [{**f, "width": 320, "height": 320}]
+        if kind == "video_note":
+            return {**f, "length": 240, "duration": 10}
+        if kind == "video":
+            return {**f, "width": 640, "height": 360, "duration": 10}
+        return f
+
+    async def _result(self, method: str, params: Dict[str, Any]) -> Any:
+        if method == "getMe":
+            return self.bot_user
+        if method == "setWebhook":
+            self.webhook = {"url": params.get("url"), "secret_token": params.get("secret_token")}
+            if not self.webhook["url"]:
+                self.webhook = None
+            return True
+        if method == "deleteWebhook":
+            self.webhook = None
+            return True
+        if method == "getWebhookInfo":
+            return {"url": (self.webhook or {}).get("url", ""), "has_custom_certificate": False,
+                    "pending_update_count": len(self._updates)}
+        if method == "getUpdates":
+            # Same contract as Telegram: updates stay queued until a later call's offset confirms them
+            offset = int(params.get("offset") or 0)
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            if not self._updates:
+                self._updates_changed.clear()
+                try:
+                    await asyncio.wait_for(self._updates_changed.wait(), timeout=max(float(params.get("timeout") or 0), 0.01))
+                except asyncio.TimeoutError:
+                    return []
+            return self._updates[: int(params.get("limit") or 100)]
+        if method == "sendMessage":
+            return self._message(params.get("chat_id", 0), text=params.get("text", ""))
+        if method in _MEDIA_FIELD:
+            kind = _MEDIA_FIELD[method]
+            return self._message(params.get("chat_id", 0), **{kind: self._file(kind, params.get(kind))})
+        if method in ("editMessageText", "editMessageReplyMarkup"):
+            return self._message(params.get("chat_id", 0), text=params.get("text", ""))
+        return True
+
+
+async def _main(port: int, token: str) -> None:
+    api = await FakeBotApi(token=token, port=port).start()
+    log.info("Fake Bot API listening, set BOT_API_BASE_URL=%s", api.base_url)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await api.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(name)s | %(message)s")
+    ap = argparse.ArgumentParser(description="Local Telegram Bot API stand-in")
+    ap.add_argument("--port", type=int, default=8081)
+    ap.add_argument("--token", default="123456:FAKE")
+    args = ap.parse_args()
+    asyncio.run(_main(args.port, args.token))
@@ -0,0 +1,210 @@
+import asyncio
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+log = logging.getLogger("e2t_onboarding_bot.httpd")
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    429: "Too Many Requests",
+    500: "Internal Server Error",
+    502: "Bad Gateway",
+    503: "Service Unavailable",
+}
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    query: str
+    headers: Dict[str, str]  # lower-cased names
+    body: bytes
+
+    def json(self) -> Any:
+        return json.loads(self.body.decode("utf-8"))
+
+
+@dataclass
+class Response:
+    status: int = 200
+    body: bytes = b""
+    content_type: str = "text/plain; charset=utf-8"
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def json(cls, data: Any, status: int = 200) -> "Response":
+        return cls(status, json.dumps(data).encode("utf-8"), "application/json")
+
+
+Handler = Callable[[Request], Awaitable[Response]]
+
+
+class _BadRequest(Exception):
+    def __init__(self, status: int):
+        super().__init__(status)
+        self.status = status
+
+
+def _parse_size(raw: bytes, base: int) -> int:
+    """Content-Length (base 10) or chunk size (base 16): bare digits only, anything else is a 400."""
+    raw = raw.strip()
+    if not raw or raw.strip(b"0123456789abcdefABCDEF" if base == 16 else b"0123456789"):
+        raise _BadRequest(400)  # empty, signed, "0x..", "1_000", garbage
+    return int(raw, base)
+
+
+async def _read_body(reader: asyncio.StreamReader, headers: Dict[str, str], max_body: int) -> bytes:
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        chunks = []
+        total = 0
+        while True:
+            size_line = await reader.readline()
+            size = _parse_size(size_line.split(b";", 1)[0], 16)
+            if size == 0:
+                await reader.readline()  # trailing CRLF (no trailers supported)
+                return b"".join(chunks)
+            total += size
+            if total > max_body:
+                raise _BadRequest(413)
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+
+    length = _parse_size(headers.get("content-length", "0").encode("latin-1"), 10)
+    if length > max_body:
+        raise _BadRequest(413)
+    return await reader.readexactly(length) if length else b""
+
+
+async def _read_request(reader: asyncio.StreamReader, max_body: int, line: bytes) -> Request:
+    try:
+        method, target, _version = line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise _BadRequest(400)
+
+    headers: Dict[str, str] = {}
+    while True:
+        h = await reader.readline()
+        if h in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = h.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    path, _, query = target.partition("?")
+    body = await _read_body(reader, headers, max_body)
+    return Request(method.upper(), path, query, headers, body)
+
+
+def _encode(resp: Response, keep_alive: bool) -> bytes:
+    head = [
+        f"HTTP/1.1 {resp.status} {_REASONS.get(resp.status, 'Unknown')}",
+        f"Content-Type: {resp.content_type}",
+        f"Content-Length: {len(resp.body)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    head.extend(f"{k}: {v}" for k, v in resp.headers.items())
+    return ("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + resp.body
+
+
+class HttpServer:
+    """
+    What serve() returns. close() stops accepting connections and closes the idle keep-alive
+    ones; a request in progress gets its response (with Connection: close) first.
+    wait_closed() waits for the connections to finish and aborts any that are still open
+    after `grace` seconds. asyncio's own Server.wait_closed() waits for every client
+    connection on 3.12+, and Telegram keeps its webhook connections open, so it would never
+    return (Server.close_clients() only exists from 3.13).
+    """
+
+    def __init__(self) -> None:
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.closing = False
+        # writer -> True while a request on it is being read past its first line / handled
+        self._clients: Dict[asyncio.StreamWriter, bool] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def sockets(self):
+        return self.server.sockets if self.server is not None else ()
+
+    def close(self) -> None:
+        self.closing = True
+        if self.server is not None:
+            self.server.close()
+        for writer, busy in list(self._clients.items()):
+            if not busy:
+                writer.close()  # the pending read sees EOF and the connection task returns
+
+    async def wait_closed(self, grace: float = 10.0) -> None:
+        if self._tasks:
+            _, pending = await asyncio.wait(set(self._tasks), timeout=grace)
+            if pending:
+                log.warning("Aborting %s HTTP connections still open after %.0fs", len(pending), grace)
+                for writer in list(self._clients):
+                    writer.transport.abort()
+                await asyncio.wait(pending, timeout=1.0)
+        if self.server is not None:
+            await self.server.wait_closed()
+
+
+async def serve(handler: Handler, host: str, port: int, *, max_body: int = 1 << 20,
+                idle_timeout: float = 75.0) -> HttpServer:
+    """
+    Minimal HTTP/1.1 server on asyncio streams (keep-alive, Content-Length or chunked bodies).
+    Enough for Telegram webhooks and local stand-ins; not a general purpose web server.
+    A keep-alive connection with no request for `idle_timeout` seconds is closed.
+    """
+    srv = HttpServer()
+
+    async def on_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        srv._tasks.add(task)
+        srv._clients[writer] = False
+        try:
+            while not srv.closing:
+                try:
+                    # A request line may take up to idle_timeout to arrive; the rest must follow promptly
+                    first = await asyncio.wait_for(reader.readline(), idle_timeout)
+                    if not first:
+                        return
+                    srv._clients[writer] = True
+                    req = await asyncio.wait_for(_read_request(reader, max_body, first), idle_timeout)
+                except asyncio.TimeoutError:
+                    return
+                except (_BadRequest, ValueError) as e:
+                    # ValueError: a request or header line over the stream's limit (64 KiB)
+                    status = e.status if isinstance(e, _BadRequest) else 400
+                    writer.write(_encode(Response(status), keep_alive=False))
+                    await writer.drain()
+                    return
+
+                try:
+                    resp = await handler(req)
+                except Exception:
+                    log.exception("Unhandled error serving %s %s", req.method, req.path)
+                    resp = Response(500)
+
+                keep_alive = req.headers.get("connection", "").lower() != "close" and not srv.closing
+                writer.write(_encode(resp, keep_alive))
+                await writer.drain()
+                srv._clients[writer] = False
+                if not keep_alive:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return
+        except asyncio.CancelledError:
+            return  # loop shutting down; nobody awaits connection tasks
+        finally:
+            srv._clients.pop(writer, None)
+            srv._tasks.discard(task)
+            writer.close()
+
+    srv.server = await asyncio.start_server(on_client, host, port)
+    return srv
@@ -0,0 +1,354 @@
+"""
+Indexed SQLite store for leads (same columns as leads.csv).
+
+Every lookup (telegram_id, email, phone, timestamp range) is served by a B-tree index,
+so "has this person signed up before?" stays O(log n) at millions of rows instead of a
+full scan of the CSV.
+
+    python -m app.lead_store import app_data/leads.csv data/leads.csv
+    python -m app.lead_store export --format json --since 2026-01-01 --until 2026-02-01 -o leads.json
+    python -m app.lead_store lookup --email someone@example.com
+    python -m app.lead_store dropoffs --since 2026-01-01
+
+It also keeps the onboarding drop-offs: one row per session that timed out before the
+user confirmed their details, with the state they stopped in (no contact details).
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+from app.storage import LEAD_FIELDS
+
+log = logging.getLogger("e2t_onboarding_bot.lead_store")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS leads (
+    id                INTEGER PRIMARY KEY,
+    timestamp         TEXT NOT NULL,
+    telegram_id       INTEGER NOT NULL,
+    telegram_username TEXT NOT NULL DEFAULT '',
+    platform          TEXT NOT NULL DEFAULT '',
+    email             TEXT NOT NULL DEFAULT '',
+    phone             TEXT NOT NULL DEFAULT '',
+    region            TEXT NOT NULL DEFAULT ''
+);
+-- (timestamp, telegram_id) identifies a row: makes imports and writer retries idempotent
+CREATE UNIQUE INDEX IF NOT EXISTS leads_ts_tg ON leads(timestamp, telegram_id);
+CREATE INDEX IF NOT EXISTS leads_telegram_id ON leads(telegram_id);
+CREATE INDEX IF NOT EXISTS leads_email ON leads(email COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS leads_phone ON leads(phone);
+CREATE INDEX IF NOT EXISTS leads_timestamp ON leads(timestamp);
+
+CREATE TABLE IF NOT EXISTS dropoffs (
+    id          INTEGER PRIMARY KEY,
+    timestamp   TEXT NOT NULL,               -- when the idle session was evicted
+    telegram_id INTEGER NOT NULL,
+    state       TEXT NOT NULL,               -- conversation state the user stopped in
+    started_at  TEXT NOT NULL DEFAULT '',
+    last_seen   TEXT NOT NULL DEFAULT '',
+    fields      TEXT NOT NULL DEFAULT ''     -- details already given, e.g. "email,phone"
+);
+CREATE INDEX IF NOT EXISTS dropoffs_timestamp ON dropoffs(timestamp);
+"""
+
+DROPOFF_FIELDS = ["timestamp", "telegram_id", "state", "started_at", "last_seen", "fields"]
+
+_COLUMNS = ", ".join(LEAD_FIELDS)
+_INSERT = f"INSERT OR IGNORE INTO leads({_COLUMNS}) VALUES({', '.join('?' * len(LEAD_FIELDS))})"
+
+DEFAULT_IMPORT_PATHS = ("app_data/leads.csv", "data/leads.csv")
+
+
+def _row_values(row: Sequence[Any]) -> Tuple[Any, ...]:
+    ts, tg_id, *rest = row
+    return (str(ts), int(tg_id), *("" if v is None else str(v) for v in rest))
+
+
+class LeadStore:
+    """
+    Thread-safe (one connection behind a lock), so it can be called from
+    asyncio.to_thread — e.g. as the LeadWriter sink.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    # ---------------- writes ----------------
+
+    def append_rows(self, rows: List[Sequence[Any]], fsync: bool = False) -> str:
+        """
+        Insert rows in LEAD_FIELDS order in one transaction. Same signature as
+        storage.append_lead_rows, so it can be used as a LeadWriter sink.
+        """
+        with self._lock:
+            # FULL waits for the WAL to hit the disk on commit; NORMAL is crash-safe but not durable
+            self._db.execute("PRAGMA synchronous=FULL" if fsync else "PRAGMA synchronous=NORMAL")
+            with self._db:
+                self._db.executemany(_INSERT, (_row_values(r) for r in rows))
+        return self.path
+
+    def import_csv(self, csv_path: str, batch_size: int = 5000) -> Tuple[int, int]:
+        """Import a leads.csv. Returns (inserted, skipped); rows already present are skipped."""
+        inserted = skipped = 0
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            batch: List[Tuple[Any, ...]] = []
+            for rec in reader:
+                try:
+                    batch.append(_row_values([rec.get(k, "") for k in LEAD_FIELDS]))
+                except (TypeError, ValueError):
+                    skipped += 1  # no usable telegram_id
+                    continue
+                if len(batch) >= batch_size:
+                    n = self._insert_many(batch)
+                    inserted += n
+                    skipped += len(batch) - n
+                    batch = []
+            if batch:
+                n = self._insert_many(batch)
+                inserted += n
+                skipped += len(batch) - n
+        return inserted, skipped
+
+    def update(self, lead_id: int, row: Sequence[Any], fsync: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Overwrite a lead's details (row in LEAD_FIELDS order) but keep its original
+        signup timestamp. Returns the record as it was before, or None if it doesn't exist.
+        """
+        _, *values = _row_values(row)
+        with self._lock:
+            before = self._db.execute(f"SELECT id, {_COLUMNS} FROM leads WHERE id = ?", (lead_id,)).fetchone()
+            if before is None:
+                return None
+            self._db.execute("PRAGMA synchronous=FULL" if fsync else "PRAGMA synchronous=NORMAL")
+            with self._db:
+                self._db.execute(
+                    "UPDATE leads SET telegram_id=?, telegram_username=?, platform=?, email=?, phone=?, region=? "
+                    "WHERE id=?",
+                    (*values, lead_id),
+                )
+        return dict(before)
+
+    def record_dropoffs(self, rows: List[Sequence[Any]]) -> None:
+        """Rows in DROPOFF_FIELDS order, one transaction."""
+        with self._lock, self._db:
+            self._db.executemany(
+                f"INSERT INTO dropoffs({', '.join(DROPOFF_FIELDS)}) VALUES({', '.join('?' * len(DROPOFF_FIELDS))})",
+                rows,
+            )
+
+    def _insert_many(self, values: List[Tuple[Any, ...]]) -> int:
+        with self._lock, self._db:
+            before = self._db.total_changes
+            self._db.executemany(_INSERT, values)
+            return self._db.total_changes - before
+
+    # ---------------- lookups ----------------
+
+    def _select(self, where: str, args: Tuple[Any, ...]) -> List[Dict[str, Any]]:
+        with self._lock:
+            cur = self._db.execute(f"SELECT id, {_COLUMNS} FROM leads WHERE {where} ORDER BY timestamp", args)
+            return [dict(r) for r in cur.fetchall()]
+
+    def get(self, lead_id: int) -> Optional[Dict[str, Any]]:
+        found = self._select("id = ?", (lead_id,))
+        return found[0] if found else None
+
+    def latest_id_for(self, telegram_id: int) -> Optional[int]:
+        with self._lock:
+            r = self._db.execute("SELECT MAX(id) FROM leads WHERE telegram_id = ?", (int(telegram_id),)).fetchone()
+        return r[0] if r else None
+
+    def by_telegram_id(self, telegram_id: int) -> List[Dict[str, Any]]:
+        return self._select("telegram_id = ?", (int(telegram_id),))
+
+    def by_email(self, email: str) -> List[Dict[str, Any]]:
+        return self._select("email = ? COLLATE NOCASE", (email.strip(),))
+
+    def by_phone(self, phone: str) -> List[Dict[str, Any]]:
+        return self._select("phone = ?", (phone.strip(),))
+
+    def telegram_ids(self, region: Optional[str] = None, since: Optional[str] = None,
+                     until: Optional[str] = None) -> List[int]:
+        """Distinct telegram ids of leads matching the filters (region exact, since <= ts < until)."""
+        where, args = ["1=1"], []
+        if region:
+            where.append("region = ?")
+            args.append(region)
+        if since:
+            where.append("timestamp >= ?")
+            args.append(since)
+        if until:
+            where.append("timestamp < ?")
+            args.append(until)
+        with self._lock:
+            cur = self._db.execute(
+                f"SELECT DISTINCT telegram_id FROM leads WHERE {' AND '.join(where)} ORDER BY telegram_id", args
+            )
+            return [r[0] for r in cur.fetchall()]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM leads").fetchone()[0]
+
+    def dropoff_counts(self, since: Optional[str] = None, until: Optional[str] = None) -> Dict[str, int]:
+        """Drop-offs per state with since <= timestamp < until."""
+        with self._lock:
+            cur = self._db.execute(
+                "SELECT state, COUNT(*) FROM dropoffs WHERE timestamp >= ? AND timestamp < ? GROUP BY state "
+                "ORDER BY COUNT(*) DESC",
+                (since or "", until or "\uffff"),
+            )
+            return {state: n for state, n in cur.fetchall()}
+
+    def iter_index_rows(self, chunk: int = 10_000) -> Iterator[Tuple[int, int, str, str]]:
+        """(id, telegram_id, email, phone) for every lead, oldest first (for LeadIndex.load)."""
+        last = 0
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT id, telegram_id, email, phone FROM leads WHERE id > ? ORDER BY id LIMIT ?", (last, chunk)
+                ).fetchall()
+            for r in rows:
+                yield tuple(r)
+            if len(rows) < chunk:
+                return
+            last = rows[-1][0]
+
+    # ---------------- export ----------------
+
+    def iter_range(self, since: Optional[str] = None, until: Optional[str] = None,
+                   chunk: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        Leads with since <= timestamp < until (ISO strings, either bound optional), oldest first.
+        Streams in keyset-paginated chunks so memory stays flat and the lock is never held
+        across a yield.
+        """
+        last = (since or "", -1)
+        while True:
+            where = "(timestamp, id) > (?, ?)"
+            args: List[Any] = [last[0], last[1]]
+            if until:
+                where += " AND timestamp < ?"
+                args.append(until)
+            with self._lock:
+                rows = self._db.execute(
+                    f"SELECT id, {_COLUMNS} FROM leads WHERE {where} ORDER BY timestamp, id LIMIT ?",
+                    (*args, chunk),
+                ).fetchall()
+            for r in rows:
+                yield dict(r)
+            if len(rows) < chunk:
+                return
+            last = (rows[-1]["timestamp"], rows[-1]["id"])
+
+    def export_csv(self, out: TextIO, since: Optional[str] = None, until: Optional[str] = None) -> int:
+        writer = csv.writer(out)
+        writer.writerow(LEAD_FIELDS)
+        n = 0
+        for rec in self.iter_range(since, until):
+            writer.writerow([rec[k] for k in LEAD_FIELDS])
+            n += 1
+        return n
+
+    def export_json(self, out: TextIO, since: Optional[str] = None, until: Optional[str] = None) -> int:
+        """Writes one JSON array, element by element (never builds the whole list)."""
+        out.write("[")
+        n = 0
+        for rec in self.iter_range(since, until):
+            out.write(",\n" if n else "\n")
+            out.write(json.dumps({k: rec[k] for k in LEAD_FIELDS}, ensure_ascii=False))
+            n += 1
+        out.write("\n]\n" if n else "]\n")
+        return n
+
+
+# ============================================================
+# CLI
+# ============================================================
+
+def _main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(name)s | %(message)s")
+    default_db = os.getenv("LEAD_STORE_DB", os.path.join(os.getenv("LEADS_DIR", "./app_data"), "leads.sqlite3"))
+
+    ap = argparse.ArgumentParser(prog="python -m app.lead_store", description="SQLite lead store")
+    ap.add_argument("--db", default=default_db)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p_imp = sub.add_parser("import", help="import leads.csv files (idempotent)")
+    p_imp.add_argument("csv", nargs="*", default=list(DEFAULT_IMPORT_PATHS))
+
+    p_exp = sub.add_parser("export", help="stream leads in a date range")
+    p_exp.add_argument("--format", choices=("csv", "json"), default="csv")
+    p_exp.add_argument("--since", help="inclusive, ISO date/time")
+    p_exp.add_argument("--until", help="exclusive, ISO date/time")
+    p_exp.add_argument("-o", "--output", help="file (default: stdout)")
+
+    p_look = sub.add_parser("lookup", help="find leads by telegram id, email or phone")
+    g = p_look.add_mutually_exclusive_group(required=True)
+    g.add_argument("--telegram-id", type=int)
+    g.add_argument("--email")
+    g.add_argument("--phone")
+
+    p_drop = sub.add_parser("dropoffs", help="sessions that timed out, counted per conversation state")
+    p_drop.add_argument("--since", help="inclusive, ISO date/time")
+    p_drop.add_argument("--until", help="exclusive, ISO date/time")
+
+    args = ap.parse_args(argv)
+    store = LeadStore(args.db)
+    try:
+        if args.cmd == "import":
+            for path in args.csv:
+                if not os.path.isfile(path):
+                    log.warning("Skipping %s (not found)", path)
+                    continue
+                inserted, skipped = store.import_csv(path)
+                log.info("Imported %s: %s new, %s skipped", path, inserted, skipped)
+            log.info("%s now holds %s leads", args.db, store.count())
+        elif args.cmd == "export":
+            out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+            try:
+                export = store.export_json if args.format == "json" else store.export_csv
+                n = export(out, args.since, args.until)
+            finally:
+                if args.output:
+                    out.close()
+            log.info("Exported %s leads", n)
+        elif args.cmd == "dropoffs":
+            for state, n in store.dropoff_counts(args.since, args.until).items():
+                print(f"{state:<20}{n:>8}")
+        else:
+            if args.telegram_id is not None:
+                found = store.by_telegram_id(args.telegram_id)
+            elif args.email:
+                found = store.by_email(args.email)
+            else:
+                found = store.by_phone(args.phone)
+            for rec in found:
+                print(json.dumps(rec, ensure_ascii=False))
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main())
@@ -0,0 +1,211 @@
+import asyncio
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+from telegram import Message
+from telegram.error import BadRequest
+
+from app.assets import Asset
+
+log = logging.getLogger("e2t_onboarding_bot.media_cache")
+
+SendFn = Callable[[Any], Awaitable[Message]]
+
+
+def _file_id_of(msg: Optional[Message]) -> Optional[str]:
+    """Pull the file_id out of whatever media Telegram echoed back."""
+    if msg is None:
+        return None
+    att = msg.effective_attachment
+    if isinstance(att, (list, tuple)):  # photos come back as a list of sizes
+        att = att[-1] if att else None
+    return getattr(att, "file_id", None)
+
+
+class MediaCache:
+    """
+    Remembers the file_id Telegram assigns to each uploaded asset so later sends
+    can reference it instead of re-uploading the bytes.
+
+    Entries are keyed by send kind + resolved path + sha256 + mtime (taken from the
+    AssetRegistry, so a lookup does no file I/O); replacing a file on disk (or sending
+    it as a different media type) forces a fresh upload.
+    The cache lives in a small JSON file and survives restarts. Changes made on the event loop
+    are written at most every `save_delay` seconds, in a worker thread; close() writes the rest.
+    Entries for files that are gone are dropped on load, and prune() drops the ones for old
+    versions of the current assets.
+    """
+
+    def __init__(self, path: str, *, save_delay: float = 1.0):
+        self.path = Path(path).expanduser()
+        self.save_delay = save_delay
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        self._ids: Dict[str, str] = {}
+        self._send_as: Dict[str, str] = {}  # asset identity -> video_note | video | document
+        self._dirty = False
+        self._save_task: Optional[asyncio.Task] = None
+        self._write_lock = asyncio.Lock()
+        self._load()
+
+    # ---------------- disk ----------------
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            self._ids = {str(k): str(v) for k, v in (data.get("file_ids") or {}).items()}
+            self._send_as = {str(k): str(v) for k, v in (data.get("send_as") or {}).items()}
+        except Exception as e:
+            log.warning("Ignoring unreadable media cache %s: %s", self.path, e)
+            self._ids = {}
+            self._send_as = {}
+            return
+        exists: Dict[str, bool] = {}
+
+        def gone(path: str) -> bool:
+            if path not in exists:
+                exists[path] = os.path.isfile(path)
+            return not exists[path]
+
+        dropped = self._drop(lambda path, sha, mtime: gone(path))
+        if dropped:
+            log.info("Media cache: dropped %s entries for files that no longer exist", dropped)
+            self._write(self._payload())
+
+    def _drop(self, stale: Callable[[str, str, Optional[str]], bool]) -> int:
+        """Remove entries whose (path, sha256, mtime_ns) is stale; returns how many went."""
+        before = len(self._ids) + len(self._send_as)
+        self._ids = {k: v for k, v in self._ids.items() if not stale(*self._parse(k.split("|", 1)[-1]))}
+        self._send_as = {k: v for k, v in self._send_as.items() if not stale(*self._parse(k, with_mtime=False))}
+        return before - len(self._ids) - len(self._send_as)
+
+    @staticmethod
+    def _parse(ident: str, with_mtime: bool = True) -> tuple:
+        # path|sha256|mtime_ns or path|sha256; the path itself may contain "|"
+        parts = ident.rsplit("|", 2 if with_mtime else 1)
+        return (parts[0], parts[1], parts[2] if with_mtime else None) if len(parts) > 1 else (ident, "", None)
+
+    def _payload(self) -> str:
+        return json.dumps({"file_ids": self._ids, "send_as": self._send_as}, indent=2, sort_keys=True)
+
+    def _write(self, payload: str) -> None:
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            tmp.write_text(payload, encoding="utf-8")
+            os.replace(tmp, self.path)
+        except Exception as e:
+            log.warning("Failed to persist media cache %s: %s", self.path, e)
+
+    def _save(self) -> None:
+        self._dirty = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:  # no event loop (tools): write now
+            self._dirty = False
+            self._write(self._payload())
+            return
+        if self._save_task is None or self._save_task.done():
+            self._save_task = loop.create_task(self._save_later(), name="media-cache:save")
+
+    async def _save_later(self) -> None:
+        await asyncio.sleep(self.save_delay)  # one write for every change in the meantime
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Write pending changes (in a worker thread) now."""
+        async with self._write_lock:
+            while self._dirty:
+                self._dirty = False
+                await asyncio.to_thread(self._write, self._payload())
+
+    async def close(self) -> None:
+        await self.flush()
+        # Nothing is left to write, and the timer can't be mid-write: it would hold the lock
+        if self._save_task is not None and not self._save_task.done():
+            self._save_task.cancel()
+            await asyncio.gather(self._save_task, return_exceptions=True)
+
+    def prune(self, assets: Iterable[Optional[Asset]]) -> int:
+        """Keep only entries for these assets as they are now (same path, content and mtime)."""
+        current = {(str(a.path), a.sha256, str(a.mtime_ns)) for a in assets if a is not None}
+        identities = {(path, sha) for path, sha, _ in current}
+        dropped = self._drop(lambda path, sha, mtime: (path, sha, mtime) not in current if mtime is not None
+                             else (path, sha) not in identities)
+        if dropped:
+            log.info("Media cache: dropped %s entries for replaced or unused assets", dropped)
+            self._save()
+        return dropped
+
+    # ---------------- keys ----------------
+
+    @staticmethod
+    def key_for(kind: str, asset: Asset) -> str:
+        return f"{kind}|{asset.path}|{asset.sha256}|{asset.mtime_ns}"
+
+    @staticmethod
+    def _asset_id(asset: Asset) -> str:
+        return f"{asset.path}|{asset.sha256}"
+
+    # ---------------- send method verdicts ----------------
+
+    def send_as(self, asset: Asset) -> Optional[str]:
+        """How this exact file (path + content) should be sent, if already decided."""
+        return self._send_as.get(self._asset_id(asset))
+
+    def set_send_as(self, asset: Asset, kind: str) -> None:
+        key = self._asset_id(asset)
+        if self._send_as.get(key) != kind:
+            self._send_as[key] = kind
+            self._save()
+
+    # ---------------- api ----------------
+
+    def get(self, key: str) -> Optional[str]:
+        return self._ids.get(key)
+
+    def put(self, key: str, file_id: str) -> None:
+        if self._ids.get(key) == file_id:
+            return
+        self._ids[key] = file_id
+        self._save()
+
+    def invalidate(self, key: str) -> None:
+        if self._ids.pop(key, None) is not None:
+            self._save()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "rejected": self.rejected, "entries": len(self._ids)}
+
+    async def send(self, kind: str, asset: Asset, send: SendFn) -> Message:
+        """
+        Send `asset` via `send(media)`, where media is either a cached file_id or the asset's bytes.
+        A file_id Telegram refuses is dropped and the asset is uploaded again.
+        """
+        key = self.key_for(kind, asset)
+
+        file_id = self.get(key)
+        if file_id:
+            try:
+                msg = await send(file_id)
+                self.hits += 1
+                return msg
+            except BadRequest as e:
+                self.rejected += 1
+                log.warning("Cached file_id rejected for %s (%s), re-uploading", asset.path, e)
+                self.invalidate(key)
+
+        self.misses += 1
+        with asset.open() as f:
+            msg = await send(f)
+
+        new_id = _file_id_of(msg)
+        if new_id:
+            self.put(key, new_id)
+        return msg
@@ -0,0 +1,166 @@
+"""
+Container probe for video assets: decides once, before any user is waiting, whether a
+file can go out as a Telegram video note, a regular video, or only as a document.
+
+Only the ISO-BMFF box headers are read (ftyp, then the moov box with mvhd/tkhd/hdlr/stsd),
+so probing a large MP4 costs a few small reads regardless of its size.
+"""
+import logging
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+log = logging.getLogger("e2t_onboarding_bot.media_probe")
+
+# Telegram limits (Bot API docs): video notes are square, up to 1 min; bots upload up to 50 MB
+VIDEO_NOTE_MAX_SECONDS = 60
+VIDEO_NOTE_MAX_SIDE = 640
+UPLOAD_MAX_BYTES = 50 << 20
+
+_CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+_NOTE_CODECS = {b"avc1", b"avc3"}
+_VIDEO_CODECS = _NOTE_CODECS | {b"hvc1", b"hev1", b"mp4v"}
+
+
+@dataclass(frozen=True)
+class VideoInfo:
+    brand: str
+    duration: float  # seconds
+    width: int
+    height: int
+    codec: str
+
+    @property
+    def square(self) -> bool:
+        return self.width > 0 and self.width == self.height
+
+
+def _boxes(buf: bytes, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[bytes, int, int]]:
+    """(type, payload_start, payload_end) for each box in buf[start:end]."""
+    end = len(buf) if end is None else end
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack_from(">I4s", buf, pos)
+        header = 8
+        if size == 1:
+            if pos + 16 > end:
+                return
+            size = struct.unpack_from(">Q", buf, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            return
+        yield kind, pos + header, pos + size
+        pos += size
+
+
+def _read_top_level(f: BinaryIO, size: int) -> Tuple[Optional[bytes], Optional[bytes]]:
+    """Returns (ftyp payload, moov payload), skipping over mdat and friends without reading them."""
+    ftyp = moov = None
+    pos = 0
+    while pos + 8 <= size and (ftyp is None or moov is None):
+        f.seek(pos)
+        head = f.read(16)
+        if len(head) < 8:
+            break
+        box_size, kind = struct.unpack_from(">I4s", head)
+        header = 8
+        if box_size == 1 and len(head) >= 16:
+            box_size = struct.unpack_from(">Q", head, 8)[0]
+            header = 16
+        elif box_size == 0:
+            box_size = size - pos
+        if box_size < header:
+            break
+        if kind in (b"ftyp", b"moov"):
+            f.seek(pos + header)
+            payload = f.read(box_size - header)
+            if kind == b"ftyp":
+                ftyp = payload
+            else:
+                moov = payload
+        elif pos == 0:
+            return None, None  # first box must be ftyp: not an MP4/MOV file
+        pos += box_size
+    return ftyp, moov
+
+
+def _video_track(moov: bytes) -> Tuple[int, int, str]:
+    """(width, height, codec) of the first video track in moov."""
+    for kind, s, e in _boxes(moov):
+        if kind != b"trak":
+            continue
+        width = height = 0
+        handler = codec = b""
+        stack = [(s, e)]
+        while stack:
+            ps, pe = stack.pop()
+            for k, cs, ce in _boxes(moov, ps, pe):
+                if k in _CONTAINERS:
+                    stack.append((cs, ce))
+                elif k == b"tkhd":
+                    version = moov[cs]
+                    off = cs + (4 + 32 + 52 if version == 1 else 4 + 20 + 52)
+                    if off + 8 <= ce:
+                        w, h = struct.unpack_from(">II", moov, off)
+                        width, height = w >> 16, h >> 16
+                elif k == b"hdlr" and cs + 12 <= ce:
+                    handler = moov[cs + 8:cs + 12]
+                elif k == b"stsd" and cs + 16 <= ce:
+                    codec = moov[cs + 12:cs + 16]
+        if handler == b"vide":
+            return width, height, codec.decode("latin-1")
+    return 0, 0, ""
+
+
+def probe_video(path: Path) -> Optional[VideoInfo]:
+    """Container metadata of an MP4/MOV file, or None if it isn't one (or is unreadable)."""
+    try:
+        size = path.stat().st_size
+        with open(path, "rb") as f:
+            ftyp, moov = _read_top_level(f, size)
+    except OSError as e:
+        log.warning("Cannot probe %s: %s", path, e)
+        return None
+    if ftyp is None or moov is None or len(ftyp) < 4:
+        return None
+
+    duration = 0.0
+    try:
+        for kind, s, end in _boxes(moov):
+            if kind == b"mvhd":
+                if moov[s] == 1:
+                    timescale, dur = struct.unpack_from(">IQ", moov, s + 4 + 16)
+                else:
+                    timescale, dur = struct.unpack_from(">II", moov, s + 4 + 8)
+                duration = dur / timescale if timescale else 0.0
+                break
+        width, height, codec = _video_track(moov)
+    except (struct.error, IndexError, ValueError) as e:
+        # Truncated or corrupt mvhd/tkhd/...: the caller sends it as a document instead
+        log.warning("Cannot probe %s: malformed moov box: %s", path, e)
+        return None
+    return VideoInfo(ftyp[:4].decode("latin-1"), duration, width, height, codec)
+
+
+def choose_send_kind(info: Optional[VideoInfo], size: int, preferred: str) -> str:
+    """
+    Best Telegram send method for a video file, starting from `preferred`
+    ("video_note" or "video") and stepping down to "video", then "document".
+    """
+    if size > UPLOAD_MAX_BYTES or info is None or info.brand == "qt  ":
+        return "document"
+    codec = info.codec.encode("latin-1")
+    if (
+        preferred == "video_note"
+        and codec in _NOTE_CODECS
+        and info.square
+        and info.width <= VIDEO_NOTE_MAX_SIDE
+        and 0 < info.duration <= VIDEO_NOTE_MAX_SECONDS
+    ):
+        return "video_note"
+    if codec in _VIDEO_CODECS:
+        return "video"
+    return "document"
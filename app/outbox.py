@@ -0,0 +1,298 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Any, Callable, Coroutine, Deque, Dict, List, Optional, Set, Tuple
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from app.metrics import Histogram
+
+log = logging.getLogger("e2t_onboarding_bot.outbox")
+
+# Priority lanes, passed per call as `rate_limit_args=LANE_...`. Lower goes first.
+LANE_INTERACTIVE = 0  # direct replies to something the user just did (default)
+LANE_DRIP = 1  # timed onboarding media / follow-ups
+LANE_BULK = 2  # broadcasts and other background sends
+LANE_NAMES = ("interactive", "drip", "bulk")
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "stamp")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.stamp = now
+
+    def _refill(self, now: float) -> None:
+        if now > self.stamp:
+            self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until one token is available (0 if available now)."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self) -> None:
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+@dataclass
+class _Pending:
+    lane: int
+    callback: Callable[..., Coroutine[Any, Any, Any]]
+    args: Any
+    kwargs: Dict[str, Any]
+    future: asyncio.Future
+    enqueued: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+
+
+class OutboundDispatcher(BaseRateLimiter[int]):
+    """
+    Shared flood-control queue for every Bot API call that targets a chat.
+
+    * one global token bucket (Telegram allows ~30 msg/s per bot)
+    * one token bucket per chat (~1 msg/s, small burst; groups ~20 msg/min)
+    * priority lanes: a ready interactive reply is always dispatched before drip media or bulk
+    * per-chat FIFO: calls for the same chat run one at a time, in submission order
+    * RetryAfter only pauses the chat that hit it; the call is re-queued at the head of that chat
+
+    Plugged in via ApplicationBuilder.rate_limiter(); calls without a chat_id (answerCallbackQuery,
+    getUpdates, setWebhook, ...) pass straight through.
+
+    Fairness between chats assumes updates are processed concurrently (ChatOrderedUpdateProcessor
+    in app/update_processor.py): with PTB's default one-at-a-time processing, a handler waiting on
+    one chat's bucket holds up every other chat's updates, and the per-chat rate caps the whole bot.
+    """
+
+    def __init__(
+        self,
+        *,
+        global_rate: float = 30.0,
+        chat_rate: float = 1.0,
+        chat_burst: float = 3.0,
+        group_rate: float = 20 / 60,
+        max_retries: int = 3,
+    ):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+
+        # Small global burst so no 1s window can see much more than global_rate sends
+        self._global = TokenBucket(global_rate, max(1.0, global_rate / 10), time.monotonic())
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._queues: Dict[int, Deque[_Pending]] = {}
+        self._busy: Set[int] = set()
+        self._scheduled: Set[int] = set()  # chats sitting in a ready lane or the sleep heap
+        self._not_before: Dict[int, float] = {}  # RetryAfter pauses
+        self._ready: List[Deque[int]] = [deque() for _ in LANE_NAMES]
+        self._sleeping: List[Tuple[float, int, int]] = []  # (wake_at, seq, chat_id)
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: Set[asyncio.Task] = set()
+        self._last_prune = time.monotonic()
+
+        self.depth = [0] * len(LANE_NAMES)
+        self.wait_hist = [Histogram() for _ in LANE_NAMES]
+        self.sent = 0
+        self.failed = 0
+        self.retry_after_hits = 0
+
+    # ---------------- lifecycle ----------------
+
+    async def initialize(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._dispatch_loop(), name="outbound-dispatcher")
+
+    async def shutdown(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for q in self._queues.values():
+            for item in q:
+                if not item.future.done():
+                    item.future.set_exception(RuntimeError("Outbound dispatcher shut down"))
+        self._queues.clear()
+        for d in self._ready:
+            d.clear()
+        self._sleeping.clear()
+        self._scheduled.clear()
+        self.depth = [0] * len(LANE_NAMES)
+
+    # ---------------- metrics ----------------
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": {LANE_NAMES[i]: d for i, d in enumerate(self.depth)},
+            "chats_waiting": len(self._queues),
+            "in_flight": len(self._busy),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retry_after_hits": self.retry_after_hits,
+            "wait_seconds": {LANE_NAMES[i]: h.snapshot() for i, h in enumerate(self.wait_hist)},
+        }
+
+    # ---------------- BaseRateLimiter ----------------
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[int],
+    ) -> Any:
+        chat_id = data.get("chat_id")
+        if chat_id is None or self._task is None:
+            return await callback(*args, **kwargs)
+        try:
+            chat_id = int(chat_id)
+        except (TypeError, ValueError):
+            return await callback(*args, **kwargs)  # @channel usernames: not worth a bucket
+
+        lane = rate_limit_args if rate_limit_args in (LANE_INTERACTIVE, LANE_DRIP, LANE_BULK) else LANE_INTERACTIVE
+        item = _Pending(lane, callback, args, kwargs, asyncio.get_running_loop().create_future())
+        self._queues.setdefault(chat_id, deque()).append(item)
+        self.depth[lane] += 1
+        if chat_id not in self._busy and chat_id not in self._scheduled:
+            self._schedule_chat(chat_id, time.monotonic())
+        self._wakeup.set()
+        return await item.future
+
+    # ---------------- scheduling ----------------
+
+    def _bucket(self, chat_id: int, now: float) -> TokenBucket:
+        b = self._buckets.get(chat_id)
+        if b is None:
+            rate = self.group_rate if chat_id < 0 else self.chat_rate
+            b = self._buckets[chat_id] = TokenBucket(rate, self.chat_burst if chat_id > 0 else 1.0, now)
+        return b
+
+    def _schedule_chat(self, chat_id: int, now: float) -> None:
+        q = self._queues.get(chat_id)
+        while q and q[0].future.done():  # caller gave up (cancelled) before dispatch
+            self.depth[q.popleft().lane] -= 1
+        if not q:
+            self._queues.pop(chat_id, None)
+            return
+
+        wake_at = max(self._not_before.get(chat_id, 0.0), now + self._bucket(chat_id, now).wait_time(now))
+        self._scheduled.add(chat_id)
+        if wake_at > now:
+            heapq.heappush(self._sleeping, (wake_at, next(self._seq), chat_id))
+        else:
+            self._not_before.pop(chat_id, None)
+            self._ready[q[0].lane].append(chat_id)
+
+    def _prune(self, now: float) -> None:
+        """Forget buckets of idle chats that have fully refilled (keeps memory flat)."""
+        if now - self._last_prune < 30:
+            return
+        self._last_prune = now
+        for chat_id in [c for c, b in self._buckets.items()
+                        if c not in self._queues and c not in self._busy and b.is_full(now)]:
+            del self._buckets[chat_id]
+
+    async def _dispatch_loop(self) -> None:
+        while True:
+            now = time.monotonic()
+            while self._sleeping and self._sleeping[0][0] <= now:
+                _, _, chat_id = heapq.heappop(self._sleeping)
+                self._scheduled.discard(chat_id)
+                self._schedule_chat(chat_id, now)
+
+            lane = next((d for d in self._ready if d), None)
+            if lane is None:
+                self._prune(now)
+                timeout = (self._sleeping[0][0] - now) if self._sleeping else None
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            gwait = self._global.wait_time(now)
+            if gwait > 0:
+                await asyncio.sleep(gwait)
+                continue
+
+            chat_id = lane.popleft()
+            self._scheduled.discard(chat_id)
+            q = self._queues.get(chat_id)
+            if not q:
+                continue
+            item = q.popleft()
+            if item.future.done():
+                self.depth[item.lane] -= 1
+                self._schedule_chat(chat_id, now)
+                continue
+
+            bucket = self._bucket(chat_id, now)
+            if bucket.wait_time(now) > 0:  # bucket drained while queued behind other lanes
+                q.appendleft(item)
+                self._schedule_chat(chat_id, now)
+                continue
+
+            bucket.consume()
+            self._global.consume()
+            self.depth[item.lane] -= 1
+            self.wait_hist[item.lane].observe(now - item.enqueued)
+            self._busy.add(chat_id)
+            t = asyncio.create_task(self._execute(chat_id, item))
+            self._inflight.add(t)
+            t.add_done_callback(self._inflight.discard)
+
+    async def _execute(self, chat_id: int, item: _Pending) -> None:
+        try:
+            result = await item.callback(*item.args, **item.kwargs)
+        except RetryAfter as e:
+            item.attempts += 1
+            self.retry_after_hits += 1
+            ra = e.retry_after
+            delay = ra.total_seconds() if isinstance(ra, timedelta) else float(ra)
+            if item.attempts > self.max_retries:
+                self.failed += 1
+                if not item.future.done():
+                    item.future.set_exception(e)
+            else:
+                log.info("RetryAfter %.1fs for chat_id=%s, re-queued (attempt %s)", delay, chat_id, item.attempts)
+                self._not_before[chat_id] = time.monotonic() + delay + 0.1
+                item.enqueued = time.monotonic()
+                self._queues.setdefault(chat_id, deque()).appendleft(item)
+                self.depth[item.lane] += 1
+        except Exception as e:
+            self.failed += 1
+            if not item.future.done():
+                item.future.set_exception(e)
+        else:
+            self.sent += 1
+            if not item.future.done():
+                item.future.set_result(result)
+        finally:
+            self._busy.discard(chat_id)
+            if chat_id in self._queues:
+                self._schedule_chat(chat_id, time.monotonic())
+            self._wakeup.set()
@@ -0,0 +1,272 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import aiosqlite
+from telegram.ext import BasePersistence, PersistenceInput
+
+log = logging.getLogger("e2t_onboarding_bot.persistence")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_data (
+    user_id    INTEGER PRIMARY KEY,
+    data       TEXT NOT NULL,
+    updated_at REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS conversations (
+    name       TEXT NOT NULL,
+    key        TEXT NOT NULL,
+    state      TEXT NOT NULL,
+    updated_at REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (name, key)
+) WITHOUT ROWID;
+"""
+
+ConversationKey = Tuple[Any, ...]
+ConversationDict = Dict[ConversationKey, object]
+
+_DELETE = object()  # pending-write marker for "remove this row"
+
+
+class SQLitePersistence(BasePersistence[Any, Dict[str, Any], Dict[str, Any]]):
+    """
+    Conversation states and user_data in one SQLite file (WAL mode).
+
+    Writes are buffered: update_* only record the latest value per key, and a single
+    background flush commits everything that changed in one transaction every
+    `flush_interval` seconds. Repeated changes to the same user between flushes cost
+    one row write. flush() (called by the Application on stop) commits whatever is left.
+
+    user_data values are stored as JSON: plain dicts as they are, or any `user_data_type`
+    with to_json()/from_json() (e.g. OnboardingDraft). With `ttl` set, sessions idle for
+    longer than that are not restored on startup: their rows are deleted and the expired
+    user_data is handed to `on_expire` first. (Live sessions are timed out by the
+    ConversationHandler; this covers the ones whose timeout died with the last process.)
+
+    With `owns` set (sharded workers sharing one file), only the rows of chats this process
+    owns are restored and expired; `owns(chat_id)` is also applied to user ids, which are the
+    chat ids of private chats.
+    """
+
+    def __init__(self, path: str, *, flush_interval: float = 1.0, user_data_type: type = dict,
+                 ttl: float = 0.0, on_expire: Optional[Callable[[Dict[int, Any]], None]] = None,
+                 owns: Optional[Callable[[int], bool]] = None):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=flush_interval,
+        )
+        self.path = path
+        self.flush_interval = flush_interval
+        self.user_data_type = user_data_type
+        self.ttl = ttl
+        self.on_expire = on_expire
+        self.owns = owns or (lambda chat_id: True)
+        self._db: Optional[aiosqlite.Connection] = None
+        self._lock = asyncio.Lock()
+        self._pending_users: Dict[int, Any] = {}
+        self._pending_convs: Dict[Tuple[str, str], Any] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+        self.flushes = 0
+        self.rows_written = 0
+        self.last_flush_ms = 0.0
+        self.expired = 0
+
+    # ---------------- connection ----------------
+
+    async def _conn(self) -> aiosqlite.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._db = await aiosqlite.connect(self.path)
+            await self._db.execute("PRAGMA journal_mode=WAL")
+            await self._db.execute("PRAGMA synchronous=NORMAL")
+            await self._db.execute("PRAGMA busy_timeout=5000")
+            await self._db.executescript(_SCHEMA)
+            await self._migrate(self._db)
+            await self._db.commit()
+            if self.ttl > 0:
+                await self._expire(self._db)
+        return self._db
+
+    @staticmethod
+    async def _migrate(db: aiosqlite.Connection) -> None:
+        for table in ("user_data", "conversations"):
+            async with db.execute(f"PRAGMA table_info({table})") as cur:
+                columns = {row[1] async for row in cur}
+            if "updated_at" not in columns:  # files from before idle expiry: count their rows as fresh
+                await db.execute(f"ALTER TABLE {table} ADD COLUMN updated_at REAL NOT NULL DEFAULT 0")
+                await db.execute(f"UPDATE {table} SET updated_at=?", (time.time(),))
+
+    async def _expire(self, db: aiosqlite.Connection) -> None:
+        cutoff = time.time() - self.ttl
+        async with db.execute("SELECT user_id, data FROM user_data WHERE updated_at < ?", (cutoff,)) as cur:
+            expired = {int(uid): self._decode(json.loads(data)) async for uid, data in cur if self.owns(uid)}
+        async with db.execute("SELECT user_id FROM user_data WHERE updated_at >= ?", (cutoff,)) as cur:
+            live = {int(uid) async for (uid,) in cur}
+        async with db.execute("SELECT name, key, updated_at FROM conversations") as cur:
+            stale_convs = [
+                (name, key) async for name, key, ts in cur
+                # key is [chat_id, user_id]; a user's fresh user_data keeps an older state row alive
+                if self.owns(json.loads(key)[0])
+                and (json.loads(key)[-1] in expired or (ts < cutoff and json.loads(key)[-1] not in live))
+            ]
+        if not expired and not stale_convs:
+            return
+        if expired and self.on_expire is not None:
+            try:
+                self.on_expire(expired)
+            except Exception as e:
+                log.warning("on_expire failed for %s expired sessions: %s", len(expired), e)
+        await db.executemany("DELETE FROM user_data WHERE user_id=?", [(uid,) for uid in expired])
+        await db.executemany("DELETE FROM conversations WHERE name=? AND key=?", stale_convs)
+        await db.commit()
+        self.expired += len(expired)
+        log.info("Expired %s idle sessions (%s conversation rows) older than %.0fs",
+                 len(expired), len(stale_convs), self.ttl)
+
+    def _encode(self, data: Any) -> str:
+        return json.dumps(data.to_json() if hasattr(data, "to_json") else data)
+
+    def _decode(self, obj: Any) -> Any:
+        from_json = getattr(self.user_data_type, "from_json", None)
+        return from_json(obj) if from_json is not None else obj
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending_users) + len(self._pending_convs),
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "expired": self.expired,
+        }
+
+    # ---------------- write-behind ----------------
+
+    def _schedule_flush(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        try:
+            await self._write_pending()
+        except Exception as e:
+            log.warning("Persistence flush failed (will retry): %s", e)
+        if self._pending_users or self._pending_convs:
+            self._flush_task = None
+            self._schedule_flush()  # changes that arrived while we were writing
+
+    async def _write_pending(self) -> None:
+        async with self._lock:
+            if not self._pending_users and not self._pending_convs:
+                return
+            users, self._pending_users = self._pending_users, {}
+            convs, self._pending_convs = self._pending_convs, {}
+
+            t0 = time.perf_counter()
+            now = time.time()
+            db = await self._conn()
+            try:
+                await db.executemany(
+                    "INSERT INTO user_data(user_id, data, updated_at) VALUES(?, ?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET data=excluded.data, updated_at=excluded.updated_at",
+                    [(uid, self._encode(d), now) for uid, d in users.items() if d is not _DELETE],
+                )
+                await db.executemany(
+                    "DELETE FROM user_data WHERE user_id=?",
+                    [(uid,) for uid, d in users.items() if d is _DELETE],
+                )
+                await db.executemany(
+                    "INSERT INTO conversations(name, key, state, updated_at) VALUES(?, ?, ?, ?) "
+                    "ON CONFLICT(name, key) DO UPDATE SET state=excluded.state, updated_at=excluded.updated_at",
+                    [(n, k, json.dumps(s), now) for (n, k), s in convs.items() if s is not _DELETE],
+                )
+                await db.executemany(
+                    "DELETE FROM conversations WHERE name=? AND key=?",
+                    [(n, k) for (n, k), s in convs.items() if s is _DELETE],
+                )
+                await db.commit()
+            except BaseException:  # includes cancellation during shutdown
+                await db.rollback()
+                # put the batch back unless newer values arrived meanwhile
+                for k, v in users.items():
+                    self._pending_users.setdefault(k, v)
+                for k, v in convs.items():
+                    self._pending_convs.setdefault(k, v)
+                raise
+
+            self.flushes += 1
+            self.rows_written += len(users) + len(convs)
+            self.last_flush_ms = (time.perf_counter() - t0) * 1000
+
+    # ---------------- reads (called once on startup) ----------------
+
+    async def get_user_data(self) -> Dict[int, Any]:
+        db = await self._conn()
+        async with db.execute("SELECT user_id, data FROM user_data") as cur:
+            return {int(uid): self._decode(json.loads(data)) async for uid, data in cur if self.owns(uid)}
+
+    async def get_conversations(self, name: str) -> ConversationDict:
+        db = await self._conn()
+        async with db.execute("SELECT key, state FROM conversations WHERE name=?", (name,)) as cur:
+            convs = ((tuple(json.loads(key)), state) async for key, state in cur)
+            return {key: json.loads(state) async for key, state in convs if self.owns(key[0])}
+
+    async def get_chat_data(self) -> Dict[int, Dict[str, Any]]:
+        return {}
+
+    async def get_bot_data(self) -> Dict[str, Any]:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    # ---------------- writes ----------------
+
+    async def update_user_data(self, user_id: int, data: Any) -> None:
+        self._pending_users[user_id] = data if data else _DELETE
+        self._schedule_flush()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._pending_users[user_id] = _DELETE
+        self._schedule_flush()
+
+    async def update_conversation(self, name: str, key: ConversationKey, new_state: Optional[object]) -> None:
+        self._pending_convs[(name, json.dumps(list(key)))] = _DELETE if new_state is None else new_state
+        self._schedule_flush()
+
+    async def update_chat_data(self, chat_id: int, data: Dict[str, Any]) -> None:
+        pass
+
+    async def update_bot_data(self, data: Dict[str, Any]) -> None:
+        pass
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: Any) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict[str, Any]) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: Dict[str, Any]) -> None:
+        pass
+
+    async def flush(self) -> None:
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        await self._write_pending()
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
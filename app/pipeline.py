@@ -0,0 +1,156 @@
+"""
+Work a handler hands off after it has answered the user.
+
+A callback handler answers the query and edits the message first (the user sees the button
+stop spinning right away), then submits the slow part, such as the lead write, to the
+BackgroundPipeline. A few worker tasks run the jobs, and a job that raises is retried with
+exponential backoff. CallbackLatency records, per callback type, how long the user waited for
+the ack and how long the whole thing took including the deferred job.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.metrics import Histogram
+
+log = logging.getLogger("e2t_onboarding_bot.pipeline")
+
+JobFn = Callable[[], Awaitable[Any]]
+
+
+def callback_kind(data: Optional[str]) -> str:
+    """Metric label for callback data: "REGION::UK/EU" -> "REGION", "DETAILS_OK" -> "DETAILS_OK"."""
+    return (data or "none").split("::", 1)[0]
+
+
+class CallbackLatency:
+    """Per callback type: handler entry -> answerCallbackQuery done, and -> all work done."""
+
+    def __init__(self) -> None:
+        self.ack: Dict[str, Histogram] = {}
+        self.e2e: Dict[str, Histogram] = {}
+
+    def acked(self, kind: str, started: float) -> None:
+        self.ack.setdefault(kind, Histogram()).observe(time.monotonic() - started)
+
+    def finished(self, kind: str, started: float) -> None:
+        self.e2e.setdefault(kind, Histogram()).observe(time.monotonic() - started)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            kind: {"ack_seconds": h.snapshot(), "e2e_seconds": self.e2e[kind].snapshot() if kind in self.e2e else None}
+            for kind, h in sorted(self.ack.items())
+        }
+
+
+@dataclass
+class _Job:
+    kind: str
+    fn: JobFn
+    started: Optional[float]  # monotonic time of the update that caused it, for e2e latency
+    on_failure: Optional[Callable[[BaseException], Awaitable[Any]]]
+    enqueued: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+
+
+class BackgroundPipeline:
+    """
+    Bounded queue + `workers` tasks. submit() only waits when the queue is full.
+
+    A job is retried up to `retries` times, `backoff` * 2**n seconds apart, then given up:
+    logged, counted, and handed to its on_failure (e.g. tell the user to contact support).
+    close() stops taking jobs and drains the queue, so it runs before anything the jobs
+    write to (the lead writer) is closed.
+    """
+
+    def __init__(self, *, workers: int = 4, max_queue: int = 10_000, retries: int = 3, backoff: float = 0.5,
+                 latency: Optional[CallbackLatency] = None):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.retries = retries
+        self.backoff = backoff
+        self.latency = latency
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._closing = False
+
+        self.done = 0
+        self.retried = 0
+        self.failed: Dict[str, int] = {}
+        self.queue_wait = Histogram()  # submit -> a worker picks it up
+        self.run_time: Dict[str, Histogram] = {}
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._closing = False
+        self._tasks = [asyncio.create_task(self._worker(), name=f"pipeline:{i}") for i in range(self.workers)]
+
+    async def close(self, timeout: float = 30.0) -> None:
+        self._closing = True
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                log.error("Pipeline closed with %s jobs still queued", self._queue.qsize())
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "done": self.done,
+            "retried": self.retried,
+            "failed": dict(self.failed),
+            "queue_wait_seconds": self.queue_wait.snapshot(),
+            "run_seconds": {k: h.snapshot() for k, h in sorted(self.run_time.items())},
+        }
+
+    async def submit(self, kind: str, fn: JobFn, *, started: Optional[float] = None,
+                     on_failure: Optional[Callable[[BaseException], Awaitable[Any]]] = None) -> None:
+        job = _Job(kind, fn, started, on_failure)
+        if self._queue is None or self._closing:
+            await self._run(job)  # not running (tools, shutdown): do it inline rather than drop it
+            return
+        await self._queue.put(job)
+
+    async def _worker(self) -> None:
+        assert self._queue is not None
+        while True:
+            job = await self._queue.get()
+            try:
+                self.queue_wait.observe(time.monotonic() - job.enqueued)
+                await self._run(job)
+            except Exception as e:  # on_failure itself blew up; the worker must survive
+                log.error("Pipeline job %s: failure handler raised: %s", job.kind, e)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: _Job) -> None:
+        while True:
+            job.attempts += 1
+            t0 = time.monotonic()
+            try:
+                await job.fn()
+            except Exception as e:
+                if job.attempts <= self.retries:
+                    self.retried += 1
+                    delay = self.backoff * 2 ** (job.attempts - 1)
+                    log.warning("Pipeline job %s failed (attempt %s), retrying in %.1fs: %s",
+                                job.kind, job.attempts, delay, e)
+                    await asyncio.sleep(delay)
+                    continue
+                self.failed[job.kind] = self.failed.get(job.kind, 0) + 1
+                log.error("Pipeline job %s gave up after %s attempts: %s", job.kind, job.attempts, e)
+                if job.on_failure is not None:
+                    await job.on_failure(e)
+                return
+            self.run_time.setdefault(job.kind, Histogram()).observe(time.monotonic() - t0)
+            self.done += 1
+            if job.started is not None and self.latency is not None:
+                self.latency.finished(job.kind, job.started)
+            return
@@ -0,0 +1,255 @@
+"""
+Nudges for users who stall mid-onboarding ("still there? just type your email…").
+
+Each stalled user has one reminder series: step i is due `delays[i]` seconds after their
+last activity (e.g. 1 h and 24 h). Any progress replaces or cancels the series.
+
+The due times sit in an in-memory min-heap and a single timer task sleeps until the
+earliest one, so the wake-up cost doesn't depend on how many reminders are pending.
+Cancelling is a dict pop: the heap entry goes stale and is skipped when it reaches the top
+(the heap is rebuilt when stale entries outnumber live ones). The series themselves are
+written through to SQLite in batches and the heap is rebuilt from there on start.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from telegram import Bot
+from telegram.error import Forbidden
+
+log = logging.getLogger("e2t_onboarding_bot.reminders")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reminders (
+    user_id INTEGER PRIMARY KEY,
+    chat_id INTEGER NOT NULL,
+    state   INTEGER NOT NULL,   -- conversation state the user is stuck in
+    step    INTEGER NOT NULL,   -- index of the next nudge
+    since   REAL NOT NULL       -- last activity (epoch seconds); step i is due at since + delays[i]
+);
+"""
+
+SendFn = Callable[[Bot, int, int, int], Awaitable[Any]]  # (bot, chat_id, state, step)
+
+_DELETE = None
+
+
+class ReminderScheduler:
+    def __init__(self, path: str, delays: Sequence[float], send: SendFn, *,
+                 flush_interval: float = 1.0, concurrency: int = 8):
+        self.path = path
+        self.delays = tuple(sorted(float(d) for d in delays))
+        self.send = send
+        self.flush_interval = flush_interval
+        self.concurrency = concurrency
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db_lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+
+        # user_id -> (gen, chat_id, state, step, since); gen ties a heap entry to the live series
+        self._live: Dict[int, Tuple[int, int, int, int, float]] = {}
+        self._heap: List[Tuple[float, int, int]] = []  # (due, gen, user_id)
+        self._gen = itertools.count(1)
+        self._pending: Dict[int, Optional[Tuple[int, int, int, float]]] = {}
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._bot: Optional[Bot] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._sends: Set[asyncio.Task] = set()
+        self._slots = asyncio.Semaphore(concurrency)
+
+        self.scheduled = 0
+        self.cancelled = 0
+        self.sent = 0
+        self.failed = 0
+        self.overdue_skipped = 0
+        self.stale_skipped = 0
+        self.wakeups = 0
+        self.compactions = 0
+
+    # ---------------- lifecycle ----------------
+
+    def _load_rows(self) -> List[Tuple[int, int, int, int, float]]:
+        with self._db_lock:
+            return self._db.execute("SELECT user_id, chat_id, state, step, since FROM reminders").fetchall()
+
+    async def start(self, bot: Bot, owns: Optional[Callable[[int], bool]] = None) -> int:
+        """
+        Rebuild the heap from disk and start the timer. Returns the number of pending series.
+        With `owns`, only series whose chat it accepts are loaded (sharded workers share the file).
+        """
+        self._bot = bot
+        for user_id, chat_id, state, step, since in await asyncio.to_thread(self._load_rows):
+            if step < len(self.delays) and (owns is None or owns(chat_id)):
+                gen = next(self._gen)
+                self._live[user_id] = (gen, chat_id, state, step, since)
+                self._heap.append((since + self.delays[step], gen, user_id))
+        heapq.heapify(self._heap)
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="reminders")
+        return len(self._live)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._sends:  # already popped off the heap: let them go out rather than lose them
+            _, late = await asyncio.wait(list(self._sends), timeout=5)
+            for t in late:
+                t.cancel()
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await asyncio.to_thread(self._write, self._take_pending())
+        with self._db_lock:
+            self._db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._live),
+            "heap_size": len(self._heap),
+            "scheduled": self.scheduled,
+            "cancelled": self.cancelled,
+            "sent": self.sent,
+            "failed": self.failed,
+            "overdue_skipped": self.overdue_skipped,
+            "stale_skipped": self.stale_skipped,
+            "wakeups": self.wakeups,
+            "compactions": self.compactions,
+        }
+
+    # ---------------- api ----------------
+
+    def schedule(self, user_id: int, chat_id: int, state: int, now: Optional[float] = None) -> None:
+        """(Re)start the user's series from now, for `state`. Replaces any series in flight."""
+        if not self.delays:
+            return
+        since = time.time() if now is None else now
+        self._set(user_id, chat_id, state, 0, since)
+        self.scheduled += 1
+
+    def cancel(self, user_id: int) -> bool:
+        if self._live.pop(user_id, None) is None:
+            return False
+        self._mark(user_id, _DELETE)
+        self.cancelled += 1
+        return True
+
+    def _set(self, user_id: int, chat_id: int, state: int, step: int, since: float) -> None:
+        gen = next(self._gen)
+        self._live[user_id] = (gen, chat_id, state, step, since)
+        due = since + self.delays[step]
+        if not self._heap or due < self._heap[0][0]:
+            self._wake.set()  # new earliest: the timer has to sleep less
+        heapq.heappush(self._heap, (due, gen, user_id))
+        self._mark(user_id, (chat_id, state, step, since))
+
+    # ---------------- timer ----------------
+
+    async def _run(self) -> None:
+        while True:
+            self._wake.clear()
+            now = time.time()
+            heap = self._heap
+            while heap and heap[0][0] <= now:
+                _, gen, user_id = heapq.heappop(heap)
+                live = self._live.get(user_id)
+                if live is None or live[0] != gen:
+                    self.stale_skipped += 1
+                    continue
+                self._fire(user_id, live, now)
+            if len(heap) > 2 * len(self._live) + 1024:
+                self._compact()
+            timeout = (heap[0][0] - now) if heap else None
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeups += 1
+
+    def _compact(self) -> None:
+        self._heap = [(since + self.delays[step], gen, uid) for uid, (gen, _, _, step, since) in self._live.items()]
+        heapq.heapify(self._heap)
+        self.compactions += 1
+
+    def _fire(self, user_id: int, live: Tuple[int, int, int, int, float], now: float) -> None:
+        _, chat_id, state, step, since = live
+        # Back from downtime with several steps overdue: only send the latest one
+        while step + 1 < len(self.delays) and since + self.delays[step + 1] <= now:
+            step += 1
+            self.overdue_skipped += 1
+        if step + 1 < len(self.delays):
+            self._set(user_id, chat_id, state, step + 1, since)
+        else:
+            self._live.pop(user_id, None)
+            self._mark(user_id, _DELETE)
+        t = asyncio.create_task(self._send(user_id, chat_id, state, step))
+        self._sends.add(t)
+        t.add_done_callback(self._sends.discard)
+
+    async def _send(self, user_id: int, chat_id: int, state: int, step: int) -> None:
+        async with self._slots:
+            try:
+                await self.send(self._bot, chat_id, state, step)
+                self.sent += 1
+            except Forbidden:
+                self.failed += 1
+                self.cancel(user_id)  # blocked the bot: no point in the rest of the series
+            except Exception as e:
+                self.failed += 1
+                log.warning("Reminder %s for chat_id=%s failed: %s", step, chat_id, e)
+
+    # ---------------- write-behind ----------------
+
+    def _mark(self, user_id: int, row: Optional[Tuple[int, int, int, float]]) -> None:
+        self._pending[user_id] = row
+        if self._flush_task is None or self._flush_task.done():
+            try:
+                self._flush_task = asyncio.get_running_loop().create_task(self._delayed_flush())
+            except RuntimeError:
+                pass  # no loop (tools/tests): close() writes it
+
+    def _take_pending(self) -> Dict[int, Optional[Tuple[int, int, int, float]]]:
+        pending, self._pending = self._pending, {}
+        return pending
+
+    async def _delayed_flush(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        pending = self._take_pending()
+        try:
+            await asyncio.to_thread(self._write, pending)
+        except Exception as e:
+            log.warning("Failed to persist %s reminder changes (will retry): %s", len(pending), e)
+            for k, v in pending.items():
+                self._pending.setdefault(k, v)
+        if self._pending:
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    def _write(self, pending: Dict[int, Optional[Tuple[int, int, int, float]]]) -> None:
+        if not pending:
+            return
+        with self._db_lock, self._db:
+            self._db.executemany(
+                "INSERT INTO reminders(user_id, chat_id, state, step, since) VALUES(?, ?, ?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET chat_id=excluded.chat_id, state=excluded.state, "
+                "step=excluded.step, since=excluded.since",
+                [(uid, *row) for uid, row in pending.items() if row is not _DELETE],
+            )
+            self._db.executemany(
+                "DELETE FROM reminders WHERE user_id=?",
+                [(uid,) for uid, row in pending.items() if row is _DELETE],
+            )
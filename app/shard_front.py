@@ -0,0 +1,53 @@
+"""
+The front process of BOT_MODE=sharded.
+
+The front only routes webhook POSTs to the workers (app/sharding.py) and registers the webhook
+with Telegram. It must not build bot_v3's singletons (media cache, lead store, persistence,
+reminders, ...): those belong to the workers, and shard 0's files would be opened by a second
+process. So bot_v3 hands over to run_front() before it creates any of them, and this module
+imports nothing but the router. The update types to register come from worker 0, whose
+handlers define them.
+"""
+import asyncio
+import logging
+import sys
+from typing import Optional
+
+from telegram import Bot
+
+from app.sharding import serve_sharded
+
+
+def run_front(
+    *,
+    workers: int,
+    listen: str,
+    port: int,
+    path: str,
+    secret_token: str,
+    base_port: int,
+    token: str,
+    base_url: Optional[str],
+    webhook_url: Optional[str],
+    max_queue: int,
+    streams: int,
+) -> int:
+    """Run the front and its `workers` (python -m app.bot_v3) until SIGINT/SIGTERM; returns the exit code."""
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(name)s | %(message)s")
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    bot = Bot(token, base_url=base_url) if base_url else Bot(token)
+    return asyncio.run(
+        serve_sharded(
+            workers=workers,
+            command=[sys.executable, "-m", "app.bot_v3"],
+            listen=listen,
+            port=port,
+            path=path,
+            secret_token=secret_token,
+            base_port=base_port,
+            bot=bot,
+            webhook_url=webhook_url or None,
+            max_queue=max_queue,
+            streams=streams,
+        )
+    )
@@ -0,0 +1,354 @@
+"""
+Horizontal sharding: one front process takes Telegram's webhook and routes every update to
+one of N worker processes by a hash of its chat_id. Each worker is a normal bot_v3 in
+webhook mode, listening on localhost.
+
+All updates for a chat go to the same worker, and within it to the same one of the worker's
+`streams` ordered lanes (by the same hash). Each stream forwards one update at a time, so a
+worker has up to `streams` updates in flight, never two for one chat. The front answers
+Telegram only once the worker has accepted (queued) the update, so per-chat order holds end
+to end. A worker that is full pushes back as 503, and
+Telegram retries. Workers share the SQLite files (WAL), and each one loads and expires only
+the rows of the chats it owns (`shard_of(chat_id) == SHARD_INDEX`).
+"""
+import asyncio
+import hmac
+import logging
+import os
+import secrets
+import signal
+import time
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import httpx
+from telegram import Bot
+
+from app.httpd import Request, Response, serve
+from app.metrics import Histogram
+from app.webhook import SECRET_HEADER
+
+log = logging.getLogger("e2t_onboarding_bot.sharding")
+
+# Update fields whose payload carries the chat the update belongs to
+_CHAT_KEYS = (
+    "message", "edited_message", "channel_post", "edited_channel_post",
+    "business_message", "edited_business_message",
+    "my_chat_member", "chat_member", "chat_join_request",
+    "message_reaction", "message_reaction_count", "chat_boost", "removed_chat_boost",
+)
+
+
+def shard_of(chat_id: int, count: int) -> int:
+    """Worker index for a chat. Stable across processes and restarts (unlike hash())."""
+    if count <= 1:
+        return 0
+    return zlib.crc32(int(chat_id).to_bytes(8, "little", signed=True)) % count
+
+
+def shard_path(path: str, index: int, count: int) -> str:
+    """Per-worker variant of a file/dir path that must not be shared: x.json -> x.shard1.json, dir -> dir/shard1."""
+    if count <= 1:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard{index}{ext}" if ext else os.path.join(path, f"shard{index}")
+
+
+def update_chat_id(update: Dict[str, Any]) -> Optional[int]:
+    """chat_id of a raw (JSON) update; the sender's id for updates without a chat; None if neither."""
+    for key in _CHAT_KEYS:
+        obj = update.get(key)
+        if isinstance(obj, dict) and isinstance(obj.get("chat"), dict):
+            return obj["chat"].get("id")
+    cq = update.get("callback_query")
+    if isinstance(cq, dict):
+        msg = cq.get("message")
+        if isinstance(msg, dict) and isinstance(msg.get("chat"), dict):
+            return msg["chat"].get("id")
+        return (cq.get("from") or {}).get("id")  # button on an inline message: the user's own chat
+    for obj in update.values():  # inline queries, payments, poll answers, ...
+        if isinstance(obj, dict):
+            sender = obj.get("from") or obj.get("user")
+            if isinstance(sender, dict):
+                return sender.get("id")
+    return None
+
+
+# ============================================================
+# Front: routing
+# ============================================================
+
+class _Lane:
+    """
+    One worker's forwarding: `streams` ordered queues, each forwarding its updates one at a
+    time and retrying a 503 in place. A chat always maps to the same stream.
+    """
+
+    def __init__(self, index: int, url: str, secret: str, *, max_queue: int, retry_for: float, streams: int = 1):
+        self.index = index
+        self.url = url
+        self.retry_for = retry_for
+        self._headers = {SECRET_HEADER: secret, "Content-Type": "application/json"}
+        self.queues: List[asyncio.Queue] = [asyncio.Queue(maxsize=max(1, max_queue // streams))
+                                            for _ in range(max(1, streams))]
+        self._client = httpx.AsyncClient(timeout=10.0, limits=httpx.Limits(max_connections=len(self.queues)))
+        self._tasks: List[asyncio.Task] = []
+
+        self.forwarded = 0
+        self.retries = 0
+        self.failed = 0
+
+    def qsize(self) -> int:
+        return sum(q.qsize() for q in self.queues)
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._run(q), name=f"shard-lane:{self.index}.{n}")
+                       for n, q in enumerate(self.queues)]
+
+    async def close(self, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(asyncio.gather(*(q.join() for q in self.queues)), timeout)
+        except asyncio.TimeoutError:
+            log.error("Shard %s: %s updates not forwarded at shutdown", self.index, self.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self._client.aclose()
+
+    async def _run(self, queue: asyncio.Queue) -> None:
+        while True:
+            body, future = await queue.get()
+            try:
+                status = await self._forward(body)
+                if not future.done():
+                    future.set_result(status)
+            finally:
+                queue.task_done()
+
+    async def _forward(self, body: bytes) -> int:
+        # Retrying here, rather than bouncing to Telegram, keeps later updates for the
+        # same chats from overtaking this one
+        deadline = time.monotonic() + self.retry_for
+        delay = 0.05
+        while True:
+            try:
+                r = await self._client.post(self.url, content=body, headers=self._headers)
+                if r.status_code != 503:
+                    self.forwarded += r.status_code < 300
+                    return r.status_code
+            except httpx.HTTPError as e:
+                log.warning("Shard %s unreachable: %s", self.index, e)
+            if time.monotonic() >= deadline:
+                self.failed += 1
+                return 503
+            self.retries += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+
+class ShardRouter:
+    """
+    HTTP handler for Telegram's webhook in front of the workers. Checks the secret header,
+    reads the chat_id out of the JSON, and answers with the owning worker's status. Updates
+    without a chat go to worker 0.
+    """
+
+    def __init__(self, worker_urls: Sequence[str], *, path: str, secret_token: str, worker_secret: str,
+                 max_queue: int = 1000, retry_for: float = 5.0, streams: int = 1):
+        self.path = path
+        self._secret = secret_token.encode("utf-8")
+        self.lanes = [_Lane(i, url, worker_secret, max_queue=max_queue, retry_for=retry_for, streams=streams)
+                      for i, url in enumerate(worker_urls)]
+        self.latency = Histogram()  # received -> worker accepted
+        self.rejected: Dict[str, int] = {"secret": 0, "queue_full": 0, "bad_request": 0, "not_found": 0}
+
+    def start(self) -> None:
+        for lane in self.lanes:
+            lane.start()
+
+    async def close(self, timeout: float = 10.0) -> None:
+        await asyncio.gather(*(lane.close(timeout) for lane in self.lanes))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "forwarded": [lane.forwarded for lane in self.lanes],
+            "queue_depth": [lane.qsize() for lane in self.lanes],
+            "retries": sum(lane.retries for lane in self.lanes),
+            "failed": sum(lane.failed for lane in self.lanes),
+            "forward_seconds": self.latency.snapshot(),
+            **{f"rejected_{k}": v for k, v in self.rejected.items()},
+        }
+
+    async def __call__(self, req: Request) -> Response:
+        if req.path != self.path:
+            self.rejected["not_found"] += 1
+            return Response(404)
+        if req.method != "POST":
+            return Response(405)
+        got = req.headers.get(SECRET_HEADER, "").encode("utf-8")
+        if not hmac.compare_digest(got, self._secret):
+            self.rejected["secret"] += 1
+            return Response(403)
+
+        try:
+            chat_id = update_chat_id(req.json())
+        except (ValueError, AttributeError):
+            self.rejected["bad_request"] += 1
+            return Response(400)
+
+        t0 = time.monotonic()
+        # shard_of over workers * streams: slot % workers is shard_of(chat_id, workers), so the
+        # worker is unchanged and slot // workers picks the stream within it
+        workers = len(self.lanes)
+        slot = shard_of(chat_id, workers * len(self.lanes[0].queues)) if chat_id is not None else 0
+        lane = self.lanes[slot % workers]
+        future = asyncio.get_running_loop().create_future()
+        try:
+            lane.queues[slot // workers].put_nowait((req.body, future))
+        except asyncio.QueueFull:
+            self.rejected["queue_full"] += 1
+            return Response(503, headers={"Retry-After": "1"})
+        status = await future
+        self.latency.observe(time.monotonic() - t0)
+        if status == 503:
+            return Response(503, headers={"Retry-After": "1"})
+        return Response(status)
+
+
+# ============================================================
+# Front: worker processes
+# ============================================================
+
+async def _wait_ready(procs: List[asyncio.subprocess.Process], ports: List[int], timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    for i, (proc, port) in enumerate(zip(procs, ports)):
+        while True:
+            if proc.returncode is not None:
+                raise RuntimeError(f"Shard {i} exited during startup (code {proc.returncode})")
+            try:
+                _, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Shard {i} did not start listening on port {port} within {timeout:.0f}s")
+                await asyncio.sleep(0.1)
+
+
+async def _allowed_updates_from(url: str, worker_secret: str) -> List[str]:
+    """The update types a worker's handlers consume (its WebhookIngest answers a GET on the path)."""
+    async with httpx.AsyncClient(timeout=10.0) as client:
+        r = await client.get(url, headers={SECRET_HEADER: worker_secret})
+        r.raise_for_status()
+        return list(r.json()["allowed_updates"])
+
+
+async def _stop_workers(procs: List[asyncio.subprocess.Process], timeout: float) -> None:
+    for p in procs:
+        if p.returncode is None:
+            p.terminate()  # SIGTERM: the worker drains and shuts down like a single bot would
+    try:
+        await asyncio.wait_for(asyncio.gather(*(p.wait() for p in procs)), timeout)
+    except asyncio.TimeoutError:
+        for p in procs:
+            if p.returncode is None:
+                log.error("Shard pid %s did not stop within %.0fs, killing it", p.pid, timeout)
+                p.kill()
+        await asyncio.gather(*(p.wait() for p in procs))
+
+
+async def serve_sharded(
+    *,
+    workers: int,
+    command: Sequence[str],
+    listen: str,
+    port: int,
+    path: str,
+    secret_token: str,
+    base_port: int,
+    bot: Bot,
+    webhook_url: Optional[str],
+    allowed_updates: Optional[Iterable[str]] = None,
+    max_connections: int = 40,
+    max_queue: int = 1000,
+    streams: int = 4,
+    ready_timeout: float = 120.0,
+    stop_event: Optional[asyncio.Event] = None,
+) -> int:
+    """
+    Start `workers` copies of `command` (each gets SHARD_INDEX/SHARD_COUNT and its own
+    localhost port), route the webhook to them until SIGINT/SIGTERM or stop_event, then stop
+    them. If a worker dies, everything is stopped and 1 is returned, so the service manager
+    restarts the whole set; otherwise returns 0. Without `allowed_updates`, the types
+    registered with the webhook are asked from worker 0, so the front needs no handlers.
+    """
+    worker_secret = secrets.token_urlsafe(32)
+    ports = [base_port + i for i in range(workers)]
+    procs: List[asyncio.subprocess.Process] = []
+    for i, worker_port in enumerate(ports):
+        env = {
+            **os.environ,
+            "BOT_MODE": "webhook",
+            "SHARD_INDEX": str(i),
+            "SHARD_COUNT": str(workers),
+            "WEBHOOK_LISTEN": "127.0.0.1",
+            "WEBHOOK_PORT": str(worker_port),
+            "WEBHOOK_PATH": path,
+            "WEBHOOK_URL": "",  # the front owns the registration with Telegram
+            "WEBHOOK_SECRET": worker_secret,
+            "WEBHOOK_MAX_QUEUE": str(max_queue),
+        }
+        # Own session: a Ctrl+C reaches only the front, which then stops the workers in order
+        procs.append(await asyncio.create_subprocess_exec(*command, env=env, start_new_session=True))
+
+    router = ShardRouter([f"http://127.0.0.1:{p}{path}" for p in ports], path=path, secret_token=secret_token,
+                         worker_secret=worker_secret, max_queue=max_queue, streams=streams)
+    server = None
+    exit_code = 0
+    try:
+        await _wait_ready(procs, ports, ready_timeout)
+        router.start()
+        server = await serve(router, listen, port)
+        if webhook_url:
+            if allowed_updates is None:
+                allowed_updates = await _allowed_updates_from(f"http://127.0.0.1:{ports[0]}{path}", worker_secret)
+            async with bot:
+                await bot.set_webhook(
+                    url=webhook_url,
+                    secret_token=secret_token,
+                    allowed_updates=list(allowed_updates),
+                    max_connections=max_connections,
+                    drop_pending_updates=False,
+                )
+        log.info("Shard front listening on %s:%s%s -> %s workers on ports %s-%s",
+                 listen, port, path, workers, ports[0], ports[-1])
+
+        stop = stop_event or asyncio.Event()
+        if stop_event is None:
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    loop.add_signal_handler(sig, stop.set)
+                except (NotImplementedError, RuntimeError):
+                    pass
+        waits = {asyncio.create_task(p.wait()): i for i, p in enumerate(procs)}
+        stopping = asyncio.create_task(stop.wait())
+        done, _ = await asyncio.wait([stopping, *waits], return_when=asyncio.FIRST_COMPLETED)
+        for t in done:
+            if t in waits:
+                log.error("Shard %s exited unexpectedly (code %s); stopping all shards", waits[t], t.result())
+                exit_code = 1
+        stopping.cancel()
+        for t in waits:
+            t.cancel()
+    except RuntimeError as e:
+        log.error("%s", e)
+        exit_code = 1
+    finally:
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+        await router.close()
+        await _stop_workers(procs, timeout=60)
+        log.info("Shard front stats: %s", router.stats())
+    return exit_code
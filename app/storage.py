@@ -1,39 +1,243 @@
+import asyncio
 import csv
+import io
+import logging
 import os
+import time
 from datetime import datetime
-from typing import Dict, Any
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.metrics import Histogram
+
+log = logging.getLogger("e2t_onboarding_bot.storage")
+
+_O_BINARY = getattr(os, "O_BINARY", 0)  # Windows: no newline translation
+
+LEAD_FIELDS = ["timestamp", "telegram_id", "telegram_username", "platform", "email", "phone", "region"]
 
 
 def ensure_dir(path: str) -> None:
     os.makedirs(path, exist_ok=True)
 
 
-def save_lead_csv(base_dir: str, user_id: int, username: str | None, data: Dict[str, Any]) -> str:
+def lead_row(user_id: int, username: str | None, data: Dict[str, Any]) -> List[Any]:
+    return [
+        datetime.now().isoformat(timespec="seconds"),
+        user_id,
+        username or "",
+        data.get("platform", ""),
+        data.get("email", ""),
+        data.get("phone", ""),
+        data.get("region", ""),
+    ]
+
+
+def append_lead_rows(base_dir: str, rows: List[List[Any]], fsync: bool = False) -> str:
     """
-    Append a row to leads.csv with the user’s answers.
+    Append rows to leads.csv (header written on first use) in one O_APPEND write, so several
+    processes (sharded workers) can append to the same file without interleaving rows.
     Returns the path to the CSV.
     """
     ensure_dir(base_dir)
     filename = os.path.join(base_dir, "leads.csv")
-    file_exists = os.path.exists(filename)
-
-    with open(filename, "a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        if not file_exists:
-            writer.writerow(
-                ["timestamp", "telegram_id", "telegram_username", "platform", "email", "phone", "region"]
-            )
-
-        writer.writerow(
-            [
-                datetime.now().isoformat(timespec="seconds"),
-                user_id,
-                username or "",
-                data.get("platform", ""),
-                data.get("email", ""),
-                data.get("phone", ""),
-                data.get("region", ""),
-            ]
-        )
+
+    buf = io.StringIO(newline="")
+    csv.writer(buf).writerows(rows)
+    try:
+        # Only the process that creates the file writes the header, in the same write as its rows
+        fd = os.open(filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_EXCL | _O_BINARY, 0o644)
+        header = io.StringIO(newline="")
+        csv.writer(header).writerow(LEAD_FIELDS)
+        data = (header.getvalue() + buf.getvalue()).encode("utf-8")
+    except FileExistsError:
+        fd = os.open(filename, os.O_WRONLY | os.O_APPEND | _O_BINARY)
+        data = buf.getvalue().encode("utf-8")
+    try:
+        view = memoryview(data)
+        while view:  # a regular file takes it in one go; loop in case of a short write
+            view = view[os.write(fd, view):]
+        if fsync:
+            os.fsync(fd)
+    finally:
+        os.close(fd)
 
     return filename
+
+
+def save_lead_csv(base_dir: str, user_id: int, username: str | None, data: Dict[str, Any]) -> str:
+    """
+    Append a row to leads.csv with the user’s answers.
+    Returns the path to the CSV.
+    """
+    return append_lead_rows(base_dir, [lead_row(user_id, username, data)])
+
+
+class LeadWriter:
+    """
+    Async, batched replacement for save_lead_csv inside the event loop.
+
+    submit() puts the row on a bounded in-memory queue and resolves once the batch
+    containing it has been written (and fsynced, per policy) by a background task
+    that does the file I/O in a worker thread. A row is never acknowledged before it
+    is on disk. A failed batch is retried for up to retry_for seconds; after that its
+    submit() calls raise the last error instead of waiting forever (disk full, read-only
+    volume). close() drains everything still queued.
+
+    fsync policy:
+      "always"   - fsync every batch before acknowledging (default)
+      "interval" - fsync at most every fsync_interval seconds (faster; a crash can lose
+                   acknowledged rows that were still in the OS page cache)
+      "never"    - leave it to the OS
+
+    `sink(rows, fsync) -> location` does the actual write (default: append_lead_rows to
+    base_dir/leads.csv). It runs in a worker thread and is called again with the
+    same rows if it raises, until retry_for runs out.
+    """
+
+    def __init__(
+        self,
+        base_dir: str,
+        *,
+        flush_interval: float = 0.0,
+        max_batch: int = 500,
+        max_queue: int = 10_000,
+        fsync: str = "always",
+        fsync_interval: float = 1.0,
+        retry_for: float = 30.0,
+        sink: Optional[Callable[[List[List[Any]], bool], str]] = None,
+    ):
+        if fsync not in ("always", "interval", "never"):
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.base_dir = base_dir
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.retry_for = retry_for
+        self.sink = sink or (lambda rows, fsync: append_lead_rows(base_dir, rows, fsync))
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._last_fsync = 0.0
+
+        self.written = 0
+        self.batches = 0
+        self.write_errors = 0
+        self.failed = 0  # rows given up on after retry_for
+        self.latency = Histogram()  # submit -> durable ack, seconds
+        self.batch_sizes = Histogram((1, 2, 5, 10, 25, 50, 100, 250, 500, 1000))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "written": self.written,
+            "batches": self.batches,
+            "write_errors": self.write_errors,
+            "failed": self.failed,
+            "latency_seconds": self.latency.snapshot(),
+            "batch_size": self.batch_sizes.snapshot(),
+        }
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._closing = False
+            self._task = asyncio.create_task(self._run(), name="lead-writer")
+
+    async def submit(self, user_id: int, username: str | None, data: Dict[str, Any]) -> str:
+        """Queue a lead and wait until it is written. Returns the CSV path."""
+        return await self.submit_row(lead_row(user_id, username, data))
+
+    async def submit_row(self, row: List[Any]) -> str:
+        """Like submit(), for a row already built with lead_row() (e.g. reused across retries)."""
+        if self._task is None or self._closing:
+            raise RuntimeError("LeadWriter is not running")
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, fut, time.perf_counter()))
+        return await fut
+
+    async def close(self) -> None:
+        """Stop accepting leads and wait until everything queued is on disk."""
+        if self._task is None:
+            return
+        self._closing = True
+        await self._queue.put(None)  # sentinel: drain then exit
+        await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        stop = False
+        while True:
+            if stop:
+                first = self._queue.get_nowait()
+            else:
+                first = await self._queue.get()
+                stop = first is None
+            batch: List[Tuple[List[Any], asyncio.Future, float]] = [] if first is None else [first]
+
+            deadline = time.monotonic() + self.flush_interval
+            while not stop and len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                try:
+                    item = self._queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(self._queue.get(), timeout)
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            if stop:  # drain whatever is left without waiting
+                while not self._queue.empty():
+                    item = self._queue.get_nowait()
+                    if item is not None:
+                        batch.append(item)
+
+            if batch:
+                await self._write_batch(batch)
+            if stop:
+                await asyncio.sleep(0)  # let submitters that were blocked on a full queue enqueue
+                if self._queue.empty():
+                    return
+
+    async def _write_batch(self, batch: List[Tuple[List[Any], asyncio.Future, float]]) -> None:
+        rows = [row for row, _, _ in batch]
+        now = time.monotonic()
+        do_fsync = self.fsync == "always" or (
+            self.fsync == "interval" and now - self._last_fsync >= self.fsync_interval
+        )
+
+        delay = 0.5
+        give_up = now + self.retry_for
+        while True:
+            try:
+                path = await asyncio.to_thread(self.sink, rows, do_fsync)
+                break
+            except Exception as e:
+                # Keep the batch: nothing in it has been acknowledged yet
+                self.write_errors += 1
+                if time.monotonic() + delay > give_up:
+                    # A lasting failure: hand it to the submitters rather than block them (and close()) forever
+                    self.failed += len(rows)
+                    log.error("Lead batch write failed (%s rows), giving up after %.1fs: %s",
+                              len(rows), time.monotonic() - now, e)
+                    for _, fut, _ in batch:
+                        if not fut.done():
+                            fut.set_exception(e)
+                    return
+                log.warning("Lead batch write failed (%s rows), retrying in %.1fs: %s", len(rows), delay, e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 10.0)
+
+        if do_fsync:
+            self._last_fsync = now
+        self.written += len(rows)
+        self.batches += 1
+        self.batch_sizes.observe(len(rows))
+        done = time.perf_counter()
+        for _, fut, submitted in batch:
+            self.latency.observe(done - submitted)
+            if not fut.done():
+                fut.set_result(path)
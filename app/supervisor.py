@@ -0,0 +1,130 @@
+"""
+Per-chat supervision of the onboarding sequences.
+
+The conversation allows re-entry, so a user hammering /start or RESTART would otherwise
+get one overlapping intro per tap, each uploading the CEO video, guide and PDF again.
+The supervisor makes a chat own at most one sequence: starting a new one cancels the
+previous plan, including the step that is mid-send (see DripScheduler.cancel). On top of
+that, an asset already delivered to a chat within `dedupe_window` seconds is not sent
+again, whichever sequence asks for it, unless the user explicitly asked to start over
+(forget()).
+"""
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Collection, Dict, Iterable, List, Optional, Tuple
+
+from telegram.ext import JobQueue
+
+from app.assets import Asset
+from app.drip import DripScheduler
+
+log = logging.getLogger("e2t_onboarding_bot.supervisor")
+
+
+class ChatSupervisor:
+    def __init__(self, drip: DripScheduler, *, dedupe_window: float = 600.0, max_entries: int = 100_000):
+        self.drip = drip
+        self.dedupe_window = dedupe_window
+        self.max_entries = max_entries
+        # (chat_id, asset name, sha256) -> monotonic time of the last delivery, oldest first
+        self._delivered: "OrderedDict[Tuple[int, str, str], float]" = OrderedDict()
+        # chat_id -> monotonic time of its last forget(): earlier deliveries don't count, oldest first
+        self._forgotten: Dict[int, float] = {}
+
+        self.sequences = 0
+        self.superseded = 0
+        self.deduped_sends = 0
+        self.deduped_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sequences": self.sequences,
+            "superseded": self.superseded,
+            "interrupted_steps": self.drip.interrupted,
+            "deduped_sends": self.deduped_sends,
+            "deduped_bytes": self.deduped_bytes,
+            "tracked_deliveries": len(self._delivered),
+        }
+
+    # ---------------- sequences ----------------
+
+    def supersede(self, job_queue: JobQueue, chat_id: int) -> bool:
+        """
+        Cancel the chat's sequence in flight, if any. Call it before sending anything for the
+        new sequence: the outbound queue is FIFO per chat, so a new message would otherwise
+        wait behind the old sequence's media.
+        """
+        if not self.drip.cancel(job_queue, chat_id):
+            return False
+        self.superseded += 1
+        log.info("chat_id=%s: cancelled the sequence in flight", chat_id)
+        return True
+
+    def start(self, job_queue: JobQueue, chat_id: int, plan: str) -> None:
+        """Run `plan` for the chat, cancelling whatever sequence it had in flight."""
+        self.supersede(job_queue, chat_id)
+        self.sequences += 1
+        self.drip.start(job_queue, chat_id, plan)
+
+    def forget(self, chat_id: int) -> None:
+        """Let the chat's next sequence send everything again (a restart the user asked for)."""
+        self._forgotten.pop(chat_id, None)
+        self._forgotten[chat_id] = time.monotonic()
+
+    def _delivered_at(self, key: Tuple[int, str, str]) -> Optional[float]:
+        at = self._delivered.get(key)
+        if at is None or at <= self._forgotten.get(key[0], -1.0):
+            return None
+        return at
+
+    # ---------------- handoff ----------------
+
+    def deliveries(self, chat_ids: Collection[int]) -> List[Tuple[int, str, str, float]]:
+        """(chat_id, asset name, sha256, delivered at as epoch seconds) still inside the window, for those chats."""
+        now, mono = time.time(), time.monotonic()
+        self._prune(mono)
+        return [(c, name, sha, now - (mono - t)) for (c, name, sha), t in self._delivered.items()
+                if c in chat_ids and self._delivered_at((c, name, sha)) is not None]
+
+    def restore_deliveries(self, rows: Iterable[Tuple[int, str, str, float]]) -> None:
+        """Take over deliveries recorded by a previous process, so a resumed step doesn't resend them."""
+        now, mono = time.time(), time.monotonic()
+        for chat_id, name, sha, at in sorted(rows, key=lambda r: r[3]):
+            if now - at < self.dedupe_window:
+                self._delivered[(chat_id, name, sha)] = mono - (now - at)
+
+    # ---------------- sends ----------------
+
+    def _prune(self, now: float) -> None:
+        d = self._delivered
+        while d and (len(d) > self.max_entries or now - next(iter(d.values())) >= self.dedupe_window):
+            d.popitem(last=False)
+        f = self._forgotten
+        while f and now - next(iter(f.values())) >= self.dedupe_window:
+            del f[next(iter(f))]
+
+    async def send_once(self, chat_id: int, asset: Asset, send: Callable[[], Awaitable[Any]]) -> bool:
+        """
+        Await `send()` unless this exact file (name + content) reached the chat within the
+        dedupe window. Returns False when the send was skipped. A send that raises is not
+        recorded, so the next attempt goes out.
+        """
+        if self.dedupe_window <= 0:
+            await send()
+            return True
+
+        key = (chat_id, asset.name, asset.sha256)
+        now = time.monotonic()
+        self._prune(now)
+        at = self._delivered_at(key)
+        if at is not None:
+            self.deduped_sends += 1
+            self.deduped_bytes += asset.size
+            log.info("chat_id=%s: %s already delivered %.0fs ago, not sending again", chat_id, asset.name, now - at)
+            return False
+
+        await send()
+        self._delivered[key] = time.monotonic()
+        self._delivered.move_to_end(key)
+        return True
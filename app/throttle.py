@@ -0,0 +1,119 @@
+"""
+Per-user admission filter that runs before the conversation handlers.
+
+Registered as a TypeHandler in group -1, it sees every update first and stops the ones a
+user sends faster than the bot will serve (ApplicationHandlerStop), so a flooding user
+or bot farm costs a dict lookup instead of handler work and outbound API calls.
+
+Each user gets a token bucket (`rate` updates/s, `burst` deep). Buckets live in an LRU
+bounded by `max_users`; an evicted user simply starts again with a full bucket. Updates
+that repeat the user's previous message text / callback data within `coalesce_window`
+(double taps, resent messages) are dropped as duplicates without spending a token.
+A dropped button tap is still answered (in the background), so its spinner stops.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Set
+
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+
+from app.outbox import TokenBucket
+
+log = logging.getLogger("e2t_onboarding_bot.throttle")
+
+DROP_RATE = "rate"
+DROP_DUPLICATE = "duplicate"
+
+
+class _UserBucket(TokenBucket):
+    __slots__ = ("sig", "sig_at")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        super().__init__(rate, capacity, now)
+        self.sig = 0
+        self.sig_at = 0.0
+
+
+def _signature(update: Update) -> int:
+    """What the user sent, for spotting repeats: message text or callback data."""
+    if update.callback_query is not None:
+        return hash(("c", update.callback_query.data))
+    msg = update.message
+    return hash(("m", msg.text if msg is not None else None))
+
+
+class UpdateThrottle:
+    def __init__(self, *, rate: float = 1.0, burst: float = 5.0, coalesce_window: float = 1.0,
+                 max_users: int = 100_000, exempt: Iterable[int] = ()):
+        self.rate = rate
+        self.burst = burst
+        self.coalesce_window = coalesce_window
+        self.max_users = max_users
+        self.exempt = frozenset(exempt)
+        self._buckets: "OrderedDict[int, _UserBucket]" = OrderedDict()
+        self._acks: Set[asyncio.Task] = set()  # answers for dropped taps, still in flight
+
+        self.passed = 0
+        self.dropped: Dict[str, int] = {DROP_RATE: 0, DROP_DUPLICATE: 0}
+        self.evicted = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "passed": self.passed,
+            "dropped": dict(self.dropped),
+            "users_tracked": len(self._buckets),
+            "evicted": self.evicted,
+        }
+
+    def check(self, update: Update, now: Optional[float] = None) -> Optional[str]:
+        """None if the update may proceed, else the drop reason."""
+        if update.message is None and update.callback_query is None:
+            return None  # membership changes etc.: rare, and not user-driven
+        user = update.effective_user
+        if user is None or user.id in self.exempt:
+            return None
+
+        now = time.monotonic() if now is None else now
+        b = self._buckets.get(user.id)
+        if b is None:
+            b = self._buckets[user.id] = _UserBucket(self.rate, self.burst, now)
+            if len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+                self.evicted += 1
+        else:
+            self._buckets.move_to_end(user.id)
+
+        sig = _signature(update)
+        if sig == b.sig and now - b.sig_at < self.coalesce_window:
+            self.dropped[DROP_DUPLICATE] += 1
+            return DROP_DUPLICATE
+        if b.wait_time(now) > 0:
+            self.dropped[DROP_RATE] += 1
+            return DROP_RATE
+
+        b.consume()
+        b.sig = sig
+        b.sig_at = now
+        self.passed += 1
+        return None
+
+    async def __call__(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        reason = self.check(update)
+        if reason is not None:
+            log.debug("Dropped update %s from user_id=%s: %s", update.update_id, update.effective_user.id, reason)
+            if update.callback_query is not None:
+                t = asyncio.create_task(self._answer(update))
+                self._acks.add(t)
+                t.add_done_callback(self._acks.discard)
+            raise ApplicationHandlerStop
+
+    @staticmethod
+    async def _answer(update: Update) -> None:
+        """Stop the dropped tap's spinner; best effort, the user is already being throttled."""
+        try:
+            await update.callback_query.answer()
+        except Exception as e:
+            log.debug("Answer for dropped update %s failed: %s", update.update_id, e)
@@ -0,0 +1,60 @@
+"""
+Concurrent update processing with per-chat order.
+
+PTB's default handles one update at a time, so a handler that awaits a rate-limited send (the
+per-chat bucket in OutboundDispatcher) holds up every other user. ChatOrderedUpdateProcessor
+lets up to `max_concurrent_updates` updates run at once, but never two for the same chat: an
+update waits for the previous one of its chat to finish, in arrival order. Conversation state,
+drafts and the throttle stay per-chat sequential, as they were.
+"""
+import asyncio
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+def _chat_key(update: object) -> Optional[int]:
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return update.effective_user.id  # inline queries, callbacks on inline messages, ...
+    return None
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    __slots__ = ("_tails",)
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._tails: Dict[int, asyncio.Future] = {}  # chat -> done-future of its latest update
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = _chat_key(update)
+        if key is None:
+            await coroutine
+            return
+        # Chain synchronously (no await before this point), so arrival order is kept
+        previous = self._tails.get(key)
+        done = asyncio.get_running_loop().create_future()
+        self._tails[key] = done
+        try:
+            if previous is not None:
+                try:
+                    await previous
+                except BaseException:
+                    coroutine.close()  # cancelled while queued behind its chat: never started
+                    raise
+            await coroutine
+        finally:
+            done.set_result(None)
+            if self._tails.get(key) is done:
+                del self._tails[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,208 @@
+import asyncio
+import hmac
+import logging
+import signal
+from typing import Dict, Iterable, List, Optional
+
+from telegram import Update
+from telegram.ext import (
+    Application,
+    BaseHandler,
+    CallbackQueryHandler,
+    ChatMemberHandler,
+    CommandHandler,
+    ConversationHandler,
+    InlineQueryHandler,
+    MessageHandler,
+    PollAnswerHandler,
+    PreCheckoutQueryHandler,
+    TypeHandler,
+)
+
+from app.httpd import Request, Response, serve
+
+log = logging.getLogger("e2t_onboarding_bot.webhook")
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+
+
+# ============================================================
+# allowed_updates
+# ============================================================
+
+def _update_types_for(handler: BaseHandler) -> Optional[set]:
+    """Update types a handler can match, or None if it could match anything."""
+    if isinstance(handler, ConversationHandler):
+        out: set = set()
+        children = list(handler.entry_points) + list(handler.fallbacks)
+        for hs in handler.states.values():
+            children.extend(hs)
+        for h in children:
+            t = _update_types_for(h)
+            if t is None:
+                return None
+            out |= t
+        return out
+    if isinstance(handler, CallbackQueryHandler):
+        return {Update.CALLBACK_QUERY}
+    if isinstance(handler, (CommandHandler, MessageHandler)):
+        # MessageHandler's default filters also accept edited messages/channel posts,
+        # but this bot only reacts to plain private messages.
+        return {Update.MESSAGE}
+    if isinstance(handler, InlineQueryHandler):
+        return {Update.INLINE_QUERY}
+    if isinstance(handler, ChatMemberHandler):
+        return {Update.MY_CHAT_MEMBER, Update.CHAT_MEMBER}
+    if isinstance(handler, PollAnswerHandler):
+        return {Update.POLL_ANSWER}
+    if isinstance(handler, PreCheckoutQueryHandler):
+        return {Update.PRE_CHECKOUT_QUERY}
+    if isinstance(handler, TypeHandler):
+        return set()  # pre-filters see whatever the other handlers let through
+    return None
+
+
+def allowed_updates_for(application: Application) -> List[str]:
+    """The update types the registered handlers actually consume, for getUpdates/setWebhook."""
+    out: set = set()
+    for handlers in application.handlers.values():
+        for h in handlers:
+            t = _update_types_for(h)
+            if t is None:
+                return Update.ALL_TYPES
+            out |= t
+    return sorted(out)
+
+
+# ============================================================
+# Ingest
+# ============================================================
+
+class WebhookIngest:
+    """
+    HTTP handler that validates Telegram's secret header and feeds updates into the
+    application's (bounded) update_queue. When the queue is full it answers 503 so
+    Telegram keeps the update and retries later, instead of us buffering without limit.
+    A GET on the path (same secret) returns the update types the handlers consume: that is
+    how the sharded front, which has no handlers of its own, knows what to register.
+    """
+
+    def __init__(self, application: Application, *, path: str, secret_token: str,
+                 allowed_updates: Iterable[str] = ()):
+        self.application = application
+        self.path = path
+        self.allowed_updates = list(allowed_updates)
+        self._secret = secret_token.encode("utf-8")
+        self.accepted = 0
+        self.rejected: Dict[str, int] = {"secret": 0, "queue_full": 0, "bad_request": 0, "not_found": 0}
+
+    def stats(self) -> Dict[str, int]:
+        q = self.application.update_queue
+        return {
+            "accepted": self.accepted,
+            "queue_depth": q.qsize(),
+            "queue_max": q.maxsize,
+            **{f"rejected_{k}": v for k, v in self.rejected.items()},
+        }
+
+    async def __call__(self, req: Request) -> Response:
+        if req.path != self.path:
+            self.rejected["not_found"] += 1
+            return Response(404)
+        if req.method not in ("POST", "GET"):
+            return Response(405)
+
+        got = req.headers.get(SECRET_HEADER, "").encode("utf-8")
+        if not hmac.compare_digest(got, self._secret):
+            self.rejected["secret"] += 1
+            return Response(403)
+        if req.method == "GET":
+            return Response.json({"allowed_updates": self.allowed_updates})
+
+        try:
+            update = Update.de_json(req.json(), self.application.bot)
+        except Exception:
+            self.rejected["bad_request"] += 1
+            return Response(400)
+
+        try:
+            self.application.update_queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.rejected["queue_full"] += 1
+            return Response(503, headers={"Retry-After": "1"})
+
+        self.accepted += 1
+        return Response(200)
+
+
+# ============================================================
+# Runner
+# ============================================================
+
+async def _wait_for_stop_signal() -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: fall back to KeyboardInterrupt
+    await stop.wait()
+
+
+async def serve_webhook(
+    application: Application,
+    *,
+    listen: str,
+    port: int,
+    path: str,
+    secret_token: str,
+    webhook_url: Optional[str],
+    allowed_updates: Iterable[str],
+    max_connections: int = 40,
+    stop_event: Optional[asyncio.Event] = None,
+) -> None:
+    """
+    Run the application behind the embedded HTTP server until SIGINT/SIGTERM
+    (or until stop_event is set, when given).
+    If webhook_url is set it is registered with Telegram (pending updates are kept).
+    """
+    allowed_updates = list(allowed_updates)
+    ingest = WebhookIngest(application, path=path, secret_token=secret_token, allowed_updates=allowed_updates)
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+
+    server = None
+    try:
+        await application.start()
+        server = await serve(ingest, listen, port)
+
+        if webhook_url:
+            await application.bot.set_webhook(
+                url=webhook_url,
+                secret_token=secret_token,
+                allowed_updates=allowed_updates,
+                max_connections=max_connections,
+                drop_pending_updates=False,
+            )
+        log.info("Webhook server listening on %s:%s%s", listen, port, path)
+
+        if stop_event is not None:
+            await stop_event.wait()
+        else:
+            await _wait_for_stop_signal()
+    finally:
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+        log.info("Webhook stats: %s", ingest.stats())
+
+        if application.running:
+            await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
@@ -1,4 +1,130 @@
 # daily_playbook/src/playbook/providers/markets_prices.py
 from __future__ import annotations
 
-# placeholder for later expansion
+import asyncio
+import os
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Read side of the OANDA candle history the morning missive keeps current
+# (missive.providers.candle_store): one WITHOUT ROWID table keyed by (instrument, granularity, t),
+# so every query below is one primary-key seek plus the rows it returns. The reads are blocking
+# sqlite3 calls: from async code (the playbook bot) use the *_async variants, which run them in a
+# worker thread. src/playbook/providers/markets_prices.py loads this file rather than copying it.
+# daily_playbook/src/playbook/providers/markets_prices.py -> parents[4] = repo root
+DEFAULT_DB = Path(__file__).resolve().parents[4] / "data" / "candles.sqlite3"
+
+
+@dataclass(frozen=True)
+class Candle:
+    t: int  # candle open, unix seconds UTC
+    o: float
+    h: float
+    l: float  # noqa: E741
+    c: float
+    volume: int
+
+    @property
+    def time(self) -> datetime:
+        return datetime.fromtimestamp(self.t, tz=timezone.utc)
+
+
+def store_path() -> str:
+    return (os.getenv("CANDLE_STORE_PATH") or "").strip() or str(DEFAULT_DB)
+
+
+def _connect(path: Optional[str]) -> Optional[sqlite3.Connection]:
+    p = path or store_path()
+    if not os.path.exists(p):
+        return None
+    # Read-only: the missive process is the only writer
+    db = sqlite3.connect(f"{Path(p).resolve().as_uri()}?mode=ro", uri=True)
+    db.execute("PRAGMA busy_timeout=5000")
+    return db
+
+
+def candles(
+    instrument: str,
+    granularity: str = "D",
+    *,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: Optional[int] = None,
+    path: Optional[str] = None,
+) -> List[Candle]:
+    """Stored candles with start <= time < end, oldest first. [] if there is no store (yet)."""
+    db = _connect(path)
+    if db is None:
+        return []
+    sql = "SELECT t, o, h, l, c, volume FROM candles WHERE instrument = ? AND granularity = ? AND t >= ? AND t < ?"
+    sql += " ORDER BY t" + (" LIMIT ?" if limit else "")
+    args: list = [
+        instrument,
+        granularity,
+        int(start.timestamp()) if start else -2 ** 62,
+        int(end.timestamp()) if end else 2 ** 62,
+    ] + ([limit] if limit else [])
+    try:
+        return [Candle(*r) for r in db.execute(sql, args)]
+    except sqlite3.Error:
+        return []
+    finally:
+        db.close()
+
+
+def _last(db: sqlite3.Connection, instrument: str, granularity: str, n: int) -> List[Candle]:
+    rows = db.execute(
+        "SELECT t, o, h, l, c, volume FROM candles WHERE instrument = ? AND granularity = ? ORDER BY t DESC LIMIT ?",
+        (instrument, granularity, n),
+    ).fetchall()
+    return [Candle(*r) for r in reversed(rows)]
+
+
+def last_candles(instrument: str, granularity: str = "D", n: int = 1, *, path: Optional[str] = None) -> List[Candle]:
+    """The last n stored candles, oldest first."""
+    db = _connect(path)
+    if db is None:
+        return []
+    try:
+        return _last(db, instrument, granularity, n)
+    except sqlite3.Error:
+        return []
+    finally:
+        db.close()
+
+
+def latest_closes(
+    instruments: List[str], granularity: str = "D", *, path: Optional[str] = None
+) -> Dict[str, Optional[float]]:
+    """Last stored close per instrument (None if the store has no candles for it), on one connection."""
+    out: Dict[str, Optional[float]] = {inst: None for inst in instruments}
+    db = _connect(path)
+    if db is None:
+        return out
+    try:
+        for inst in instruments:
+            last = _last(db, inst, granularity, 1)
+            out[inst] = last[-1].c if last else None
+    except sqlite3.Error:
+        pass
+    finally:
+        db.close()
+    return out
+
+
+async def candles_async(instrument: str, granularity: str = "D", **kw) -> List[Candle]:
+    return await asyncio.to_thread(candles, instrument, granularity, **kw)
+
+
+async def last_candles_async(instrument: str, granularity: str = "D", n: int = 1, *,
+                             path: Optional[str] = None) -> List[Candle]:
+    return await asyncio.to_thread(last_candles, instrument, granularity, n, path=path)
+
+
+async def latest_closes_async(
+    instruments: List[str], granularity: str = "D", *, path: Optional[str] = None
+) -> Dict[str, Optional[float]]:
+    return await asyncio.to_thread(latest_closes, instruments, granularity, path=path)
@@ -0,0 +1,106 @@
+# morning_missive/src/missive/analytics.py
+
+"""
+Per-instrument market analytics for the KEY OVERNIGHT RATES table, computed for all
+instruments at once in NumPy:
+
+    overnight   live mid vs. last daily close, %
+    chg_1d      last close vs. the one before, %
+    chg_5d      last close vs. five closes back, %
+    atr         average true range over `atr_n` days (simple mean), price units
+    rv          realised volatility: stdev of daily log returns over `vol_n` days, annualised (x sqrt 252), %
+    pivot/r1/s1 classic floor pivots for today from the last complete daily candle
+
+History is a (instruments x days) window, newest day last, with NaN where an instrument has
+fewer days stored. A value whose inputs are not all there comes out as NaN, which the table
+shows as N/A, so a short history never produces a misleading number.
+"""
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from missive.providers.candle_store import CandleStore
+
+COLUMNS = ("overnight", "chg_1d", "chg_5d", "atr", "rv", "pivot", "r1", "s1")
+
+ATR_DAYS = 14
+VOL_DAYS = 20
+
+
+@dataclass
+class Window:
+    instruments: List[str]
+    high: np.ndarray   # (N, W), newest last, NaN-padded on the left
+    low: np.ndarray
+    close: np.ndarray
+    live: np.ndarray   # (N,), NaN where there is no live mid
+
+
+@dataclass
+class Analytics:
+    instruments: List[str]
+    values: Dict[str, np.ndarray]  # column -> (N,)
+    _row: Dict[str, int] = field(init=False, repr=False)  # instrument -> row, built once
+
+    def __post_init__(self) -> None:
+        self._row = {inst: i for i, inst in enumerate(self.instruments)}
+
+    def get(self, instrument: str, column: str) -> Optional[float]:
+        try:
+            v = float(self.values[column][self._row[instrument]])
+        except KeyError:
+            return None
+        return None if math.isnan(v) else v
+
+
+def window_days(atr_n: int = ATR_DAYS, vol_n: int = VOL_DAYS) -> int:
+    # ATR and vol need one close before their first day; 5D change needs six closes
+    return max(atr_n + 1, vol_n + 1, 6)
+
+
+def pack(instruments: List[str], history: Dict[str, List], live: Dict[str, Optional[float]],
+         days: int) -> Window:
+    """History (objects with .h/.l/.c, oldest first) -> a right-aligned NaN-padded window."""
+    pad = (math.nan, math.nan, math.nan)
+    flat: List[tuple] = []
+    for inst in instruments:
+        rows = (history.get(inst) or [])[-days:]
+        flat.extend([pad] * (days - len(rows)))
+        flat.extend([(c.h, c.l, c.c) for c in rows])
+    # One allocation for the whole window; (N*W, 3) -> three (N, W) views
+    hlc = np.array(flat, dtype=float).reshape(len(instruments), days, 3) if flat else np.empty((0, days, 3))
+    lv = np.array([np.nan if live.get(i) is None else live[i] for i in instruments], dtype=float)
+    return Window(list(instruments), hlc[..., 0], hlc[..., 1], hlc[..., 2], lv)
+
+
+def load(store: CandleStore, instruments: List[str], live: Dict[str, Optional[float]],
+         days: Optional[int] = None) -> Window:
+    """The window from the candle store: one primary-key seek per instrument."""
+    days = days or window_days()
+    return pack(instruments, {i: store.tail(i, "D", days) for i in instruments}, live, days)
+
+
+def compute(w: Window, *, atr_n: int = ATR_DAYS, vol_n: int = VOL_DAYS) -> Analytics:
+    """Every column for every instrument, as whole-array operations (no per-instrument Python)."""
+    h, lo, c = w.high, w.low, w.close
+    last, prev = c[:, -1], c[:, :-1]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        tr = np.maximum(h[:, 1:], prev) - np.minimum(lo[:, 1:], prev)
+        rets = np.log(c[:, 1:] / prev)[:, -vol_n:]
+        pivot = (h[:, -1] + lo[:, -1] + last) / 3
+        values = {
+            "overnight": (w.live / last - 1) * 100,
+            "chg_1d": (last / c[:, -2] - 1) * 100,
+            "chg_5d": (last / c[:, -6] - 1) * 100,
+            "atr": tr[:, -atr_n:].mean(axis=1),
+            "rv": rets.std(axis=1, ddof=1) * math.sqrt(252) * 100,
+            "pivot": pivot,
+            "r1": 2 * pivot - lo[:, -1],
+            "s1": 2 * pivot - h[:, -1],
+        }
+    return Analytics(w.instruments, values)
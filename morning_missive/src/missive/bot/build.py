@@ -66,6 +66,7 @@ def build_missive_text() -> str:
         api_key=s.OANDA_API_KEY,
         account_id=s.OANDA_ACCOUNT_ID,
         instruments=s.instruments_list,
+        max_concurrency=s.OANDA_MAX_CONCURRENCY,
     )
 
     headlines = fetch_headlines(
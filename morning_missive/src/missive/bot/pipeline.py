@@ -0,0 +1,178 @@
+# morning_missive/src/missive/bot/pipeline.py
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import sqlite3
+import ssl
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from missive.analytics import compute, load
+from missive.config import Settings
+from missive.providers.calendar_tradingview import fetch_calendar_today_high_impact_async
+from missive.providers.candle_store import CandleStore
+from missive.providers.headlines_perplexity import (
+    PXPapers,
+    PXPulse,
+    fetch_market_pulse_and_headlines_async,
+    fetch_todays_papers_async,
+)
+from missive.providers.price_stream import PriceBook
+from missive.providers.prices_oanda import book_prices, fetch_prices_async, stored_prices
+from missive.render.template import build_message
+from missive.utils.log import get_logger
+
+log = get_logger("missive_pipeline")
+
+_NO_PAPERS = ["NO PAPER HEADLINES RETURNED — CHECK PERPLEXITY. [RTRS]"] * 4
+
+
+@dataclass
+class BuildReport:
+    """What each provider did in one build: seconds taken, and "ok" / "timeout" / "error: ..."."""
+    seconds: Dict[str, float] = field(default_factory=dict)
+    status: Dict[str, str] = field(default_factory=dict)
+    total: float = 0.0
+
+    @property
+    def fell_back(self) -> List[str]:
+        """Providers whose section is a fallback in this build."""
+        return [name for name, st in self.status.items() if st != "ok"]
+
+    def summary(self) -> str:
+        return ", ".join(f"{k} {v:.2f}s ({self.status[k]})" for k, v in self.seconds.items())
+
+
+class BuildFailed(RuntimeError):
+    """Every provider fell back: the missive would be nothing but placeholders, so it is not built."""
+
+    def __init__(self, report: BuildReport):
+        super().__init__(f"every provider failed: {report.summary()}")
+        self.report = report
+
+
+@functools.lru_cache(maxsize=1)
+def _ssl_context() -> ssl.SSLContext:
+    # Loading the CA bundle takes ~0.1s; do it once, not per client and per build
+    return httpx.create_ssl_context()
+
+
+def _client(**kw: Any) -> httpx.AsyncClient:
+    # One pooled keep-alive client per upstream; every request on it carries its own timeout
+    return httpx.AsyncClient(verify=_ssl_context(),
+                             limits=httpx.Limits(max_connections=20, max_keepalive_connections=20), **kw)
+
+
+def _open_store(path: str) -> Optional[CandleStore]:
+    if not path:
+        return None
+    try:
+        return CandleStore(path)
+    except (OSError, sqlite3.Error) as e:
+        log.warning("Candle store {} unavailable ({}), fetching closes directly", path, e)
+        return None
+
+
+async def _run(name: str, fn: Callable[[], Awaitable[Any]], timeout: float, fallback: Any,
+               report: BuildReport) -> Any:
+    t0 = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(fn(), timeout)
+        report.status[name] = "ok"
+        return result
+    except asyncio.TimeoutError:
+        report.status[name] = "timeout"
+        log.warning("{}: no answer within {}s, using fallback", name, timeout)
+    except Exception as e:
+        report.status[name] = f"error: {e}"
+        log.warning("{}: failed ({}), using fallback", name, e)
+    finally:
+        report.seconds[name] = time.perf_counter() - t0
+    return fallback
+
+
+async def build_once_async(s: Optional[Settings] = None, report: Optional[BuildReport] = None,
+                           book: Optional[PriceBook] = None) -> str:
+    """
+    Fetch every section at the same time and render the missive. The build takes about as long
+    as the slowest provider (capped by its MISSIVE_TIMEOUT_*), not the sum of all of them.
+    A provider that fails or times out leaves its section empty ("N/A", "AWAITING MACRO
+    SIGNALS.", ...) instead of failing the post, and the build is logged as degraded. If every
+    provider fails, BuildFailed is raised rather than posting a missive of placeholders. With a
+    `book` from a running price stream, live mids are read from memory instead of fetched.
+    """
+    s = s or Settings()
+    report = report if report is not None else BuildReport()
+    t0 = time.perf_counter()
+
+    store = _open_store(s.CANDLE_STORE_PATH)
+    # If OANDA does not answer in time, the stored closes (and streamed mids) still fill the table
+    if book is not None:
+        prices_fallback = await asyncio.to_thread(book_prices, book, s.instruments_list, store)
+    else:
+        prices_fallback = await asyncio.to_thread(stored_prices, store, s.instruments_list) if store is not None else {}
+    async with _client() as oanda, _client() as tradingview, _client() as perplexity:
+        prices, cal_events, (pulse, px_headlines), papers = await asyncio.gather(
+            _run("prices", lambda: fetch_prices_async(
+                oanda,
+                base_url=s.oanda_base_url,
+                api_key=s.OANDA_API_KEY,
+                account_id=s.OANDA_ACCOUNT_ID,
+                instruments=s.instruments_list,
+                max_concurrency=s.OANDA_MAX_CONCURRENCY,
+                store=store,
+                history=s.CANDLE_HISTORY,
+                book=book,
+            ), s.TIMEOUT_PRICES, prices_fallback, report),
+            _run("calendar", lambda: fetch_calendar_today_high_impact_async(tradingview),
+                 s.TIMEOUT_CALENDAR, [], report),
+            _run("pulse", lambda: fetch_market_pulse_and_headlines_async(perplexity),
+                 s.TIMEOUT_PULSE, (PXPulse(""), []), report),
+            _run("papers", lambda: fetch_todays_papers_async(perplexity),
+                 s.TIMEOUT_PAPERS, PXPapers(list(_NO_PAPERS)), report),
+        )
+    # fetch_prices degrades per instrument, so an OANDA outage comes back "ok" with every cell N/A
+    if report.status.get("prices") == "ok" and not any(
+            p.daily_close is not None or p.live_mid is not None for p in prices.values()):
+        report.status["prices"] = "empty"
+        log.warning("prices: no close or mid for any instrument")
+    if len(report.fell_back) == len(report.status):
+        if store is not None:
+            store.close()
+        report.total = time.perf_counter() - t0
+        log.error("Missive not built, every provider failed: {}", report.summary())
+        raise BuildFailed(report)
+
+    analytics = None
+    if store is not None:
+        if s.price_columns_list:
+            try:
+                live = {inst: p.live_mid for inst, p in prices.items()}
+                analytics = compute(await asyncio.to_thread(load, store, s.instruments_list, live))
+            except sqlite3.Error as e:
+                log.warning("Price analytics skipped: {}", e)
+        store.close()
+
+    pulse_text = pulse.text.strip() if pulse.text else "AWAITING MACRO SIGNALS."
+    msg = build_message(
+        tz=s.TZ,
+        prices=prices,
+        pulse_text=pulse_text,
+        headline_lines=[h.text for h in px_headlines],
+        papers_lines=papers.lines,
+        cal_events=cal_events,
+        analytics=analytics,
+        price_columns=s.price_columns_list,
+    )
+    report.total = time.perf_counter() - t0
+    if report.fell_back:
+        log.error("Missive built DEGRADED in {:.2f}s, fallback for {}: {}", report.total,
+                  ", ".join(report.fell_back), report.summary())
+    else:
+        log.info("Missive built in {:.2f}s: {}", report.total, report.summary())
+    return msg
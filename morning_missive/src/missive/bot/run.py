@@ -2,44 +2,49 @@
 
 from __future__ import annotations
 
+import asyncio
 import sys
+import time
+from typing import Optional
 from missive.config import Settings
-from missive.providers.prices_oanda import fetch_prices
-from missive.render.template import build_message
+from missive.bot.pipeline import build_once_async
 from missive.bot.scheduler import start_daily
 from missive.bot.telegram_client import send_message
+from missive.providers.price_stream import PriceBook, PriceStream
+from missive.providers.prices_oanda import book_prices
 
-from missive.providers.calendar_tradingview import fetch_calendar_today_high_impact
-from missive.providers.headlines_perplexity import fetch_market_pulse_and_headlines, fetch_todays_papers
+# Set by `serve` when MISSIVE_PRICE_STREAM is on; the daily job reads live mids from it
+_BOOK: Optional[PriceBook] = None
 
 
 def build_once() -> str:
-    s = Settings()
-
-    prices = fetch_prices(
-        base_url=s.oanda_base_url,
-        api_key=s.OANDA_API_KEY,
-        account_id=s.OANDA_ACCOUNT_ID,
-        instruments=s.instruments_list,
-    )
+    # All providers are fetched concurrently (see missive.bot.pipeline)
+    return asyncio.run(build_once_async(Settings(), book=_BOOK))
 
-    cal_events = fetch_calendar_today_high_impact()
 
-    pulse, px_headlines = fetch_market_pulse_and_headlines()
-    pulse_text = pulse.text.strip() if pulse.text else "AWAITING MACRO SIGNALS."
-    headline_lines = [h.text for h in px_headlines]
+def _start_stream(s: Settings) -> PriceStream:
+    book = PriceBook(heartbeat_timeout=s.PRICE_STREAM_TIMEOUT)
+    return PriceStream(s.oanda_stream_url, s.OANDA_API_KEY, s.OANDA_ACCOUNT_ID, s.instruments_list, book).start()
 
-    papers = fetch_todays_papers()
-    papers_lines = papers.lines
 
-    return build_message(
-        tz=s.TZ,
-        prices=prices,
-        pulse_text=pulse_text,
-        headline_lines=headline_lines,
-        papers_lines=papers_lines,
-        cal_events=cal_events,
-    )
+def show_prices(interval: float = 5.0) -> None:
+    """Live mids from the pricing stream, printed from memory every `interval` seconds until Ctrl+C."""
+    s = Settings()
+    stream = _start_stream(s)
+    try:
+        stream.wait_live(15)
+        while True:
+            t0 = time.perf_counter()
+            prices = book_prices(stream.book, s.instruments_list)
+            took_us = (time.perf_counter() - t0) * 1e6
+            print(f"--- {time.strftime('%H:%M:%S')}  {stream.book.stats()}  (read in {took_us:.0f} µs)")
+            for inst, p in prices.items():
+                print(f"{inst:<12} {'N/A' if p.live_mid is None else f'{p.live_mid:,.5f}':>16}")
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stream.stop()
 
 
 def post_once() -> None:
@@ -68,12 +73,20 @@ def main() -> None:
         post_once()
         return
 
+    if mode == "prices":
+        show_prices()
+        return
+
     if mode == "serve":
+        global _BOOK
         s = Settings()
+        if s.PRICE_STREAM and s.OANDA_ACCOUNT_ID:
+            _BOOK = _start_stream(s).book
+            print(f"[OK] Price stream started for {len(s.instruments_list)} instruments")
         start_daily(tz=s.TZ, hour=s.POST_HOUR, minute=s.POST_MINUTE, job_fn=post_once)
         return
 
-    raise SystemExit("Usage: python morning_missive/run_missive.py [once|serve]")
+    raise SystemExit("Usage: python morning_missive/run_missive.py [once|serve|prices]")
 
 if __name__ == "__main__":
     main()
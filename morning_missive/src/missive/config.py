@@ -47,7 +47,27 @@ class Settings:
     OANDA_ENV: str = _s("OANDA_ENV", "practice")  # practice/live
     OANDA_API_KEY: str = _s("OANDA_API_KEY")
     OANDA_ACCOUNT_ID: str = _s("OANDA_ACCOUNT_ID")
+    OANDA_BASE_URL: str = _s("OANDA_BASE_URL")  # override, e.g. a local stand-in; empty = from OANDA_ENV
     INSTRUMENTS: str = _s("MISSIVE_INSTRUMENTS", "SPX500_USD,NAS100_USD,XAU_USD,WTICO_USD,BTC_USD,ETH_USD")
+    OANDA_MAX_CONCURRENCY: int = _i("OANDA_MAX_CONCURRENCY", 8)  # per-instrument requests in flight at once
+
+    # Pricing stream: `serve` keeps live mids warm in memory, so the post does not wait on /pricing
+    PRICE_STREAM: bool = _b("MISSIVE_PRICE_STREAM", False)
+    OANDA_STREAM_URL: str = _s("OANDA_STREAM_URL")  # override; empty = from OANDA_ENV
+    PRICE_STREAM_TIMEOUT: int = _i("MISSIVE_PRICE_STREAM_TIMEOUT", 15)  # seconds without a heartbeat = reconnect
+
+    # Candle history (SQLite, shared with the daily playbook); empty path = no store, fetch closes directly
+    CANDLE_STORE_PATH: str = _s("CANDLE_STORE_PATH", str(_repo_root() / "data" / "candles.sqlite3"))
+    CANDLE_HISTORY: int = _i("MISSIVE_CANDLE_HISTORY", 250)  # daily candles fetched for a new instrument
+    # Extra KEY OVERNIGHT RATES columns, from the candle history (needs the store), e.g. "overnight,chg_1d,rv".
+    # Any of: overnight, chg_1d, chg_5d, atr, rv, pivot, r1, s1. Empty = close only.
+    PRICE_COLUMNS: str = _s("MISSIVE_PRICE_COLUMNS")
+
+    # Build: the providers run concurrently; each gets this long (seconds) before its section falls back
+    TIMEOUT_PRICES: int = _i("MISSIVE_TIMEOUT_PRICES", 25)
+    TIMEOUT_CALENDAR: int = _i("MISSIVE_TIMEOUT_CALENDAR", 25)
+    TIMEOUT_PULSE: int = _i("MISSIVE_TIMEOUT_PULSE", 65)  # LLM call, plus one retry on a disclaimer
+    TIMEOUT_PAPERS: int = _i("MISSIVE_TIMEOUT_PAPERS", 35)
 
     # Headlines (GDELT + whitelist)
     HEADLINES_LOOKBACK_HOURS: int = _i("MISSIVE_HEADLINES_LOOKBACK_HOURS", 18)
@@ -63,12 +83,24 @@ class Settings:
 
     @property
     def oanda_base_url(self) -> str:
+        if self.OANDA_BASE_URL:
+            return self.OANDA_BASE_URL.rstrip("/")
         return "https://api-fxtrade.oanda.com" if self.OANDA_ENV.lower() == "live" else "https://api-fxpractice.oanda.com"
 
+    @property
+    def oanda_stream_url(self) -> str:
+        if self.OANDA_STREAM_URL:
+            return self.OANDA_STREAM_URL.rstrip("/")
+        return "https://stream-fxtrade.oanda.com" if self.OANDA_ENV.lower() == "live" else "https://stream-fxpractice.oanda.com"
+
     @property
     def instruments_list(self) -> list[str]:
         return [x.strip() for x in self.INSTRUMENTS.split(",") if x.strip()]
 
+    @property
+    def price_columns_list(self) -> list[str]:
+        return [x.strip().lower() for x in self.PRICE_COLUMNS.split(",") if x.strip()]
+
     @property
     def headline_domains_list(self) -> list[str]:
         return [x.strip().lower() for x in self.HEADLINE_DOMAINS.split(",") if x.strip()]
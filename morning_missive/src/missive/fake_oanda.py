@@ -0,0 +1,280 @@
+# morning_missive/src/missive/fake_oanda.py
+
+"""
+Offline stand-in for the parts of the OANDA v20 REST API the missive uses:
+
+    GET /v3/instruments/{instrument}/candles         (count, or from/to/includeFirst; granularity)
+    GET /v3/accounts/{account}/candles/latest        (candleSpecifications=EUR_USD:D:M,...)
+    GET /v3/accounts/{account}/pricing               (instruments=...)
+    GET /v3/accounts/{account}/pricing/stream        (instruments=...; chunked JSON lines)
+
+Prices are a deterministic random walk per instrument, so every run (and every process) sees
+the same candles. Every request waits `latency` seconds first, and `rate_limit_every=N` answers
+every Nth request with 429 + Retry-After, to exercise backoff.
+
+The stream sends a PRICE line per instrument every `tick` seconds and a HEARTBEAT every
+`heartbeat` seconds. For reconnect tests, drop_streams() closes every open stream, and
+`stall = True` keeps them open but silent.
+
+    python -m missive.fake_oanda --port 8090 --latency 0.1
+    OANDA_BASE_URL=http://127.0.0.1:8090 python morning_missive/run_missive.py once
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+GRANULARITY_SECONDS = {"M1": 60, "M5": 300, "M15": 900, "H1": 3600, "H4": 14400, "D": 86400}
+_DAILY_ALIGN = 22 * 3600  # daily candles open at 22:00 UTC (17:00 New York)
+
+
+def rfc3339(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000000000Z")
+
+
+def parse_time(v: str) -> float:
+    """RFC3339 (any fraction digits) or unix seconds -> unix seconds."""
+    try:
+        return float(v)
+    except ValueError:
+        pass
+    head, _, frac = v.rstrip("Z").partition(".")
+    ts = datetime.strptime(head, "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+    return ts + (float("0." + frac) if frac else 0.0)
+
+
+class FakeOanda:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, *, latency: float = 0.0, rate_limit_every: int = 0,
+                 tick: float = 0.25, heartbeat: float = 5.0):
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.tick = tick
+        self.heartbeat = heartbeat
+        self.stall = False
+        self.streams = 0       # stream connections accepted so far
+        self._stream_gen = 0   # bumped by drop_streams(); a stream ends when it sees a new value
+        self.requests = 0
+        self.rate_limited = 0
+        self.paths: List[str] = []
+        self._count = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = self._make_server(host, port)
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------------- lifecycle ----------------
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOanda":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-oanda", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeOanda":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def drop_streams(self) -> None:
+        with self._lock:
+            self._stream_gen += 1
+
+    # ---------------- data ----------------
+
+    @staticmethod
+    def _bucket(ts: float, granularity: str) -> float:
+        step = GRANULARITY_SECONDS[granularity]
+        align = _DAILY_ALIGN if granularity == "D" else 0
+        return (ts - align) // step * step + align
+
+    @staticmethod
+    def _base(instrument: str) -> float:
+        return 1 + random.Random(instrument).random() * 999
+
+    def candle(self, instrument: str, granularity: str, start: float, now: float) -> Dict:
+        step = GRANULARITY_SECONDS[granularity]
+        rnd = random.Random(f"{instrument}:{granularity}:{int(start)}")
+        base = self._base(instrument) * (1 + 0.05 * random.Random(f"{instrument}:{int(start) // 86400}").uniform(-1, 1))
+        o = base * (1 + rnd.uniform(-0.002, 0.002))
+        c = base * (1 + rnd.uniform(-0.01, 0.01))
+        h = max(o, c) * (1 + rnd.uniform(0, 0.005))
+        low = min(o, c) * (1 - rnd.uniform(0, 0.005))
+        return {
+            "complete": start + step <= now,
+            "volume": rnd.randint(100, 10000),
+            "time": rfc3339(start),
+            "mid": {"o": f"{o:.5f}", "h": f"{h:.5f}", "l": f"{low:.5f}", "c": f"{c:.5f}"},
+        }
+
+    def candles(self, instrument: str, granularity: str, *, count: Optional[int] = None,
+                start: Optional[float] = None, end: Optional[float] = None, include_first: bool = True) -> List[Dict]:
+        now = time.time()
+        step = GRANULARITY_SECONDS[granularity]
+        last = self._bucket(now, granularity)
+        if start is not None:
+            first = self._bucket(start, granularity)
+            if first < start or (first == start and not include_first):
+                first += step
+            stop = min(last, self._bucket(end, granularity) if end is not None else last)
+            if count is not None:
+                stop = min(stop, first + (count - 1) * step)
+            n = int((stop - first) // step) + 1 if stop >= first else 0
+        else:
+            n = count or 500
+            first = last - (n - 1) * step
+        return [self.candle(instrument, granularity, first + i * step, now) for i in range(max(0, n))]
+
+    def price(self, instrument: str, drift: float = 0.0) -> Dict:
+        mid = self._base(instrument) * (1 + drift)
+        spread = mid * 0.0001
+        return {
+            "type": "PRICE",
+            "instrument": instrument,
+            "time": rfc3339(time.time()),
+            "tradeable": True,
+            "bids": [{"price": f"{mid - spread / 2:.5f}", "liquidity": 1000000}],
+            "asks": [{"price": f"{mid + spread / 2:.5f}", "liquidity": 1000000}],
+        }
+
+    # ---------------- http ----------------
+
+    def _route(self, path: str, q: Dict[str, List[str]]):
+        parts = path.strip("/").split("/")
+        arg = lambda k, d=None: (q.get(k) or [d])[0]  # noqa: E731
+        if len(parts) == 4 and parts[:2] == ["v3", "instruments"] and parts[3] == "candles":
+            gran = arg("granularity", "S5")
+            if gran not in GRANULARITY_SECONDS:
+                return 400, {"errorMessage": f"Invalid granularity {gran}"}
+            count = arg("count")
+            start, end = arg("from"), arg("to")
+            return 200, {"instrument": parts[2], "granularity": gran, "candles": self.candles(
+                parts[2], gran, count=int(count) if count else None,
+                start=parse_time(start) if start else None, end=parse_time(end) if end else None,
+                include_first=arg("includeFirst", "true") != "false",
+            )}
+        if len(parts) == 5 and parts[:2] == ["v3", "accounts"] and parts[3:] == ["candles", "latest"]:
+            out = []
+            for spec in (arg("candleSpecifications", "") or "").split(","):
+                inst, gran, _ = (spec.split(":") + ["", "", ""])[:3]
+                if gran not in GRANULARITY_SECONDS:
+                    return 400, {"errorMessage": f"Invalid candle specification {spec}"}
+                out.append({"instrument": inst, "granularity": gran, "candles": self.candles(inst, gran, count=2)})
+            return 200, {"latestCandles": out}
+        if len(parts) == 4 and parts[:2] == ["v3", "accounts"] and parts[3] == "pricing":
+            insts = [i for i in (arg("instruments", "") or "").split(",") if i]
+            return 200, {"time": rfc3339(time.time()), "prices": [self.price(i) for i in insts]}
+        return 404, {"errorMessage": "Not found"}
+
+    def _make_server(self, host: str, port: int) -> ThreadingHTTPServer:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, payload: Dict, headers: Optional[Dict[str, str]] = None) -> None:
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _chunk(self, obj: Dict) -> None:
+                data = (json.dumps(obj) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def _stream(self, instruments: List[str]) -> None:
+                with fake._lock:
+                    fake.streams += 1
+                    gen = fake._stream_gen
+                self.close_connection = True
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                rnd = random.Random()
+                drift = {i: 0.0 for i in instruments}
+                last_beat = time.monotonic()
+                try:
+                    while fake._stream_gen == gen:
+                        if not fake.stall:
+                            for inst in instruments:
+                                drift[inst] += rnd.gauss(0, 0.0002)
+                                self._chunk(fake.price(inst, drift[inst]))
+                            if time.monotonic() - last_beat >= fake.heartbeat:
+                                self._chunk({"type": "HEARTBEAT", "time": rfc3339(time.time())})
+                                last_beat = time.monotonic()
+                        time.sleep(fake.tick)
+                except OSError:
+                    return  # client went away
+                self.wfile.write(b"0\r\n\r\n")
+
+            def do_GET(self):
+                n = next(fake._count)
+                url = urlparse(self.path)
+                if url.path.endswith("/pricing/stream"):
+                    insts = (parse_qs(url.query).get("instruments") or [""])[0]
+                    self._stream([i for i in insts.split(",") if i])
+                    return
+                with fake._lock:
+                    fake.requests += 1
+                    fake.paths.append(url.path)
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if fake.rate_limit_every and n % fake.rate_limit_every == 0:
+                    with fake._lock:
+                        fake.rate_limited += 1
+                    self._send(429, {"errorMessage": "Rate limit exceeded"}, {"Retry-After": "0.05"})
+                    return
+                status, payload = fake._route(url.path, parse_qs(url.query))
+                self._send(status, payload)
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+            request_queue_size = 256
+
+        return Server((host, port), Handler)
+
+
+def _main() -> None:
+    ap = argparse.ArgumentParser(description="Offline OANDA v20 stand-in (candles, latest candles, pricing, pricing stream)")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8090)
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    ap.add_argument("--rate-limit-every", type=int, default=0, help="answer every Nth request with 429")
+    ap.add_argument("--tick", type=float, default=0.25, help="seconds between streamed prices")
+    args = ap.parse_args()
+    fake = FakeOanda(args.host, args.port, latency=args.latency, rate_limit_every=args.rate_limit_every,
+                     tick=args.tick)
+    print(f"Fake OANDA on {fake.base_url}")
+    try:
+        fake._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    _main()
@@ -5,6 +5,8 @@ from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import List
 from zoneinfo import ZoneInfo
+import os
+import httpx
 import requests
 
 
@@ -18,6 +20,14 @@ class TVEvent:
 _ALLOWED = {"EU", "GB", "US", "JP", "CN", "AU", "NZ"}
 _ALLOWED_IMP = {0, 1}   # 0=MEDIUM IMPACT, 1=HIGH IMPACT
 
+CALENDAR_URL = os.getenv("TRADINGVIEW_CALENDAR_URL", "https://economic-calendar.tradingview.com/events").strip()
+_HEADERS = {
+    "User-Agent": "Mozilla/5.0",
+    "Accept": "application/json, text/plain, */*",
+    "Origin": "https://www.tradingview.com",
+    "Referer": "https://www.tradingview.com/economic-calendar/",
+}
+
 
 def _parse_tv_date(ts) -> datetime | None:
     """
@@ -54,7 +64,7 @@ def _parse_tv_date(ts) -> datetime | None:
     return None
 
 
-def fetch_calendar_today_high_impact() -> List[TVEvent]:
+def _payload() -> dict:
 
     # today = datetime.now(ZoneInfo("UTC")).date()
     # start = f"{today.isoformat()}T00:00:00Z"
@@ -66,25 +76,24 @@ def fetch_calendar_today_high_impact() -> List[TVEvent]:
     end_dt = now + timedelta(hours=24)
     end = end_dt.strftime("%Y-%m-%dT%H:%M:%SZ")
 
-    payload = {
+    return {
         "range": {"from": start, "to": end},
     }
 
-    r = requests.post(
-        "https://economic-calendar.tradingview.com/events",
-        json=payload,
-        headers={
-            "User-Agent": "Mozilla/5.0",
-            "Accept": "application/json, text/plain, */*",
-            "Origin": "https://www.tradingview.com",
-            "Referer": "https://www.tradingview.com/economic-calendar/",
-        },
-        timeout=20,
-    )
 
+def fetch_calendar_today_high_impact() -> List[TVEvent]:
+    r = requests.post(CALENDAR_URL, json=_payload(), headers=_HEADERS, timeout=20)
     r.raise_for_status()
+    return _parse_events(r.json())
+
+
+async def fetch_calendar_today_high_impact_async(client: httpx.AsyncClient) -> List[TVEvent]:
+    r = await client.post(CALENDAR_URL, json=_payload(), headers=_HEADERS, timeout=20)
+    r.raise_for_status()
+    return _parse_events(r.json())
+
 
-    data = r.json()
+def _parse_events(data) -> List[TVEvent]:
     if isinstance(data, dict):
         js = data.get("events") or data.get("result") or []
 
@@ -0,0 +1,245 @@
+# morning_missive/src/missive/providers/candle_store.py
+
+"""
+Local OANDA candle history: one SQLite table keyed by (instrument, granularity, time), stored
+WITHOUT ROWID. The candles of one instrument and granularity sit together in time order
+inside the primary-key B-tree. So "the last n" and "from .. to" reads are a single O(log n)
+seek plus the rows returned.
+
+Only complete candles are stored. sync_candles() asks OANDA only for candles newer than the
+newest one already stored, so a daily run fetches one candle per instrument. If OANDA is
+down, the history is still there.
+
+The daily playbook reads the same file (playbook.providers.markets_prices); the schema below
+is shared with it.
+
+    python -m missive.providers.candle_store sync --granularity D EUR_USD XAU_USD
+    python -m missive.providers.candle_store show EUR_USD --since 2026-01-01 --limit 10
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+import httpx
+
+from missive.providers.oanda_client import OandaClient
+from missive.utils.log import get_logger
+
+log = get_logger("missive_candles")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS candles (
+    instrument  TEXT NOT NULL,
+    granularity TEXT NOT NULL,
+    t           INTEGER NOT NULL,     -- candle open, unix seconds UTC
+    o           REAL NOT NULL,
+    h           REAL NOT NULL,
+    l           REAL NOT NULL,
+    c           REAL NOT NULL,
+    volume      INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (instrument, granularity, t)
+) WITHOUT ROWID;
+"""
+
+# Page size for catching up; the API's maximum per request
+_MAX_COUNT = 5000
+
+
+@dataclass(frozen=True)
+class Candle:
+    t: int
+    o: float
+    h: float
+    l: float  # noqa: E741
+    c: float
+    volume: int
+
+    @property
+    def time(self) -> datetime:
+        return datetime.fromtimestamp(self.t, tz=timezone.utc)
+
+
+def parse_time(v: str) -> int:
+    """OANDA time (RFC3339 with up to nanoseconds, or unix seconds) -> unix seconds."""
+    try:
+        return int(float(v))
+    except ValueError:
+        pass
+    head = v.rstrip("Z").split(".", 1)[0]
+    return int(datetime.strptime(head, "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc).timestamp())
+
+
+def _rfc3339(t: int) -> str:
+    return datetime.fromtimestamp(t, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _row(instrument: str, granularity: str, c: dict) -> Optional[tuple]:
+    mid = c.get("mid") or {}
+    try:
+        return (instrument, granularity, parse_time(str(c["time"])),
+                float(mid["o"]), float(mid["h"]), float(mid["l"]), float(mid["c"]), int(c.get("volume") or 0))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class CandleStore:
+    """Thread-safe (one connection behind a lock); WAL, so other processes can read while it writes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    # ---------------- writes ----------------
+
+    def put(self, instrument: str, granularity: str, candles: Iterable[dict]) -> int:
+        """Store the complete candles of an OANDA candles list (mid prices). Returns how many were new."""
+        rows = [r for r in (_row(instrument, granularity, c) for c in candles if c.get("complete") is True) if r]
+        if not rows:
+            return 0
+        with self._lock, self._db:
+            before = self._db.total_changes
+            self._db.executemany("INSERT OR IGNORE INTO candles VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            return self._db.total_changes - before
+
+    # ---------------- reads ----------------
+
+    def last_time(self, instrument: str, granularity: str) -> Optional[int]:
+        with self._lock:
+            row = self._db.execute("SELECT MAX(t) FROM candles WHERE instrument = ? AND granularity = ?",
+                                   (instrument, granularity)).fetchone()
+        return row[0] if row else None
+
+    def range(self, instrument: str, granularity: str, start: Optional[int] = None, end: Optional[int] = None,
+              limit: Optional[int] = None) -> List[Candle]:
+        """Candles with start <= t < end, oldest first."""
+        sql = "SELECT t, o, h, l, c, volume FROM candles WHERE instrument = ? AND granularity = ? AND t >= ? AND t < ?"
+        sql += " ORDER BY t" + (" LIMIT ?" if limit else "")
+        args: list = [instrument, granularity, start if start is not None else -2 ** 62,
+                      end if end is not None else 2 ** 62] + ([limit] if limit else [])
+        with self._lock:
+            return [Candle(*r) for r in self._db.execute(sql, args)]
+
+    def tail(self, instrument: str, granularity: str, n: int) -> List[Candle]:
+        """The last n candles, oldest first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT t, o, h, l, c, volume FROM candles WHERE instrument = ? AND granularity = ?"
+                " ORDER BY t DESC LIMIT ?", (instrument, granularity, n)).fetchall()
+        return [Candle(*r) for r in reversed(rows)]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._db.execute("SELECT COUNT(*), COUNT(DISTINCT instrument || ':' || granularity) FROM candles"
+                                    ).fetchone()
+        return {"candles": rows[0], "series": rows[1]}
+
+
+# ---------------- sync ----------------
+
+async def _catch_up(store: CandleStore, oanda: OandaClient, instrument: str, granularity: str, history: int) -> int:
+    # Store reads and writes go to a worker thread: the other series' fetches keep running meanwhile
+    last = await asyncio.to_thread(store.last_time, instrument, granularity)
+    if last is None:
+        # First sync for this series: the last `history` candles
+        candles = await oanda.candles(instrument, granularity=granularity, count=str(history), price="M")
+        return await asyncio.to_thread(store.put, instrument, granularity, candles)
+    added = 0
+    while True:
+        candles = await oanda.candles(instrument, granularity=granularity, price="M", count=str(_MAX_COUNT),
+                                      includeFirst="false", **{"from": _rfc3339(last)})
+        added += await asyncio.to_thread(store.put, instrument, granularity, candles)
+        complete = [c for c in candles if c.get("complete") is True]
+        if len(candles) < _MAX_COUNT or not complete:
+            return added
+        last = parse_time(str(complete[-1]["time"]))
+
+
+async def sync_candles(store: CandleStore, oanda: OandaClient, instruments: List[str], granularity: str = "D", *,
+                       account_id: str = "", history: int = 250) -> Dict[str, int]:
+    """
+    Bring each series up to date; returns candles added per instrument. With an account, one
+    latest-candles call first finds the series that are already current (their last completed
+    candle is stored) and only the rest are caught up, concurrently under the client's
+    semaphore. A series that fails to sync keeps what it has.
+    """
+    todo = list(instruments)
+    if account_id:
+        latest = await oanda.latest_candles(account_id, instruments, granularity=granularity, price="M")
+        stored = await asyncio.to_thread(lambda: {i: store.last_time(i, granularity) for i in latest})
+        current = set()
+        for inst, candles in latest.items():
+            done = [parse_time(str(c["time"])) for c in candles if c.get("complete") is True and c.get("time")]
+            last = stored[inst]
+            if done and last is not None and max(done) <= last:
+                current.add(inst)
+        todo = [i for i in instruments if i not in current]
+
+    async def one(inst: str) -> int:
+        try:
+            return await _catch_up(store, oanda, inst, granularity, history)
+        except (httpx.HTTPError, ValueError) as e:
+            log.warning("Candle sync for {} {} failed, keeping stored history: {}", inst, granularity, e)
+            return 0
+
+    added = dict(zip(todo, await asyncio.gather(*(one(i) for i in todo))))
+    log.info("Candle store {}: {} of {} series fetched, {} new candles", granularity, len(todo), len(instruments),
+             sum(added.values()))
+    return {i: added.get(i, 0) for i in instruments}
+
+
+def _main() -> None:
+    from missive.config import Settings
+
+    s = Settings()
+    ap = argparse.ArgumentParser(description="Local OANDA candle history")
+    ap.add_argument("--db", default=s.CANDLE_STORE_PATH)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p_sync = sub.add_parser("sync", help="fetch candles newer than the stored ones")
+    p_sync.add_argument("instruments", nargs="*", help="default: MISSIVE_INSTRUMENTS")
+    p_sync.add_argument("--granularity", default="D")
+    p_sync.add_argument("--history", type=int, default=s.CANDLE_HISTORY, help="candles to fetch for a new series")
+    p_show = sub.add_parser("show", help="print stored candles")
+    p_show.add_argument("instrument")
+    p_show.add_argument("--granularity", default="D")
+    p_show.add_argument("--since", help="YYYY-MM-DD")
+    p_show.add_argument("--until", help="YYYY-MM-DD (exclusive)")
+    p_show.add_argument("--limit", type=int)
+    args = ap.parse_args()
+
+    store = CandleStore(args.db)
+    if args.cmd == "sync":
+        async def run() -> Dict[str, int]:
+            async with OandaClient(s.oanda_base_url, s.OANDA_API_KEY, max_concurrency=s.OANDA_MAX_CONCURRENCY) as oanda:
+                return await sync_candles(store, oanda, args.instruments or s.instruments_list, args.granularity,
+                                          account_id=s.OANDA_ACCOUNT_ID, history=args.history)
+        for inst, n in asyncio.run(run()).items():
+            print(f"{inst}: +{n}")
+    else:
+        day = lambda v: parse_time(f"{v}T00:00:00Z") if v else None  # noqa: E731
+        for c in store.range(args.instrument, args.granularity, day(args.since), day(args.until), args.limit):
+            print(f"{c.time:%Y-%m-%d %H:%M}  o {c.o:<12g} h {c.h:<12g} l {c.l:<12g} c {c.c:<12g} v {c.volume}")
+    print(store.stats())
+    store.close()
+
+
+if __name__ == "__main__":
+    _main()
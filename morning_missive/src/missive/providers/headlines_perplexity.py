@@ -6,6 +6,7 @@ from dataclasses import dataclass
 from typing import List, Tuple
 import os
 import re
+import httpx
 import requests
 
 
@@ -24,12 +25,9 @@ class PXPapers:
     lines: List[str]
 
 
-def fetch_market_pulse_and_headlines() -> Tuple[PXPulse, List[PXHeadline]]:
-    api_key = os.getenv("PERPLEXITY_API_KEY", "").strip()
-    if not api_key:
-        raise RuntimeError("Missing PERPLEXITY_API_KEY (set it in your root .env)")
+PERPLEXITY_URL = os.getenv("PERPLEXITY_API_URL", "https://api.perplexity.ai/chat/completions").strip()
 
-    prompt = """
+_PULSE_PROMPT = """
 You are a global macro trading desk assistant. You MUST use web research to produce a genuine morning market note for TODAY.
 
 DO NOT mention limitations, missing app_data, job postings, or "search results". Do not include any disclaimers.
@@ -58,44 +56,102 @@ HEADLINES:
 - ... (SRC).
 """.strip()
 
-    r = requests.post(
-        "https://api.perplexity.ai/chat/completions",
-        headers={
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        },
-        json={
-            "model": "sonar-pro",
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.2,
-            "top_p": 0.9,
-        },
-        timeout=30,
-    )
+_PAPERS_PROMPT = """
+You are a global macro trading desk assistant.
+
+TASK: Produce TODAY'S PAPERS — exactly 4 bullet lines sourced from major newspapers/wires:
+Financial Times (FT), Wall Street Journal (WSJ), Reuters (RTRS). Prefer those three.
+
+Rules:
+- EXACTLY 4 bullets.
+- Each line 12–22 words.
+- Must be a real, market-relevant headline or lead story theme from TODAY.
+- End each line with a source tag in square brackets: [FT], [WSJ], or [RTRS].
+- No citations like [1], [2]. No disclaimers. No meta commentary.
+- Do NOT reuse the same stories from the "Top Overnight Headlines" section; choose distinct angles if possible.
+
+FORMAT EXACTLY:
+
+PAPERS:
+- ...
+- ...
+- ...
+- ...
+""".strip()
+
+_BAD_PHRASES = [
+    "I APPRECIATE YOUR DETAILED REQUEST",
+    "I NEED TO CLARIFY",
+    "LIMITATION",
+    "JOB DESCRIPTIONS",
+    "SEARCH RESULTS PROVIDED",
+]
+_RETRY_SUFFIX = "\n\nREMINDER: DO NOT WRITE DISCLAIMERS. WRITE THE NOTE USING WEB RESEARCH."
+
+
+def _api_key() -> str:
+    api_key = os.getenv("PERPLEXITY_API_KEY", "").strip()
+    if not api_key:
+        raise RuntimeError("Missing PERPLEXITY_API_KEY (set it in your root .env)")
+    return api_key
+
+
+def _headers(api_key: str) -> dict:
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+    }
+
+
+def _body(prompt: str) -> dict:
+    return {
+        "model": "sonar-pro",
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": 0.2,
+        "top_p": 0.9,
+    }
+
+
+def _retry_body(prompt: str) -> dict:
+    return {"model": "sonar-pro", "messages": [{"role": "user", "content": prompt + _RETRY_SUFFIX}], "temperature": 0.2}
+
+
+def _is_disclaimer(content: str) -> bool:
+    return any(p.lower() in content.lower() for p in _BAD_PHRASES)
+
+
+def fetch_market_pulse_and_headlines() -> Tuple[PXPulse, List[PXHeadline]]:
+    api_key = _api_key()
+
+    r = requests.post(PERPLEXITY_URL, headers=_headers(api_key), json=_body(_PULSE_PROMPT), timeout=30)
     r.raise_for_status()
+    content = r.json()["choices"][0]["message"]["content"] or ""
 
-    js = r.json()
-    content = js["choices"][0]["message"]["content"] or ""
-
-    bad_phrases = [
-        "I APPRECIATE YOUR DETAILED REQUEST",
-        "I NEED TO CLARIFY",
-        "LIMITATION",
-        "JOB DESCRIPTIONS",
-        "SEARCH RESULTS PROVIDED",
-    ]
-    if any(p.lower() in content.lower() for p in bad_phrases):
+    if _is_disclaimer(content):
         # If the model replied with a disclaimer, force a retry with stricter instruction.
-        retry_prompt = prompt + "\n\nREMINDER: DO NOT WRITE DISCLAIMERS. WRITE THE NOTE USING WEB RESEARCH."
-        r2 = requests.post(
-            "https://api.perplexity.ai/chat/completions",
-            headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
-            json={"model": "sonar-pro", "messages": [{"role": "user", "content": retry_prompt}], "temperature": 0.2},
-            timeout=30,
-        )
+        r2 = requests.post(PERPLEXITY_URL, headers=_headers(api_key), json=_retry_body(_PULSE_PROMPT), timeout=30)
+        r2.raise_for_status()
+        content = r2.json()["choices"][0]["message"]["content"] or ""
+
+    return _parse_pulse_and_headlines(content)
+
+
+async def fetch_market_pulse_and_headlines_async(client: httpx.AsyncClient) -> Tuple[PXPulse, List[PXHeadline]]:
+    api_key = _api_key()
+
+    r = await client.post(PERPLEXITY_URL, headers=_headers(api_key), json=_body(_PULSE_PROMPT), timeout=30)
+    r.raise_for_status()
+    content = r.json()["choices"][0]["message"]["content"] or ""
+
+    if _is_disclaimer(content):
+        r2 = await client.post(PERPLEXITY_URL, headers=_headers(api_key), json=_retry_body(_PULSE_PROMPT), timeout=30)
         r2.raise_for_status()
         content = r2.json()["choices"][0]["message"]["content"] or ""
 
+    return _parse_pulse_and_headlines(content)
+
+
+def _parse_pulse_and_headlines(content: str) -> Tuple[PXPulse, List[PXHeadline]]:
     pulse_lines: List[str] = []
     headlines: List[PXHeadline] = []
 
@@ -199,53 +255,18 @@ HEADLINES:
 
 
 def fetch_todays_papers() -> PXPapers:
-    api_key = os.getenv("PERPLEXITY_API_KEY", "").strip()
-    if not api_key:
-        raise RuntimeError("Missing PERPLEXITY_API_KEY (set it in your root .env)")
-
-    prompt = """
-You are a global macro trading desk assistant.
-
-TASK: Produce TODAY'S PAPERS — exactly 4 bullet lines sourced from major newspapers/wires:
-Financial Times (FT), Wall Street Journal (WSJ), Reuters (RTRS). Prefer those three.
-
-Rules:
-- EXACTLY 4 bullets.
-- Each line 12–22 words.
-- Must be a real, market-relevant headline or lead story theme from TODAY.
-- End each line with a source tag in square brackets: [FT], [WSJ], or [RTRS].
-- No citations like [1], [2]. No disclaimers. No meta commentary.
-- Do NOT reuse the same stories from the "Top Overnight Headlines" section; choose distinct angles if possible.
-
-FORMAT EXACTLY:
+    r = requests.post(PERPLEXITY_URL, headers=_headers(_api_key()), json=_body(_PAPERS_PROMPT), timeout=30)
+    r.raise_for_status()
+    return _parse_papers(r.json()["choices"][0]["message"]["content"] or "")
 
-PAPERS:
-- ...
-- ...
-- ...
-- ...
-""".strip()
 
-    r = requests.post(
-        "https://api.perplexity.ai/chat/completions",
-        headers={
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        },
-        json={
-            "model": "sonar-pro",
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.2,
-            "top_p": 0.9,
-        },
-        timeout=30,
-    )
+async def fetch_todays_papers_async(client: httpx.AsyncClient) -> PXPapers:
+    r = await client.post(PERPLEXITY_URL, headers=_headers(_api_key()), json=_body(_PAPERS_PROMPT), timeout=30)
     r.raise_for_status()
-
-    js = r.json()
-    content = js["choices"][0]["message"]["content"] or ""
+    return _parse_papers(r.json()["choices"][0]["message"]["content"] or "")
 
 
+def _parse_papers(content: str) -> PXPapers:
     # Extract bullets under PAPERS / TODAY'S PAPERS / TODAY’S PAPERS.
     # If the model ignores headers, fall back to first 4 bullets anywhere.
     raw_bullets: List[str] = []
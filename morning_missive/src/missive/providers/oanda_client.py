@@ -0,0 +1,151 @@
+# morning_missive/src/missive/providers/oanda_client.py
+
+from __future__ import annotations
+
+import asyncio
+import random
+from typing import Dict, Iterable, List, Optional
+
+import httpx
+
+from missive.utils.log import get_logger
+
+log = get_logger("missive_oanda")
+
+# Instruments per batched request (candle specifications / pricing list); keeps URLs short
+BATCH_SIZE = 50
+
+
+def _chunks(items: List[str], n: int) -> Iterable[List[str]]:
+    for i in range(0, len(items), n):
+        yield items[i:i + n]
+
+
+class OandaClient:
+    """
+    Async OANDA v20 REST client for batch reads.
+
+    All requests share one keep-alive connection pool. OANDA limits new connections (2 per
+    second) far more tightly than requests (120 per second). At most `max_concurrency`
+    requests are in flight at once. A 429 is retried after its Retry-After, or with
+    exponential backoff plus jitter, up to `max_retries` times.
+
+    Pass `client=` to share a pool the caller already owns. Otherwise the client opens its
+    own, and closes it on `aclose()` / `async with`.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        *,
+        client: Optional[httpx.AsyncClient] = None,
+        max_concurrency: int = 8,
+        max_retries: int = 4,
+        backoff: float = 0.5,
+        timeout: float = 20.0,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self._headers = {"Authorization": f"Bearer {api_key}", "Accept-Datetime-Format": "RFC3339"}
+        self._own = client is None
+        self._client = client or httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+        )
+        self._sem = asyncio.Semaphore(max(1, max_concurrency))
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self.requests = 0
+        self.throttled = 0
+
+    async def __aenter__(self) -> "OandaClient":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        if self._own:
+            await self._client.aclose()
+
+    def stats(self) -> Dict[str, int]:
+        return {"requests": self.requests, "throttled": self.throttled}
+
+    def _retry_delay(self, r: httpx.Response, attempt: int) -> float:
+        try:
+            return max(0.0, float(r.headers["Retry-After"]))
+        except (KeyError, ValueError):
+            return min(8.0, self.backoff * 2 ** attempt) * random.uniform(0.8, 1.2)
+
+    async def get(self, path: str, params: Optional[Dict[str, str]] = None) -> dict:
+        """GET a JSON resource; retries 429s, raises httpx.HTTPStatusError on any other error status."""
+        attempt = 0
+        while True:
+            async with self._sem:
+                self.requests += 1
+                r = await self._client.get(f"{self.base_url}{path}", headers=self._headers, params=params,
+                                           timeout=self.timeout)
+            if r.status_code != 429 or attempt >= self.max_retries:
+                r.raise_for_status()
+                return r.json()
+            # Sleep outside the semaphore, so other requests are not held up by this one's backoff
+            self.throttled += 1
+            delay = self._retry_delay(r, attempt)
+            log.warning("OANDA 429 on {}, retrying in {:.2f}s", path, delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    # ---------------- endpoints ----------------
+
+    async def candles(self, instrument: str, **params: str) -> List[dict]:
+        """/v3/instruments/{instrument}/candles; params as in the API (granularity, count, price, from, to)."""
+        js = await self.get(f"/v3/instruments/{instrument}/candles", params=params)
+        return js.get("candles", []) or []
+
+    async def candles_many(self, instruments: List[str], **params: str) -> Dict[str, Optional[List[dict]]]:
+        """One candles request per instrument, all in flight together; None for an instrument that failed."""
+        async def one(inst: str) -> Optional[List[dict]]:
+            try:
+                return await self.candles(inst, **params)
+            except (httpx.HTTPError, ValueError) as e:
+                log.warning("OANDA candles for {} failed: {}", inst, e)
+                return None
+
+        results = await asyncio.gather(*(one(i) for i in instruments))
+        return dict(zip(instruments, results))
+
+    async def latest_candles(self, account_id: str, instruments: List[str], *, granularity: str = "D",
+                             price: str = "M") -> Dict[str, List[dict]]:
+        """
+        /v3/accounts/{account}/candles/latest: the current and the most recently completed
+        candles for many instruments per request. A batch the API rejects (an instrument the
+        account cannot trade fails the whole batch) is simply missing from the result.
+        """
+        async def batch(insts: List[str]) -> Dict[str, List[dict]]:
+            specs = ",".join(f"{i}:{granularity}:{price}" for i in insts)
+            try:
+                js = await self.get(f"/v3/accounts/{account_id}/candles/latest",
+                                    params={"candleSpecifications": specs})
+            except (httpx.HTTPError, ValueError) as e:
+                log.warning("OANDA latest candles for {} instruments failed: {}", len(insts), e)
+                return {}
+            return {c.get("instrument"): c.get("candles", []) or [] for c in js.get("latestCandles", []) or []}
+
+        out: Dict[str, List[dict]] = {}
+        for part in await asyncio.gather(*(batch(c) for c in _chunks(instruments, BATCH_SIZE))):
+            out.update(part)
+        return out
+
+    async def pricing(self, account_id: str, instruments: List[str]) -> List[dict]:
+        """/v3/accounts/{account}/pricing in batches; a failed batch contributes no prices."""
+        async def batch(insts: List[str]) -> List[dict]:
+            try:
+                js = await self.get(f"/v3/accounts/{account_id}/pricing", params={"instruments": ",".join(insts)})
+            except (httpx.HTTPError, ValueError) as e:
+                log.warning("OANDA pricing for {} instruments failed: {}", len(insts), e)
+                return []
+            return js.get("prices", []) or []
+
+        parts = await asyncio.gather(*(batch(c) for c in _chunks(instruments, BATCH_SIZE)))
+        return [p for part in parts for p in part]
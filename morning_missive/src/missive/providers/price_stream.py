@@ -0,0 +1,214 @@
+# morning_missive/src/missive/providers/price_stream.py
+
+"""
+Warm in-memory prices from OANDA's pricing stream.
+
+PriceStream holds one long-lived GET on /v3/accounts/{account}/pricing/stream and writes every
+PRICE line into a PriceBook (latest bid / ask / mid per instrument). OANDA sends a HEARTBEAT
+line every 5 seconds. If nothing arrives for `heartbeat_timeout` seconds, the connection
+counts as dead, just like a dropped or refused one, and the stream reconnects with
+exponential backoff.
+
+The book is what fetch_prices reads the live mids from while it is live(). A book that has
+lost its stream is not live, and fetch_prices goes back to the /pricing call, so a stale
+price never reaches the post.
+
+The subscriber runs on its own thread with its own event loop. It works the same under the
+blocking scheduler of `run_missive.py serve` as next to an asyncio app.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import httpx
+
+from missive.utils.log import get_logger
+
+log = get_logger("missive_price_stream")
+
+
+@dataclass(frozen=True)
+class Quote:
+    instrument: str
+    bid: float
+    ask: float
+    time: str          # OANDA's timestamp of the price
+    received: float    # time.monotonic() when it arrived
+
+    @property
+    def mid(self) -> float:
+        return (self.bid + self.ask) / 2.0
+
+
+class PriceBook:
+    """Latest quote per instrument, plus when the stream was last heard from."""
+
+    def __init__(self, heartbeat_timeout: float = 15.0):
+        self.heartbeat_timeout = heartbeat_timeout
+        self._quotes: Dict[str, Quote] = {}
+        self._lock = threading.Lock()
+        self.connected = False
+        self.last_message = 0.0  # monotonic; price or heartbeat
+
+        self.prices = 0
+        self.heartbeats = 0
+        self.reconnects = 0
+
+    # ---------------- writer (stream thread) ----------------
+
+    def update(self, q: Quote) -> None:
+        with self._lock:
+            self._quotes[q.instrument] = q
+            self.last_message = q.received
+            self.prices += 1
+
+    def heartbeat(self) -> None:
+        self.last_message = time.monotonic()
+        self.heartbeats += 1
+
+    # ---------------- readers ----------------
+
+    def live(self) -> bool:
+        """Connected and heard from within heartbeat_timeout: every quote in the book is current."""
+        return self.connected and time.monotonic() - self.last_message <= self.heartbeat_timeout
+
+    def get(self, instrument: str) -> Optional[Quote]:
+        return self._quotes.get(instrument)
+
+    def snapshot(self, instruments: Optional[List[str]] = None) -> Dict[str, Quote]:
+        with self._lock:
+            if instruments is None:
+                return dict(self._quotes)
+            return {i: self._quotes[i] for i in instruments if i in self._quotes}
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "live": self.live(),
+            "instruments": len(self._quotes),
+            "prices": self.prices,
+            "heartbeats": self.heartbeats,
+            "reconnects": self.reconnects,
+            "silent_seconds": round(time.monotonic() - self.last_message, 1) if self.last_message else None,
+        }
+
+
+def _quote(msg: dict, received: float) -> Optional[Quote]:
+    try:
+        return Quote(msg["instrument"], float(msg["bids"][0]["price"]), float(msg["asks"][0]["price"]),
+                     str(msg.get("time", "")), received)
+    except (KeyError, IndexError, TypeError, ValueError):
+        return None
+
+
+class PriceStream:
+    """Keeps `book` fed from the pricing stream until stop() is called."""
+
+    def __init__(
+        self,
+        stream_url: str,
+        api_key: str,
+        account_id: str,
+        instruments: List[str],
+        book: PriceBook,
+        *,
+        max_backoff: float = 30.0,
+    ):
+        self.url = f"{stream_url.rstrip('/')}/v3/accounts/{account_id}/pricing/stream"
+        self._headers = {"Authorization": f"Bearer {api_key}", "Accept-Datetime-Format": "RFC3339"}
+        self.instruments = list(instruments)
+        self.book = book
+        self.max_backoff = max_backoff
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------------- lifecycle ----------------
+
+    def start(self) -> "PriceStream":
+        self._thread = threading.Thread(target=lambda: asyncio.run(self.run()), name="oanda-price-stream",
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def wait_live(self, timeout: float) -> bool:
+        """Block until the book has a quote for every instrument (or timeout); returns book.live()."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and not self._stop.is_set():
+            if self.book.live() and len(self.book.snapshot(self.instruments)) == len(self.instruments):
+                break
+            time.sleep(0.05)
+        return self.book.live()
+
+    # ---------------- stream ----------------
+
+    async def run(self) -> None:
+        delay = 0.5
+        # The read timeout is the heartbeat watchdog: no line within it means a dead connection
+        timeout = httpx.Timeout(10.0, read=self.book.heartbeat_timeout)
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            while not self._stop.is_set():
+                try:
+                    got_any = await self._consume(client)
+                    if got_any:
+                        delay = 0.5
+                    if not self._stop.is_set():
+                        log.warning("Price stream ended, reconnecting")
+                except httpx.HTTPStatusError as e:
+                    log.warning("Price stream refused: {}", e)
+                    retry_after = e.response.headers.get("Retry-After")
+                    if retry_after and retry_after.replace(".", "", 1).isdigit():
+                        delay = max(delay, float(retry_after))
+                except (httpx.HTTPError, OSError) as e:
+                    log.warning("Price stream lost: {!r}", e)
+                finally:
+                    self.book.connected = False
+                if self._stop.is_set():
+                    break
+                self.book.reconnects += 1
+                await self._sleep(delay * random.uniform(0.8, 1.2))
+                delay = min(self.max_backoff, delay * 2)
+
+    async def _sleep(self, seconds: float) -> None:
+        # Wakes within 0.1s of stop()
+        end = time.monotonic() + seconds
+        while not self._stop.is_set() and time.monotonic() < end:
+            await asyncio.sleep(min(0.1, end - time.monotonic()))
+
+    async def _consume(self, client: httpx.AsyncClient) -> bool:
+        params = {"instruments": ",".join(self.instruments)}
+        got_any = False
+        async with client.stream("GET", self.url, headers=self._headers, params=params) as r:
+            r.raise_for_status()
+            log.info("Price stream connected for {} instruments", len(self.instruments))
+            async for line in r.aiter_lines():
+                if self._stop.is_set():
+                    return got_any
+                if not line.strip():
+                    continue
+                try:
+                    msg = json.loads(line)
+                except ValueError:
+                    continue
+                now = time.monotonic()
+                if msg.get("type") == "HEARTBEAT":
+                    self.book.heartbeat()
+                elif msg.get("type") == "PRICE":
+                    q = _quote(msg, now)
+                    if q is not None:
+                        self.book.update(q)
+                else:
+                    continue
+                self.book.connected = True
+                got_any = True
+        return got_any
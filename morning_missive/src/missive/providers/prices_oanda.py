@@ -1,7 +1,14 @@
 from __future__ import annotations
+import asyncio
+import concurrent.futures
 from dataclasses import dataclass
+from datetime import datetime, timezone
 from typing import Optional, Dict, List
-import requests
+import httpx
+
+from missive.providers.candle_store import CandleStore, sync_candles
+from missive.providers.oanda_client import OandaClient
+from missive.providers.price_stream import PriceBook
 
 @dataclass
 class OandaPrice:
@@ -10,54 +17,114 @@ class OandaPrice:
     daily_time: Optional[str]
     live_mid: Optional[float]
 
-def _headers(api_key: str) -> dict:
-    return {"Authorization": f"Bearer {api_key}"}
-
-def fetch_prices(*, base_url: str, api_key: str, account_id: str, instruments: List[str]) -> Dict[str, OandaPrice]:
-    out: Dict[str, OandaPrice] = {}
-
-    # 1) Daily close (last complete candle)
-    for inst in instruments:
-        try:
-            url = f"{base_url}/v3/instruments/{inst}/candles"
-            params = {"granularity": "D", "count": "3", "price": "M"}
-            r = requests.get(url, headers=_headers(api_key), params=params, timeout=20)
-            r.raise_for_status()
-            js = r.json()
-            candles = js.get("candles", []) or []
-            complete = [c for c in candles if c.get("complete") is True]
-            if not complete:
-                out[inst] = OandaPrice(inst, None, None, None)
-                continue
-            last = complete[-1]
-            close = float(last["mid"]["c"])
-            t = str(last.get("time", ""))
-            out[inst] = OandaPrice(inst, close, t, None)
-        except Exception:
-            out[inst] = OandaPrice(inst, None, None, None)
-
-    # 2) Live mid (pricing endpoint requires account)
-    if account_id:
-        try:
-            url = f"{base_url}/v3/accounts/{account_id}/pricing"
-            params = {"instruments": ",".join(instruments)}
-            r = requests.get(url, headers=_headers(api_key), params=params, timeout=20)
-            r.raise_for_status()
-            js = r.json()
-            for p in (js.get("prices", []) or []):
-                inst = p.get("instrument")
-                bids = p.get("bids", [])
-                asks = p.get("asks", [])
-                if not inst or not bids or not asks:
-                    continue
-                bid = float(bids[0]["price"])
-                ask = float(asks[0]["price"])
-                mid = (bid + ask) / 2.0
-                if inst in out:
-                    out[inst].live_mid = mid
-                else:
-                    out[inst] = OandaPrice(inst, None, None, mid)
-        except Exception:
-            pass
+_CANDLE_PARAMS = {"granularity": "D", "count": "3", "price": "M"}
+
+def stored_prices(store: CandleStore, instruments: List[str]) -> Dict[str, OandaPrice]:
+    """Closes from the candle store alone (no live mid): the fallback when OANDA does not answer."""
+    return {inst: _stored_daily(store, inst) for inst in instruments}
+
+def _stored_daily(store: CandleStore, inst: str) -> OandaPrice:
+    last = store.tail(inst, "D", 1)
+    if not last:
+        return OandaPrice(inst, None, None, None)
+    t = datetime.fromtimestamp(last[0].t, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000000000Z")
+    return OandaPrice(inst, last[0].c, t, None)
+
+def _daily_from(inst: str, js: dict) -> OandaPrice:
+    # Daily close = last complete candle
+    candles = js.get("candles", []) or []
+    complete = [c for c in candles if c.get("complete") is True]
+    if not complete:
+        return OandaPrice(inst, None, None, None)
+    last = complete[-1]
+    close = float(last["mid"]["c"])
+    t = str(last.get("time", ""))
+    return OandaPrice(inst, close, t, None)
+
+def _apply_pricing(out: Dict[str, OandaPrice], js: dict) -> None:
+    for p in (js.get("prices", []) or []):
+        inst = p.get("instrument")
+        bids = p.get("bids", [])
+        asks = p.get("asks", [])
+        if not inst or not bids or not asks:
+            continue
+        bid = float(bids[0]["price"])
+        ask = float(asks[0]["price"])
+        mid = (bid + ask) / 2.0
+        if inst in out:
+            out[inst].live_mid = mid
+        else:
+            out[inst] = OandaPrice(inst, None, None, mid)
+
+def book_prices(book: PriceBook, instruments: List[str], store: Optional[CandleStore] = None) -> Dict[str, OandaPrice]:
+    """No network: mids from the book (while it is live) and closes from the store (if any)."""
+    if store is not None:
+        out = stored_prices(store, instruments)
+    else:
+        out = {inst: OandaPrice(inst, None, None, None) for inst in instruments}
+    if book.live():
+        for inst, q in book.snapshot(instruments).items():
+            out[inst].live_mid = q.mid
+    return out
+
+def _run_sync(coro):
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    # Called from a coroutine (e.g. a bot job): run on a private loop in a worker thread
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as ex:
+        return ex.submit(asyncio.run, coro).result()
+
+def fetch_prices(*, base_url: str, api_key: str, account_id: str, instruments: List[str], max_concurrency: int = 8,
+                 store: Optional[CandleStore] = None, history: int = 250,
+                 book: Optional[PriceBook] = None) -> Dict[str, OandaPrice]:
+    """Blocking wrapper around fetch_prices_async, on a pool of its own."""
+    return _run_sync(fetch_prices_async(None, base_url=base_url, api_key=api_key, account_id=account_id,
+                                        instruments=instruments, max_concurrency=max_concurrency, store=store,
+                                        history=history, book=book))
+
+async def fetch_prices_async(
+    client: Optional[httpx.AsyncClient], *, base_url: str, api_key: str, account_id: str, instruments: List[str],
+    max_concurrency: int = 8, store: Optional[CandleStore] = None, history: int = 250,
+    book: Optional[PriceBook] = None,
+) -> Dict[str, OandaPrice]:
+    """
+    Daily close (last complete D candle) and live mid for every instrument, in a near-constant
+    number of round trips. With an account, the closes come from the latest-candles endpoint
+    and the mids from pricing, batched BATCH_SIZE instruments per request. An instrument the
+    batch did not cover, or any instrument when there is no account, gets its own candles
+    request, with up to `max_concurrency` in flight on one keep-alive pool.
+
+    With a `store`, the daily candles are synced into it instead (only the ones it does not
+    have yet; `history` candles for a new instrument) and the close is its newest candle, so a
+    failed fetch still has a close.
+
+    With a live `book` (the pricing stream is up), the mids come from memory and /pricing is
+    only asked for instruments the book has no quote for.
+    """
+    async with OandaClient(base_url, api_key, client=client, max_concurrency=max_concurrency) as oanda:
+        async def dailies() -> Dict[str, OandaPrice]:
+            if store is not None:
+                await sync_candles(store, oanda, instruments, "D", account_id=account_id, history=history)
+                return await asyncio.to_thread(stored_prices, store, instruments)
+            got: Dict[str, Optional[List[dict]]] = {}
+            if account_id:
+                got.update(await oanda.latest_candles(account_id, instruments, granularity="D", price="M"))
+            rest = [i for i in instruments if i not in got]
+            if rest:
+                got.update(await oanda.candles_many(rest, **_CANDLE_PARAMS))
+            return {inst: _daily_from(inst, {"candles": got.get(inst) or []}) for inst in instruments}
+
+        quotes = book.snapshot(instruments) if book is not None and book.live() else {}
+        missing = [i for i in instruments if i not in quotes]
+
+        async def live() -> List[dict]:
+            return await oanda.pricing(account_id, missing) if account_id and missing else []
+
+        out, prices = await asyncio.gather(dailies(), live())
 
+    _apply_pricing(out, {"prices": prices})
+    for inst, q in quotes.items():
+        out[inst].live_mid = q.mid
     return out
@@ -3,12 +3,15 @@
 from __future__ import annotations
 from datetime import datetime
 from zoneinfo import ZoneInfo
-from typing import Dict, List
+from typing import TYPE_CHECKING, Dict, List, Sequence
 import re
 
 from missive.providers.prices_oanda import OandaPrice
 from missive.providers.calendar_tradingview import TVEvent
 
+if TYPE_CHECKING:  # NumPy is only needed when there are analytics to show
+    from missive.analytics import Analytics
+
 
 def _fmt(v: float | None, dp: int = 2) -> str:
     return "N/A" if v is None else f"{v:,.{dp}f}"
@@ -54,7 +57,30 @@ def _fmt_asset(inst: str, v: float | None) -> str:
     return f"{v:,.{dp}f}"
 
 
-def _pricing_table(prices: Dict[str, OandaPrice]) -> str:
+_COLUMN_LABELS = {
+    "overnight": "ON",
+    "chg_1d": "1D",
+    "chg_5d": "5D",
+    "atr": "ATR",
+    "rv": "RV",
+    "pivot": "PIV",
+    "r1": "R1",
+    "s1": "S1",
+}
+
+
+def _fmt_column(inst: str, column: str, v: float | None) -> str:
+    if v is None:
+        return "N/A"
+    if column in ("overnight", "chg_1d", "chg_5d"):
+        return f"{v:+.2f}%"
+    if column == "rv":
+        return f"{v:.1f}%"
+    return _fmt_asset(inst, v)  # ATR and pivots are in price units
+
+
+def _pricing_table(prices: Dict[str, OandaPrice], analytics: Analytics | None = None,
+                   columns: Sequence[str] = ()) -> str:
     # preferred order
     order = [
         "SPX500_USD",
@@ -67,32 +93,38 @@ def _pricing_table(prices: Dict[str, OandaPrice]) -> str:
         "GBP_USD",
         "USD_JPY",
     ]
+    columns = [c for c in columns if c in _COLUMN_LABELS] if analytics is not None else []
+
+    def row(inst: str, p: OandaPrice) -> List[str]:
+        return [_alias(inst), _fmt_asset(inst, p.daily_close)] + [
+            _fmt_column(inst, col, analytics.get(inst, col)) for col in columns
+        ]
 
     rows = []
     for inst in order:
         p = prices.get(inst)
         if not p:
             continue
-        v = p.daily_close
-        rows.append((_alias(inst), _fmt_asset(inst, v)))
+        rows.append(row(inst, p))
 
     # include any extra instruments (not in order)
     for inst, p in prices.items():
         if inst in order:
             continue
-        v = p.daily_close
-        rows.append((_alias(inst), _fmt_asset(inst, v)))
+        rows.append(row(inst, p))
 
     if not rows:
         return "N/A"
 
-    name_w = max(len(a) for a, _ in rows)
-    px_w = max(len(b) for _, b in rows)
+    if columns:
+        rows.insert(0, ["", "CLOSE"] + [_COLUMN_LABELS[c] for c in columns])
+    widths = [max(len(r[i]) for r in rows) for i in range(len(rows[0]))]
 
-    # Build a monospace table
+    # Build a monospace table: name left-aligned, every number right-aligned
     lines = []
-    for a, b in rows:
-        lines.append(f"{a:<{name_w}}  {b:>{px_w}}")
+    for r in rows:
+        cells = [f"{r[0]:<{widths[0]}}"] + [f"{v:>{w}}" for v, w in zip(r[1:], widths[1:])]
+        lines.append("  ".join(cells).rstrip())
     return "```\n" + "\n".join(lines) + "\n```"
 
 
@@ -195,6 +227,8 @@ def build_message(
     headline_lines: List[str],
     papers_lines: List[str],
     cal_events: List[TVEvent],
+    analytics: Analytics | None = None,
+    price_columns: Sequence[str] = (),
 ) -> str:
 
     now = datetime.now(tz=ZoneInfo(tz))
@@ -202,7 +236,7 @@ def build_message(
 
     sep = "────────────"
 
-    pricing_block = _pricing_table(prices)
+    pricing_block = _pricing_table(prices, analytics, price_columns)
 
     hl_lines = []
     for x in headline_lines[:8]:
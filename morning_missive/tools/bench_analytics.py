@@ -0,0 +1,100 @@
+"""
+Benchmark: price analytics (overnight / 1D / 5D change, ATR, realised vol, pivots) for N
+instruments, one NumPy pass vs. a pure-Python loop over the same candles.
+
+Both compute from the same random daily candles; the script checks they agree, then prints
+the median time of each. "pack" is the separate step that copies candle objects into the
+NumPy window (missive.analytics.pack); "compute" is the vectorised pass alone.
+
+    python morning_missive/tools/bench_analytics.py
+    python morning_missive/tools/bench_analytics.py --sizes 10,500,2000 --reps 200
+"""
+import argparse
+import math
+import random
+import statistics
+import sys
+import time
+from collections import namedtuple
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]  # morning_missive/
+sys.path.insert(0, str(ROOT / "src"))
+
+from missive.analytics import ATR_DAYS, COLUMNS, VOL_DAYS, compute, pack, window_days  # noqa: E402
+
+Bar = namedtuple("Bar", "h l c")
+
+
+def python_loop(instruments, history, live, atr_n=ATR_DAYS, vol_n=VOL_DAYS):
+    """The same numbers, one instrument and one day at a time."""
+    out = {col: [] for col in COLUMNS}
+    for inst in instruments:
+        bars = history[inst]
+        last = bars[-1]
+        trs = [max(b.h, a.c) - min(b.l, a.c) for a, b in zip(bars, bars[1:])][-atr_n:]
+        rets = [math.log(b.c / a.c) for a, b in zip(bars, bars[1:])][-vol_n:]
+        mean = sum(rets) / len(rets)
+        pivot = (last.h + last.l + last.c) / 3
+        out["overnight"].append((live[inst] / last.c - 1) * 100)
+        out["chg_1d"].append((last.c / bars[-2].c - 1) * 100)
+        out["chg_5d"].append((last.c / bars[-6].c - 1) * 100)
+        out["atr"].append(sum(trs) / len(trs))
+        out["rv"].append(math.sqrt(sum((r - mean) ** 2 for r in rets) / (len(rets) - 1)) * math.sqrt(252) * 100)
+        out["pivot"].append(pivot)
+        out["r1"].append(2 * pivot - last.l)
+        out["s1"].append(2 * pivot - last.h)
+    return out
+
+
+def synthetic(n: int, days: int, seed: int = 1):
+    rnd = random.Random(seed)
+    instruments = [f"INST{i:04d}" for i in range(n)]
+    history, live = {}, {}
+    for inst in instruments:
+        px = rnd.uniform(1, 1000)
+        bars = []
+        for _ in range(days):
+            o, px = px, px * math.exp(rnd.gauss(0, 0.01))
+            bars.append(Bar(max(o, px) * (1 + rnd.uniform(0, 0.005)), min(o, px) * (1 - rnd.uniform(0, 0.005)), px))
+        history[inst] = bars
+        live[inst] = px * (1 + rnd.gauss(0, 0.002))
+    return instruments, history, live
+
+
+def median_time(fn, reps: int) -> float:
+    times = []
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="10,100,500,1000", help="comma-separated instrument counts")
+    ap.add_argument("--reps", type=int, default=100)
+    args = ap.parse_args()
+
+    days = window_days()
+    print(f"{days} daily candles per instrument; median of {args.reps} runs")
+    print(f"{'instruments':>11}  {'python loop':>12}  {'numpy compute':>14}  {'numpy pack':>11}  {'speed-up':>8}")
+    for n in (int(x) for x in args.sizes.split(",") if x.strip()):
+        instruments, history, live = synthetic(n, days)
+        window = pack(instruments, history, live, days)
+
+        ref = python_loop(instruments, history, live)
+        got = compute(window)
+        for col in COLUMNS:
+            worst = max(abs(a - b) / max(1.0, abs(a)) for a, b in zip(ref[col], got.values[col]))
+            assert worst < 1e-9, f"{col} differs by {worst}"
+
+        t_py = median_time(lambda: python_loop(instruments, history, live), args.reps)
+        t_np = median_time(lambda: compute(window), args.reps)
+        t_pack = median_time(lambda: pack(instruments, history, live, days), max(1, args.reps // 10))
+        print(f"{n:>11}  {t_py * 1000:>9.3f} ms  {t_np * 1000:>11.3f} ms  {t_pack * 1000:>8.3f} ms  {t_py / t_np:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Benchmark: Morning Missive build, providers one after another vs. all at once.
+
+Starts a local stand-in for OANDA (candles + pricing), the TradingView calendar and
+Perplexity (pulse + papers), each answering after a fixed latency, then builds the missive
+
+    sequential   the old path: the blocking provider functions, one after the other
+    concurrent   missive.bot.pipeline.build_once_async (pooled httpx clients, fan-out)
+
+and prints both wall times next to the slowest single provider, which is the floor for the
+concurrent build. No network access or API keys needed.
+
+    python morning_missive/tools/bench_build.py
+    python morning_missive/tools/bench_build.py --pulse 8 --papers 6 --instruments 12 --runs 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]  # morning_missive/
+sys.path.insert(0, str(ROOT / "src"))
+
+INSTRUMENTS = ["SPX500_USD", "NAS100_USD", "XAU_USD", "WTICO_USD", "BTC_USD", "ETH_USD", "EUR_USD", "GBP_USD",
+               "USD_JPY", "AUD_USD", "USD_CAD", "NZD_USD"]
+
+_PULSE = "MARKET_PULSE:\n" + "\n".join(f"- LINE {i} ABOUT MARKETS AND RATES TODAY" for i in range(6)) + \
+         "\n\nHEADLINES:\n" + "\n".join(f"- Headline {i} moves markets (RTRS)." for i in range(8))
+_PAPERS = "PAPERS:\n" + "\n".join(f"- Paper story {i} about the economy and policy today [FT]" for i in range(4))
+
+
+def _stub(latency: dict) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, delay: float, payload) -> None:
+            time.sleep(delay)
+            body = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if "/candles" in self.path:
+                inst = self.path.split("/")[3]
+                self._reply(latency["oanda"], {"instrument": inst, "candles": [
+                    {"complete": True, "time": f"2026-01-0{d}T22:00:00Z", "mid": {"o": "100", "h": "101", "l": "99", "c": f"10{d}.5"}}
+                    for d in (1, 2, 3)
+                ]})
+            elif "/pricing" in self.path:
+                self._reply(latency["oanda"], {"prices": []})
+            else:
+                self._reply(0, {})
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode()
+            if self.path.startswith("/calendar"):
+                self._reply(latency["calendar"], {"result": []})
+            elif "TODAY'S PAPERS" in body:
+                self._reply(latency["papers"], {"choices": [{"message": {"content": _PAPERS}}]})
+            else:
+                self._reply(latency["pulse"], {"choices": [{"message": {"content": _PULSE}}]})
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 128  # the default backlog of 5 drops connects from a concurrent build
+
+    srv = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--oanda", type=float, default=0.15, help="seconds per OANDA request")
+    ap.add_argument("--calendar", type=float, default=0.6, help="seconds for the calendar")
+    ap.add_argument("--pulse", type=float, default=4.0, help="seconds for the market pulse LLM call")
+    ap.add_argument("--papers", type=float, default=3.0, help="seconds for the papers LLM call")
+    ap.add_argument("--instruments", type=int, default=6, help=f"instruments to price (max {len(INSTRUMENTS)})")
+    ap.add_argument("--runs", type=int, default=1)
+    args = ap.parse_args()
+
+    latency = {"oanda": args.oanda, "calendar": args.calendar, "pulse": args.pulse, "papers": args.papers}
+    srv = _stub(latency)
+    base = f"http://127.0.0.1:{srv.server_address[1]}"
+    os.environ.update(
+        OANDA_BASE_URL=base,
+        OANDA_API_KEY="bench",
+        OANDA_ACCOUNT_ID="000-000-0000000-000",
+        MISSIVE_INSTRUMENTS=",".join(INSTRUMENTS[:args.instruments]),
+        TRADINGVIEW_CALENDAR_URL=f"{base}/calendar",
+        PERPLEXITY_API_URL=f"{base}/chat",
+        PERPLEXITY_API_KEY="bench",
+        CANDLE_STORE_PATH="",  # always fetch, and leave data/ alone
+    )
+    from loguru import logger  # noqa: E402
+    logger.remove()
+
+    # Providers read their URLs at import time, so import after the env is set
+    from missive.bot.pipeline import BuildReport, build_once_async  # noqa: E402
+    from missive.config import Settings  # noqa: E402
+    from missive.providers.calendar_tradingview import fetch_calendar_today_high_impact  # noqa: E402
+    from missive.providers.headlines_perplexity import fetch_market_pulse_and_headlines, fetch_todays_papers  # noqa: E402
+    from missive.providers.prices_oanda import fetch_prices  # noqa: E402
+    from missive.render.template import build_message  # noqa: E402
+
+    def sequential(s: Settings) -> str:
+        prices = fetch_prices(base_url=s.oanda_base_url, api_key=s.OANDA_API_KEY,
+                              account_id=s.OANDA_ACCOUNT_ID, instruments=s.instruments_list)
+        cal_events = fetch_calendar_today_high_impact()
+        pulse, px_headlines = fetch_market_pulse_and_headlines()
+        papers = fetch_todays_papers()
+        return build_message(tz=s.TZ, prices=prices, pulse_text=pulse.text, headline_lines=[h.text for h in px_headlines],
+                             papers_lines=papers.lines, cal_events=cal_events)
+
+    s = Settings()
+    seq, conc, reports = [], [], []
+    for _ in range(args.runs):
+        t0 = time.perf_counter()
+        a = sequential(s)
+        seq.append(time.perf_counter() - t0)
+
+        report = BuildReport()
+        b = asyncio.run(build_once_async(s, report))
+        conc.append(report.total)
+        reports.append(report)
+        if a != b:
+            print("note: the two builds rendered different messages (a provider fell back, or the clock ticked)")
+    srv.shutdown()
+
+    oanda_calls = args.instruments + 1
+    floor = max(args.oanda, args.calendar, args.pulse, args.papers)
+    print(f"providers: OANDA {args.oanda:.2f}s x {oanda_calls} calls, calendar {args.calendar:.2f}s, "
+          f"pulse {args.pulse:.2f}s, papers {args.papers:.2f}s")
+    print(f"sum of provider latencies   {args.oanda * oanda_calls + args.calendar + args.pulse + args.papers:7.2f} s")
+    print(f"slowest provider            {floor:7.2f} s")
+    print(f"sequential build (median)   {statistics.median(seq):7.2f} s")
+    print(f"concurrent build (median)   {statistics.median(conc):7.2f} s   "
+          f"({statistics.median(seq) / statistics.median(conc):.1f}x faster, "
+          f"{(statistics.median(conc) - floor) * 1000:.0f} ms over the slowest provider)")
+    last = reports[-1]
+    print("per provider (concurrent):  " + ", ".join(f"{k} {v:.2f}s" for k, v in last.seconds.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark: OANDA price fetching as the number of instruments grows.
+
+Runs three ways of getting the daily close + live mid of N instruments against
+missive.fake_oanda (each request answers after --latency seconds):
+
+    sequential   the old fetch_prices: one blocking requests.get per instrument, new connection each
+    per-inst     fetch_prices without an account: candles requests in flight together (semaphore)
+    batched      fetch_prices with an account: latest-candles + pricing, BATCH_SIZE instruments a call
+
+and prints the wall time and request count of each. --rate-limit-every N makes the stand-in answer
+every Nth request with 429, to show the backoff. No network access or API keys needed.
+
+    python morning_missive/tools/bench_oanda.py
+    python morning_missive/tools/bench_oanda.py --sizes 6,50,200 --latency 0.2 --rate-limit-every 10
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import requests
+
+ROOT = Path(__file__).resolve().parents[1]  # morning_missive/
+sys.path.insert(0, str(ROOT / "src"))
+
+from loguru import logger  # noqa: E402
+
+from missive.fake_oanda import FakeOanda  # noqa: E402
+from missive.providers.prices_oanda import OandaPrice, _apply_pricing, _daily_from, fetch_prices  # noqa: E402
+
+ACCOUNT = "000-000-0000000-000"
+
+
+def sequential(base_url: str, instruments: list) -> dict:
+    # The loop fetch_prices ran before it was batched, kept here as the baseline
+    out = {}
+    headers = {"Authorization": "Bearer bench"}
+    for inst in instruments:
+        try:
+            r = requests.get(f"{base_url}/v3/instruments/{inst}/candles", headers=headers,
+                             params={"granularity": "D", "count": "3", "price": "M"}, timeout=20)
+            r.raise_for_status()
+            out[inst] = _daily_from(inst, r.json())
+        except Exception:
+            out[inst] = OandaPrice(inst, None, None, None)
+    r = requests.get(f"{base_url}/v3/accounts/{ACCOUNT}/pricing", headers=headers,
+                     params={"instruments": ",".join(instruments)}, timeout=20)
+    _apply_pricing(out, r.json())
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="6,25,100,200", help="comma-separated instrument counts")
+    ap.add_argument("--latency", type=float, default=0.1, help="seconds per request")
+    ap.add_argument("--concurrency", type=int, default=8, help="per-instrument requests in flight")
+    ap.add_argument("--rate-limit-every", type=int, default=0, help="answer every Nth request with 429")
+    ap.add_argument("--max-sequential", type=int, default=100, help="skip the baseline above this many")
+    args = ap.parse_args()
+    logger.remove()
+
+    print(f"latency {args.latency:.2f}s per request, concurrency {args.concurrency}"
+          + (f", 429 every {args.rate_limit_every} requests" if args.rate_limit_every else ""))
+    print(f"{'instruments':>11}  {'sequential':>16}  {'per-inst':>16}  {'batched':>16}")
+    with FakeOanda(latency=args.latency, rate_limit_every=args.rate_limit_every) as fake:
+        for n in (int(x) for x in args.sizes.split(",") if x.strip()):
+            instruments = [f"INST{i:03d}_USD" for i in range(n)]
+            cells = []
+            runs = [
+                ("sequential", lambda: sequential(fake.base_url, instruments) if n <= args.max_sequential else None),
+                ("per-inst", lambda: fetch_prices(base_url=fake.base_url, api_key="bench", account_id="",
+                                                  instruments=instruments, max_concurrency=args.concurrency)),
+                ("batched", lambda: fetch_prices(base_url=fake.base_url, api_key="bench", account_id=ACCOUNT,
+                                                 instruments=instruments, max_concurrency=args.concurrency)),
+            ]
+            for name, fn in runs:
+                before, limited = fake.requests, fake.rate_limited
+                t0 = time.perf_counter()
+                out = fn()
+                dt = time.perf_counter() - t0
+                if out is None:
+                    cells.append(f"{'-':>16}")
+                    continue
+                missing = sum(1 for p in out.values() if p.daily_close is None)
+                note = f"{dt:6.2f}s {fake.requests - before:4d} req"
+                if fake.rate_limited - limited:
+                    note += f" ({fake.rate_limited - limited} x 429)"
+                if missing:
+                    note += f" [{missing} missing]"
+                cells.append(f"{note:>16}")
+            print(f"{n:>11}  " + "  ".join(cells))
+
+
+if __name__ == "__main__":
+    main()
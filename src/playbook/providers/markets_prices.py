@@ -1,4 +1,26 @@
-# daily_playbook/src/playbook/providers/markets_prices.py
+# src/playbook/providers/markets_prices.py
 from __future__ import annotations
 
-# placeholder for later expansion
+import importlib.util
+import sys
+from pathlib import Path
+
+# One implementation for both playbook trees: this loads
+# daily_playbook/src/playbook/providers/markets_prices.py instead of keeping a copy that can drift.
+# src/playbook/providers/markets_prices.py -> parents[3] = repo root
+_IMPL = Path(__file__).resolve().parents[3] / "daily_playbook" / "src" / "playbook" / "providers" / "markets_prices.py"
+
+_spec = importlib.util.spec_from_file_location("_playbook_markets_prices", _IMPL)
+_impl = importlib.util.module_from_spec(_spec)
+sys.modules[_spec.name] = _impl  # dataclasses look their module up while it executes
+_spec.loader.exec_module(_impl)
+
+DEFAULT_DB = _impl.DEFAULT_DB
+Candle = _impl.Candle
+store_path = _impl.store_path
+candles = _impl.candles
+last_candles = _impl.last_candles
+latest_closes = _impl.latest_closes
+candles_async = _impl.candles_async
+last_candles_async = _impl.last_candles_async
+latest_closes_async = _impl.latest_closes_async
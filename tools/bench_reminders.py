@@ -0,0 +1,150 @@
+"""
+Benchmark for the reminder scheduler (app/reminders.py) with a large backlog of pending nudges.
+
+With N users stalled mid-onboarding it measures:
+
+    schedule      arming a series (what every conversation step costs), µs/op
+    progress      re-arming users who moved on a step (leaves stale heap entries), µs/op
+    cancel        dropping a series (END / timeout), µs/op
+    memory        bytes per pending series (heap + live table), tracemalloc
+    flush         writing all pending changes to SQLite in one batch
+    restart       start(): reading the table back and heapifying it
+    wake-up       cost of one timer wake that fires K due reminders while N stay pending,
+                  next to what a poll-every-session tick would cost (a full scan of N)
+
+No network: the send callback is a no-op.
+
+    python tools/bench_reminders.py
+    python tools/bench_reminders.py --users 500000 --json reminders.json
+"""
+import argparse
+import asyncio
+import gc
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.reminders import ReminderScheduler  # noqa: E402
+
+DELAYS = (3600.0, 86400.0)
+S_EMAIL, S_PHONE = 1, 2
+
+
+async def _noop_send(bot: Any, chat_id: int, state: int, step: int) -> None:
+    pass
+
+
+def _per_op(seconds: float, n: int) -> float:
+    return seconds / n * 1e6
+
+
+async def run(users: int, due: int) -> Dict[str, Any]:
+    tmp = tempfile.TemporaryDirectory()
+    path = str(Path(tmp.name) / "reminders.sqlite3")
+    r: Dict[str, Any] = {"users": users}
+
+    now = time.time()
+    probe = ReminderScheduler(str(Path(tmp.name) / "probe.sqlite3"), DELAYS, _noop_send, flush_interval=3600)
+    sample = min(users, 50_000)
+    gc.collect()
+    tracemalloc.start()
+    for uid in range(sample):
+        probe.schedule(uid, uid, S_EMAIL, now=now)
+    probe._take_pending()  # the write buffer is gone after the next flush
+    r["bytes_per_pending"] = tracemalloc.get_traced_memory()[0] / sample
+    tracemalloc.stop()
+    await probe.close()
+
+    sched = ReminderScheduler(path, DELAYS, _noop_send, flush_interval=3600)
+    t0 = time.perf_counter()
+    for uid in range(users):
+        sched.schedule(uid, uid, S_EMAIL, now=now - (uid % 1000))
+    r["schedule_us"] = _per_op(time.perf_counter() - t0, users)
+
+    moved = users // 2
+    t0 = time.perf_counter()
+    for uid in range(moved):
+        sched.schedule(uid, uid, S_PHONE, now=now)
+    r["progress_us"] = _per_op(time.perf_counter() - t0, moved)
+    r["heap_after_progress"] = len(sched._heap)
+
+    t0 = time.perf_counter()
+    sched._compact()
+    r["compact_ms"] = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    await asyncio.to_thread(sched._write, sched._take_pending())
+    r["flush_s"] = time.perf_counter() - t0
+
+    gone = users // 10
+    t0 = time.perf_counter()
+    for uid in range(users - gone, users):
+        sched.cancel(uid)
+    r["cancel_us"] = _per_op(time.perf_counter() - t0, gone)
+    await asyncio.to_thread(sched._write, sched._take_pending())
+    await sched.close()
+
+    # Restart: rebuild the heap from the table, make K of them due right now
+    sched = ReminderScheduler(path, DELAYS, _noop_send, flush_interval=3600)
+    t0 = time.perf_counter()
+    pending = await sched.start(None)
+    r["restart_s"] = time.perf_counter() - t0
+    r["restored"] = pending
+    await asyncio.sleep(0)  # let the timer reach its first sleep
+
+    fire_at = time.time() - 1
+    for uid in range(due):
+        sched.schedule(uid, uid, S_EMAIL, now=fire_at - DELAYS[0])
+    wakeups = sched.wakeups
+    t0 = time.perf_counter()
+    while sched.sent < due:
+        await asyncio.sleep(0)
+    r["wake_fire_ms"] = (time.perf_counter() - t0) * 1000
+    r["wake_fire_us_per_reminder"] = r["wake_fire_ms"] * 1000 / due
+    r["wakeups_used"] = sched.wakeups - wakeups
+
+    # What the same tick would cost if it scanned every session for "is it due yet?"
+    live = sched._live
+    t0 = time.perf_counter()
+    cutoff = time.time()
+    hits = sum(1 for _, _, _, step, since in live.values() if since + DELAYS[step] <= cutoff)
+    r["poll_scan_ms"] = (time.perf_counter() - t0) * 1000
+    r["poll_scan_hits"] = hits
+    r["stats"] = sched.stats()
+    await sched.close()
+    tmp.cleanup()
+    return r
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--users", type=int, default=300_000, help="pending reminder series")
+    ap.add_argument("--due", type=int, default=100, help="reminders that come due in the wake-up test")
+    ap.add_argument("--json", help="also write the results here")
+    args = ap.parse_args()
+
+    r = asyncio.run(run(args.users, args.due))
+    print(f"{r['users']} pending reminder series\n")
+    print(f"schedule        {r['schedule_us']:8.2f} µs/op")
+    print(f"progress        {r['progress_us']:8.2f} µs/op   (heap {r['heap_after_progress']} entries, "
+          f"compaction {r['compact_ms']:.0f} ms)")
+    print(f"cancel          {r['cancel_us']:8.2f} µs/op")
+    print(f"memory          {r['bytes_per_pending']:8.0f} B/pending")
+    print(f"flush           {r['flush_s']:8.2f} s for every row")
+    print(f"restart         {r['restart_s']:8.2f} s ({r['restored']} restored)")
+    print(f"wake-up         {r['wake_fire_ms']:8.2f} ms to fire {args.due} due "
+          f"({r['wake_fire_us_per_reminder']:.1f} µs each, {r['wakeups_used']} wake-ups)")
+    print(f"poll scan       {r['poll_scan_ms']:8.2f} ms per tick over {r['restored']} sessions")
+    if args.json:
+        Path(args.json).write_text(json.dumps(r, indent=2))
+
+
+if __name__ == "__main__":
+    main()
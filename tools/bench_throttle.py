@@ -0,0 +1,118 @@
+"""
+Micro-benchmark for the inbound throttle (app/throttle.py).
+
+Measures what the group -1 filter adds to every update, in microseconds, for:
+
+    pass      many distinct users, all within their rate (the normal case)
+    flood     one user sending far over the rate (drops on "rate")
+    repeat    one user re-sending the same callback data (drops on "duplicate")
+    churn     more users than the LRU holds (every update creates a bucket and evicts one)
+
+and the whole handler path as the Application runs it in group -1 (TypeHandler.check_update
+plus the async callback, including ApplicationHandlerStop on drops). No network: updates
+are built in memory.
+
+    python tools/bench_throttle.py
+    python tools/bench_throttle.py --updates 500000 --json throttle.json
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from telegram import CallbackQuery, Chat, Message, Update, User  # noqa: E402
+from telegram.ext import ApplicationHandlerStop, TypeHandler  # noqa: E402
+
+from app.throttle import UpdateThrottle  # noqa: E402
+
+_NOW = datetime.now(timezone.utc)
+
+
+def _message(update_id: int, user_id: int, text: str) -> Update:
+    user = User(user_id, "Bench", False)
+    return Update(update_id, message=Message(update_id, _NOW, Chat(user_id, Chat.PRIVATE), from_user=user, text=text))
+
+
+def _callback(update_id: int, user_id: int, data: str) -> Update:
+    user = User(user_id, "Bench", False)
+    return Update(update_id, callback_query=CallbackQuery(str(update_id), user, "bench", data=data))
+
+
+def _updates(scenario: str, n: int, users: int) -> List[Update]:
+    if scenario == "pass":
+        return [_message(i, 1_000 + i % users, f"step {i // users}") for i in range(n)]
+    if scenario == "flood":
+        return [_message(i, 42, f"spam {i}") for i in range(n)]
+    if scenario == "repeat":
+        return [_callback(i, 42, "PROCEED") for i in range(n)]
+    if scenario == "churn":
+        return [_message(i, 1_000_000 + i, "/start") for i in range(n)]
+    raise ValueError(scenario)
+
+
+def bench_check(scenario: str, n: int, users: int) -> Dict[str, Any]:
+    updates = _updates(scenario, n, users)
+    # "pass": each user sends one update per simulated second, well under the rate
+    throttle = UpdateThrottle(rate=1.0, burst=5.0, coalesce_window=1.0,
+                              max_users=users if scenario == "churn" else max(users, 100_000))
+    check = throttle.check
+    now = 0.0
+    t0 = time.perf_counter_ns()
+    if scenario == "pass":
+        for i, u in enumerate(updates):
+            check(u, now + i // users)
+    else:
+        for u in updates:
+            check(u, now)
+    elapsed = time.perf_counter_ns() - t0
+    return {"scenario": scenario, "updates": n, "us_per_update": round(elapsed / n / 1000, 3), **throttle.stats()}
+
+
+async def bench_handler(scenario: str, n: int, users: int) -> float:
+    if scenario == "pass":  # real clock here, so make sure nothing is dropped
+        throttle = UpdateThrottle(rate=1e9, burst=1e9, coalesce_window=0)
+    else:
+        throttle = UpdateThrottle(rate=1.0, burst=5.0, coalesce_window=1.0)
+    handler = TypeHandler(Update, throttle)
+    updates = _updates(scenario, n, users)
+    t0 = time.perf_counter_ns()
+    for u in updates:
+        if handler.check_update(u):
+            try:
+                await handler.callback(u, None)
+            except ApplicationHandlerStop:
+                pass
+    return (time.perf_counter_ns() - t0) / n / 1000
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--updates", type=int, default=50_000)
+    ap.add_argument("--users", type=int, default=10_000)
+    ap.add_argument("--json", help="also write the results to this file")
+    args = ap.parse_args()
+
+    results: Dict[str, Any] = {"check": [bench_check(s, args.updates, args.users)
+                                         for s in ("pass", "flood", "repeat", "churn")]}
+    results["handler_us"] = {s: round(asyncio.run(bench_handler(s, args.updates, args.users)), 3)
+                             for s in ("pass", "flood")}
+
+    print(f"{'scenario':<8} {'us/update':>10} {'passed':>8} {'rate':>8} {'dup':>8} {'users':>8} {'evicted':>8}")
+    for r in results["check"]:
+        print(f"{r['scenario']:<8} {r['us_per_update']:>10} {r['passed']:>8} {r['dropped']['rate']:>8} "
+              f"{r['dropped']['duplicate']:>8} {r['users_tracked']:>8} {r['evicted']:>8}")
+    h = results["handler_us"]
+    print(f"\nhandler path (check_update + callback): {h['pass']} us/update passing, {h['flood']} us/update dropping")
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
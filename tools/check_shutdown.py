@@ -0,0 +1,202 @@
+"""
+Deploy check for the onboarding bot (app/bot_v3.py): SIGTERM with a keep-alive webhook client
+still connected must stop the process and write the shutdown handoff, and the next process must
+pick it up.
+
+Runs the real bot as a subprocess (BOT_MODE=webhook, or sharded with --mode sharded) against the
+local Bot API stand-in, with INTRO_MAX_ACTIVE=1 and long DELAY_* timings:
+
+    1. user A sends /start and gets the intro slot; user B sends /start and is queued behind A.
+       Both updates go over one HTTP/1.1 connection that is left open.
+    2. SIGTERM. The bot must exit within --stop-timeout, and the handoff file must hold A's
+       next drip step and B's place in the waiting room.
+    3. The bot is started again with a bigger cap. It must read and delete the handoff, and
+       B must get the welcome without sending /start again.
+
+    python tools/check_shutdown.py
+    python tools/check_shutdown.py --mode sharded --workers 2
+
+Exits 0 if every check passes, 1 otherwise.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.fake_bot_api import FakeBotApi  # noqa: E402
+from app.sharding import shard_of  # noqa: E402
+
+TOKEN = "123456:SHUTDOWNCHECK"
+SECRET = "shutdown-check"
+USER_A = 7_000_001
+
+
+def _free_port() -> int:
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ShutdownCheck:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.workers = args.workers if args.mode == "sharded" else 1
+        # B must land on A's shard to queue behind A's slot
+        self.user_b = next(u for u in range(USER_A + 1, USER_A + 1000)
+                           if shard_of(u, self.workers) == shard_of(USER_A, self.workers))
+        self.leads_dir = tempfile.mkdtemp(prefix="e2t-shutdown-")
+        self.port = _free_port()
+        self.failures: List[str] = []
+        self._update_id = 0
+
+    def check(self, ok: bool, what: str) -> None:
+        print(f"  [{'ok' if ok else 'FAIL'}] {what}")
+        if not ok:
+            self.failures.append(what)
+
+    async def _start_bot(self, api: FakeBotApi, intro_cap: int) -> asyncio.subprocess.Process:
+        env = {
+            **os.environ,
+            "BOT_TOKEN": TOKEN,
+            "BOT_MODE": self.args.mode,
+            "BOT_API_BASE_URL": api.base_url,
+            "LEADS_DIR": self.leads_dir,
+            "WEBHOOK_LISTEN": "127.0.0.1",
+            "WEBHOOK_PORT": str(self.port),
+            "WEBHOOK_PATH": "/telegram",
+            "WEBHOOK_SECRET": SECRET,
+            "WEBHOOK_URL": "",
+            "SHARD_COUNT": str(self.workers),
+            "SHARD_BASE_PORT": str(self.port + 1),
+            "INTRO_MAX_ACTIVE": str(intro_cap * self.workers),  # split evenly between the shards
+            "DELAY_SCALE": "10",  # A's next drip step stays minutes away
+            "THROTTLE_RATE": "0",
+        }
+        out = None if self.args.verbose else asyncio.subprocess.DEVNULL
+        proc = await asyncio.create_subprocess_exec(sys.executable, "-m", "app.bot_v3", cwd=str(ROOT), env=env,
+                                                    stdout=out, stderr=out)
+        deadline = time.monotonic() + self.args.start_timeout
+        while time.monotonic() < deadline:
+            if proc.returncode is not None:
+                raise RuntimeError(f"bot exited during startup (code {proc.returncode}); rerun with -v")
+            try:
+                _, writer = await asyncio.open_connection("127.0.0.1", self.port)
+                writer.close()
+                return proc
+            except OSError:
+                await asyncio.sleep(0.1)
+        proc.kill()
+        raise RuntimeError(f"bot did not listen on port {self.port} within {self.args.start_timeout:.0f}s")
+
+    async def _post(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, update: Dict) -> int:
+        """One webhook POST on an open keep-alive connection; returns the status code."""
+        self._update_id += 1
+        body = json.dumps({"update_id": self._update_id, **update}).encode("utf-8")
+        writer.write(
+            b"POST /telegram HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n"
+            + f"X-Telegram-Bot-Api-Secret-Token: {SECRET}\r\nContent-Length: {len(body)}\r\n\r\n".encode("ascii")
+            + body
+        )
+        await writer.drain()
+        head = await reader.readuntil(b"\r\n\r\n")
+        length = 0
+        for line in head.split(b"\r\n")[1:]:
+            name, _, value = line.partition(b":")
+            if name.strip().lower() == b"content-length":
+                length = int(value)
+        if length:
+            await reader.readexactly(length)
+        return int(head.split(b" ", 2)[1])
+
+    async def _wait_for(self, inbox: asyncio.Queue, needle: str, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                call = await asyncio.wait_for(inbox.get(), max(deadline - time.monotonic(), 0.001))
+            except asyncio.TimeoutError:
+                return False
+            if needle in str(call.params.get("text", "")):
+                return True
+
+    def _handoffs(self) -> Dict[str, Dict]:
+        out = {}
+        for path in sorted(Path(self.leads_dir).glob("drip_handoff*.json")):
+            try:
+                out[path.name] = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError) as e:
+                out[path.name] = {"error": str(e)}
+        return out
+
+    async def _stop(self, proc: asyncio.subprocess.Process) -> Tuple[Optional[int], float]:
+        t0 = time.monotonic()
+        proc.send_signal(signal.SIGTERM)
+        try:
+            await asyncio.wait_for(proc.wait(), self.args.stop_timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            return None, time.monotonic() - t0
+        return proc.returncode, time.monotonic() - t0
+
+    async def run(self) -> bool:
+        api = await FakeBotApi(token=TOKEN).start()
+        inbox_a, inbox_b = api.watch(USER_A), api.watch(self.user_b)
+        try:
+            print(f"mode={self.args.mode} workers={self.workers} data={self.leads_dir}")
+            print("1. /start from A (admitted) and B (queued) over one keep-alive connection")
+            proc = await self._start_bot(api, intro_cap=1)
+            if self.args.mode == "sharded":
+                await asyncio.sleep(1.0)  # the front listens before its lanes' first connections
+            reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+            self.check(await self._post(reader, writer, api.message_update(USER_A, "/start")) == 200, "A accepted")
+            self.check(await self._wait_for(inbox_a, "Welcome", 10), "A welcomed")
+            self.check(await self._post(reader, writer, api.message_update(self.user_b, "/start")) == 200,
+                       "B accepted")
+            self.check(await self._wait_for(inbox_b, "in the queue", 10), "B queued")
+
+            print("2. SIGTERM with the client connection still open")
+            code, took = await self._stop(proc)
+            self.check(code == 0, f"bot exited with code 0 (got {code}, {took:.2f}s after SIGTERM)")
+            writer.close()
+            handoffs = self._handoffs()
+            steps = [s for h in handoffs.values() for s in h.get("steps") or []]
+            waiting = [w for h in handoffs.values() for w in (h.get("admission") or {}).get("waiting") or []]
+            self.check(bool(handoffs), f"handoff written ({', '.join(handoffs) or 'no file'})")
+            self.check(any(s[0] == USER_A and s[1] == "intro" for s in steps), "A's next intro step handed over")
+            self.check(any(w[0] == self.user_b for w in waiting), "B's place in the waiting room handed over")
+
+            print("3. restart with a free slot")
+            proc = await self._start_bot(api, intro_cap=2)
+            self.check(await self._wait_for(inbox_b, "Welcome", 15), "B started without sending /start again")
+            self.check(not self._handoffs(), "handoff consumed")
+            code, took = await self._stop(proc)
+            self.check(code == 0, f"bot exited with code 0 (got {code}, {took:.2f}s after SIGTERM)")
+        finally:
+            await api.stop()
+        print("PASS" if not self.failures else f"FAIL: {len(self.failures)} check(s) failed")
+        return not self.failures
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="SIGTERM/handoff check for the onboarding bot")
+    ap.add_argument("--mode", choices=("webhook", "sharded"), default="webhook")
+    ap.add_argument("--workers", type=int, default=2, help="worker processes in --mode sharded")
+    ap.add_argument("--start-timeout", type=float, default=60.0)
+    ap.add_argument("--stop-timeout", type=float, default=30.0, help="seconds the bot gets to exit after SIGTERM")
+    ap.add_argument("-v", "--verbose", action="store_true", help="show the bot's log")
+    args = ap.parse_args()
+    raise SystemExit(0 if asyncio.run(ShutdownCheck(args).run()) else 1)
+
+
+if __name__ == "__main__":
+    main()
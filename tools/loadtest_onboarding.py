@@ -0,0 +1,336 @@
+"""
+Synthetic-user load test for the onboarding ConversationHandler (app/bot_v3.py).
+
+Starts the local Bot API stand-in (app/fake_bot_api.py) and the real bot in one process,
+then drives N simulated users through
+
+    /start -> PROCEED -> email -> phone -> region -> DETAILS_OK
+
+with the DELAY_* timings scaled down (DELAY_SCALE). For every conversation state it
+reports the reply latency the user sees (update pushed -> bot's answer arrives at the
+API) as exact p50/p95/p99 over every sample, plus throughput and peak RSS. Run the same
+scenario in polling and webhook mode to compare them:
+
+    python tools/loadtest_onboarding.py --users 2000 --mode polling
+    python tools/loadtest_onboarding.py --users 2000 --mode webhook --json webhook.json
+
+--mode sharded runs the bot as its own process instead (BOT_MODE=sharded: a webhook front
+plus --workers worker processes), so only the client-side numbers are reported. Compare
+--workers 1, 2, 4 with high rate limits to see how throughput scales with processes:
+
+    python tools/loadtest_onboarding.py --mode sharded --workers 4 --users 2000 --ramp 0 \
+        --global-rate 10000 --chat-rate 100 --intro-cap 0
+
+Outbound calls still go through the real rate limiter, so --global-rate (default 30/s,
+Telegram's limit) usually decides how fast users get through; raise it to find where
+the bot itself starts to lag.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import secrets
+import signal
+import socket
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.fake_bot_api import Call, FakeBotApi  # noqa: E402
+
+TOKEN = "123456:LOADTEST"
+USER_ID_BASE = 5_000_000
+
+
+def _percentiles(samples: List[float]) -> Dict[str, Any]:
+    """Exact count/p50/p95/p99/max in ms from the raw samples (not bucket bounds)."""
+    if not samples:
+        return {"count": 0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    cuts = statistics.quantiles(samples, n=100, method="inclusive") if len(samples) > 1 else [samples[0]] * 99
+    return {
+        "count": len(samples),
+        "p50": round(cuts[49] * 1000, 1),
+        "p95": round(cuts[94] * 1000, 1),
+        "p99": round(cuts[98] * 1000, 1),
+        "max": round(max(samples) * 1000, 1),
+    }
+
+
+def _expect(method: str, *needles: str) -> Callable[[Call], bool]:
+    def match(call: Call) -> bool:
+        text = str(call.params.get("text", ""))
+        return call.method == method and any(n in text for n in needles)
+    return match
+
+
+def _has_button(data: str) -> Callable[[Call], bool]:
+    def match(call: Call) -> bool:
+        return data in json.dumps(call.params.get("reply_markup") or "")
+    return match
+
+
+# (state name, kind, payload(i), reply that ends the step)
+STEPS: List[Tuple[str, str, Callable[[int], str], Callable[[Call], bool]]] = [
+    ("start", "message", lambda i: "/start", _expect("sendMessage", "Welcome")),
+    ("intro_drip", "", lambda i: "", _has_button("PROCEED")),
+    ("S_START_DECISION", "callback", lambda i: "PROCEED", _expect("editMessageText", "STEP 1")),
+    ("S_EMAIL", "message", lambda i: f"loadtest{i}@example.com", _expect("sendMessage", "STEP 2")),
+    ("S_PHONE", "message", lambda i: f"+447{i:09d}", _expect("sendMessage", "STEP 3")),
+    ("S_REGION", "callback", lambda i: "REGION::UK/EU", _expect("editMessageText", "review your details")),
+    ("S_REVIEW", "callback", lambda i: "DETAILS_OK", _expect("editMessageText", "Perfect", "already registered")),
+    ("post_review_drip", "", lambda i: "", _expect("sendMessage", "confirm with our team")),
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _free_port_range(n: int) -> int:
+    """First of n consecutive free localhost ports (for the shard workers)."""
+    while True:
+        base = _free_port()
+        try:
+            for p in range(base, base + n):
+                with socket.socket() as s:
+                    s.bind(("127.0.0.1", p))
+            return base
+        except OSError:
+            continue
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+class LoadTest:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.samples: Dict[str, List[float]] = {name: [] for name, *_ in STEPS}  # seconds, every one kept
+        self.completed = 0
+        self.failed: Dict[str, int] = {}
+        self.updates_sent = 0
+
+    async def _user(self, api: FakeBotApi, i: int) -> None:
+        uid = USER_ID_BASE + i
+        inbox = api.watch(uid)
+        for name, kind, payload, done in STEPS:
+            t0 = time.monotonic()
+            if kind == "message":
+                await api.push_update(api.message_update(uid, payload(i)))
+            elif kind == "callback":
+                await api.push_update(api.callback_update(uid, payload(i)))
+            if kind:
+                self.updates_sent += 1
+            deadline = t0 + self.args.step_timeout
+            while True:
+                try:
+                    call = await asyncio.wait_for(inbox.get(), max(deadline - time.monotonic(), 0.001))
+                except asyncio.TimeoutError:
+                    self.failed[name] = self.failed.get(name, 0) + 1
+                    return
+                if done(call):
+                    self.samples[name].append(time.monotonic() - t0)
+                    break
+            if self.args.think_time:
+                await asyncio.sleep(self.args.think_time)
+        self.completed += 1
+
+    async def run(self) -> Dict[str, Any]:
+        args = self.args
+        api = await FakeBotApi(token=TOKEN).start()
+        api.latency = args.api_latency / 1000
+
+        leads_dir = tempfile.mkdtemp(prefix="e2t-loadtest-")
+        env = dict(
+            BOT_TOKEN=TOKEN,
+            BOT_MODE=args.mode,
+            BOT_API_BASE_URL=api.base_url,
+            LEADS_DIR=leads_dir,
+            DELAY_SCALE=str(args.delay_scale),
+            OUTBOUND_GLOBAL_RATE=str(args.global_rate),
+            OUTBOUND_CHAT_RATE=str(args.chat_rate),
+            WEBHOOK_MAX_QUEUE=str(max(1000, args.users * 2)),
+            INTRO_MAX_ACTIVE=str(args.intro_cap),
+            THROTTLE_RATE="0",  # scripted users tap faster than people; the flood filter would drop them
+        )
+        if args.mode == "sharded":
+            return await self._run_sharded(api, env)
+        os.environ.update(env)
+        import app.bot_v3 as bot  # reads the env above
+
+        if not args.verbose:
+            logging.getLogger("e2t_onboarding_bot").setLevel(logging.ERROR)
+
+        application = bot.build_application()
+        stop = asyncio.Event()
+        server_task = None
+        if args.mode == "webhook":
+            port = _free_port()
+            server_task = asyncio.create_task(
+                bot.serve_webhook(
+                    application,
+                    listen="127.0.0.1",
+                    port=port,
+                    path="/telegram",
+                    secret_token=bot.WEBHOOK_SECRET,
+                    webhook_url=f"http://127.0.0.1:{port}/telegram",
+                    allowed_updates=bot.allowed_updates_for(application),
+                    stop_event=stop,
+                )
+            )
+            while api.webhook is None:
+                if server_task.done():
+                    server_task.result()
+                await asyncio.sleep(0.01)
+        else:
+            await application.initialize()
+            await application.post_init(application)
+            await application.start()
+            await application.updater.start_polling(poll_interval=0, timeout=10)
+
+        report = await self._drive(api)
+        report.update({
+            "outbound": bot.OUTBOX.stats(),
+            "admission": bot.ADMISSION.stats(),
+            "callbacks": bot.CALLBACK_LATENCY.stats(),
+            "pipeline": bot.PIPELINE.stats(),
+        })
+
+        if server_task is not None:
+            stop.set()
+            await server_task
+        else:
+            await application.updater.stop()
+            await application.stop()
+            await application.post_stop(application)
+            await application.shutdown()
+            await application.post_shutdown(application)
+        await api.stop()
+        return report
+
+    async def _drive(self, api: FakeBotApi) -> Dict[str, Any]:
+        args = self.args
+        rss_before = _peak_rss_mb()
+        t0 = time.monotonic()
+        users = []
+        for i in range(args.users):
+            users.append(asyncio.create_task(self._user(api, i)))
+            if args.ramp:
+                await asyncio.sleep(args.ramp / args.users)
+        await asyncio.gather(*users)
+        elapsed = time.monotonic() - t0
+        return {
+            "mode": args.mode,
+            "users": args.users,
+            "completed": self.completed,
+            "failed_at": self.failed,
+            "elapsed_s": round(elapsed, 2),
+            "onboardings_per_s": round(self.completed / elapsed, 2) if elapsed else 0.0,
+            "updates_per_s": round(self.updates_sent / elapsed, 1) if elapsed else 0.0,
+            "api_calls": len(api.calls),
+            "peak_rss_mb": _peak_rss_mb(),
+            "rss_at_start_mb": rss_before,
+            "latency_ms": {name: _percentiles(samples) for name, samples in self.samples.items()},
+        }
+
+    async def _run_sharded(self, api: FakeBotApi, env: Dict[str, str]) -> Dict[str, Any]:
+        """The bot as a separate process tree (front + workers): only client-side numbers."""
+        args = self.args
+        port = _free_port()
+        env.update(
+            SHARD_COUNT=str(args.workers),
+            SHARD_BASE_PORT=str(_free_port_range(args.workers)),
+            WEBHOOK_PORT=str(port),
+            WEBHOOK_LISTEN="127.0.0.1",
+            WEBHOOK_URL=f"http://127.0.0.1:{port}/telegram",
+            WEBHOOK_SECRET=secrets.token_urlsafe(16),
+        )
+        out = None if args.verbose else asyncio.subprocess.DEVNULL
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "app.bot_v3", cwd=str(ROOT), env={**os.environ, **env}, stdout=out, stderr=out,
+        )
+        try:
+            while api.webhook is None:
+                if proc.returncode is not None:
+                    raise RuntimeError(f"bot exited during startup (code {proc.returncode}); rerun with -v")
+                await asyncio.sleep(0.05)
+            report = await self._drive(api)
+            report["workers"] = args.workers
+        finally:
+            if proc.returncode is None:
+                proc.send_signal(signal.SIGTERM)
+            await proc.wait()
+            await api.stop()
+        return report
+
+
+def _print_report(r: Dict[str, Any]) -> None:
+    workers = f" workers={r['workers']}" if "workers" in r else ""
+    print(f"\nmode={r['mode']}{workers} users={r['users']} completed={r['completed']} failed_at={r['failed_at'] or '-'}")
+    print(f"elapsed {r['elapsed_s']}s | {r['onboardings_per_s']} onboardings/s | {r['updates_per_s']} updates/s"
+          f" | {r['api_calls']} Bot API calls")
+    if r["peak_rss_mb"] is not None:
+        what = "load generator and fake API only" if workers else "includes the fake API"
+        print(f"peak RSS {r['peak_rss_mb']:.0f} MB (at start: {r['rss_at_start_mb']:.0f} MB; {what})")
+    print(f"\n{'state':<18}{'count':>7}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}   (ms)")
+    for name, s in r["latency_ms"].items():
+        print(f"{name:<18}{s['count']:>7}{s['p50']:>10}{s['p95']:>10}{s['p99']:>10}{s['max']:>10}")
+    print("\n(intro_drip / post_review_drip include the scaled DELAY_* waits)")
+    if "callbacks" not in r:
+        return  # sharded: the bot's own stats are in its log (-v)
+    print(f"\n{'callback':<18}{'count':>7}{'ack p50':>10}{'ack p95':>10}{'e2e p50':>10}{'e2e p95':>10}   (ms)")
+    for kind, c in r["callbacks"].items():
+        ack, e2e = c["ack_seconds"], c["e2e_seconds"] or {"p50": 0.0, "p95": 0.0}
+        print(f"{kind:<18}{ack['count']:>7}{ack['p50'] * 1000:>10.1f}{ack['p95'] * 1000:>10.1f}"
+              f"{e2e['p50'] * 1000:>10.1f}{e2e['p95'] * 1000:>10.1f}")
+    print(f"(ack = answerCallbackQuery done, e2e = incl. deferred work, both bucket upper bounds from the bot's "
+          f"histograms; pipeline retried "
+          f"{r['pipeline']['retried']}, failed {r['pipeline']['failed'] or 0})")
+    adm = r["admission"]
+    if adm["queued"]:
+        q = adm["queue_seconds"]
+        print(f"waiting room: {adm['queued']} queued (peak {adm['peak_waiting']}), {adm['promoted']} promoted, "
+              f"queue time p50 {q['p50']:.1f}s p95 {q['p95']:.1f}s max {q['max']:.1f}s, abandoned {adm['abandoned']}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Load test the onboarding flow against a local fake Bot API")
+    ap.add_argument("--users", type=int, default=1000)
+    ap.add_argument("--mode", choices=("polling", "webhook", "sharded"), default="polling")
+    ap.add_argument("--workers", type=int, default=2, help="worker processes in --mode sharded")
+    ap.add_argument("--ramp", type=float, default=10.0, help="seconds over which users arrive (0 = all at once)")
+    ap.add_argument("--delay-scale", type=float, default=0.01, help="multiplier for the DELAY_* timings")
+    ap.add_argument("--think-time", type=float, default=0.0, help="seconds a user waits between steps")
+    ap.add_argument("--global-rate", type=float, default=30.0, help="OUTBOUND_GLOBAL_RATE (msgs/s)")
+    ap.add_argument("--chat-rate", type=float, default=1.0, help="OUTBOUND_CHAT_RATE (msgs/s per chat)")
+    ap.add_argument("--intro-cap", type=int, default=50, help="INTRO_MAX_ACTIVE (0 = no waiting room)")
+    ap.add_argument("--api-latency", type=float, default=0.0, help="ms added to every fake Bot API call")
+    ap.add_argument("--step-timeout", type=float, default=120.0)
+    ap.add_argument("--json", help="also write the report to this file")
+    ap.add_argument("-v", "--verbose", action="store_true")
+    args = ap.parse_args()
+
+    report = asyncio.run(LoadTest(args).run())
+    _print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Memory held per inactive onboarding session, before and after idle eviction.
+
+Simulates N users who stopped halfway (email and phone given, region not) and measures
+with tracemalloc what the bot keeps for each of them:
+
+    dict draft      user_data as a free-form dict + the conversation entry (the old layout,
+                    kept for as long as the process lives)
+    slotted draft   OnboardingDraft + the conversation entry
+    + timeout job   the same plus the conversation-timeout job PTB schedules per session,
+                    which holds on to the session's last Update and CallbackContext until
+                    it fires (this is what an idle session costs during the idle window)
+    after timeout   nothing: the draft and the conversation entry are dropped
+
+    python tools/mem_sessions.py
+    python tools/mem_sessions.py --users 200000
+"""
+import argparse
+import gc
+import sys
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from telegram import Chat, Message, Update, User  # noqa: E402
+from telegram.ext import ApplicationBuilder, CallbackContext, ContextTypes  # noqa: E402
+
+from app.draft import OnboardingDraft  # noqa: E402
+
+S_REGION = 3
+_NOW = datetime.now(timezone.utc)
+
+
+def _details(i: int):
+    # fresh strings per user, like the ones parsed out of real messages
+    return f"user{i}@example.com", f"+4471{i:08d}"
+
+
+def _measure(build: Callable[[], Any]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    keep = build()
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del keep
+    return used
+
+
+def dict_drafts(n: int) -> List[Any]:
+    user_data: Dict[int, dict] = defaultdict(dict)
+    conversations: Dict[tuple, int] = {}
+    for i in range(n):
+        email, phone = _details(i)
+        user_data[i].update(email=email, phone=phone)
+        conversations[(i, i)] = S_REGION
+    return [user_data, conversations]
+
+
+def slotted_drafts(n: int) -> List[Any]:
+    user_data: Dict[int, OnboardingDraft] = defaultdict(OnboardingDraft)
+    conversations: Dict[tuple, int] = {}
+    for i in range(n):
+        d = user_data[i]
+        d.email, d.phone = _details(i)
+        d.touch(S_REGION)
+        conversations[(i, i)] = S_REGION
+    return [user_data, conversations]
+
+
+def with_timeout_jobs(n: int) -> List[Any]:
+    app = ApplicationBuilder().token("123456:MEM").context_types(ContextTypes(user_data=OnboardingDraft)).build()
+
+    async def timeout(context: Any) -> None:
+        pass
+
+    keep = slotted_drafts(n)
+    for i in range(n):
+        user = User(i, "Mem", False)
+        update = Update(i, message=Message(i, _NOW, Chat(i, Chat.PRIVATE), from_user=user, text=f"+4471{i:08d}"))
+        context = CallbackContext.from_update(update, app)
+        app.job_queue.run_once(timeout, 48 * 3600, data=((i, i), update, context), name=f"conv-timeout:{i}")
+    keep.append(app)
+    return keep
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--users", type=int, default=20_000)
+    args = ap.parse_args()
+    n = args.users
+
+    baseline = _measure(lambda: ApplicationBuilder().token("123456:MEM").build())
+    rows = [
+        ("dict draft", _measure(lambda: dict_drafts(n))),
+        ("slotted draft", _measure(lambda: slotted_drafts(n))),
+        ("+ timeout job", _measure(lambda: with_timeout_jobs(n)) - baseline),
+        ("after timeout", 0),
+    ]
+    print(f"{n} inactive sessions (email + phone entered)\n")
+    print(f"{'layout':<16}{'total MB':>10}{'bytes/user':>12}")
+    for name, used in rows:
+        print(f"{name:<16}{used / 2**20:>10.1f}{used / n:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()